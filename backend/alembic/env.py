@@ -15,17 +15,31 @@ import app.models  # Import all models so Alembic can detect them
 # this is the Alembic Config object
 config = context.config
 
-# Set the database URL from your settings
-config.set_main_option('sqlalchemy.url', settings.database_url)
+# Set the database URL from your settings; `alembic -x shard=N ...` migrates SHARD_URLS[N] instead,
+# `-x url=...` any other database (app.testing builds its template databases this way)
+x_args = context.get_x_argument(as_dictionary=True)
+if 'url' in x_args:
+    url = x_args['url']
+elif 'shard' in x_args:
+    url = settings.shard_urls[int(x_args['shard'])]
+else:
+    url = settings.database_url
+config.set_main_option('sqlalchemy.url', url.replace('%', '%%'))
 
 # Interpret the config file for Python logging
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # Keep the application's loggers when migrations run in-process (app.migrations)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # Set target metadata for autogenerate support
 target_metadata = Base.metadata
 
 
+def include_name(name, type_, parent_names):
+    # Backfill checkpoints (app.migrations) are bookkeeping, not part of the models
+    return not (type_ == "table" and name == "migration_checkpoints")
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -42,8 +56,10 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
     )
 
     with context.begin_transaction():
@@ -65,7 +81,13 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            # Commit each revision on its own so a long revision that fails does not undo the ones before it
+            transaction_per_migration=True,
+            # Autogenerate batch operations so new migrations also run on SQLite
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
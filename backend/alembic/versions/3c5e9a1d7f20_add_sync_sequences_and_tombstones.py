@@ -0,0 +1,56 @@
+"""add sync sequences and tombstones
+
+Revision ID: 3c5e9a1d7f20
+Revises: 778709f12857
+Create Date: 2026-10-18 09:12:44.318020
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e9a1d7f20'
+down_revision: Union[str, None] = '778709f12857'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SYNCED_TABLES = ('categories', 'expenses', 'budgets')
+# Options SQLite batch copies must keep (reflection does not recover them)
+TABLE_KWARGS = {'expenses': {'sqlite_autoincrement': True}}
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('sync_seq', sa.BigInteger(), server_default='0', nullable=False))
+    # SQLite cannot ALTER in a column with a non-constant default on a non-empty table; copy the table instead
+    recreate = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    for table in SYNCED_TABLES:
+        with op.batch_alter_table(table, recreate=recreate, table_kwargs=TABLE_KWARGS.get(table, {})) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False))
+            batch_op.add_column(sa.Column('sync_seq', sa.BigInteger(), server_default='0', nullable=False))
+        op.create_index(f'ix_{table}_owner_sync_seq', table, ['owner_id', 'sync_seq'], unique=False)
+    op.create_table('tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('sync_seq', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_owner_sync_seq', 'tombstones', ['owner_id', 'sync_seq'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tombstones_owner_sync_seq', table_name='tombstones')
+    op.drop_table('tombstones')
+    for table in reversed(SYNCED_TABLES):
+        op.drop_index(f'ix_{table}_owner_sync_seq', table_name=table)
+        with op.batch_alter_table(table, table_kwargs=TABLE_KWARGS.get(table, {})) as batch_op:
+            batch_op.drop_column('sync_seq')
+            batch_op.drop_column('updated_at')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('sync_seq')
@@ -0,0 +1,31 @@
+"""add user timezones
+
+Revision ID: 4f6a2c8d1b39
+Revises: e27a9b0c4d68
+Create Date: 2026-10-18 23:05:42.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import create_index_concurrently, drop_index_concurrently, with_lock_retry
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6a2c8d1b39'
+down_revision: Union[str, None] = 'e27a9b0c4d68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with_lock_retry(lambda: op.add_column('users', sa.Column('timezone', sa.String(length=64), server_default='UTC', nullable=False)))
+    create_index_concurrently('ix_expenses_owner_spent_at', 'expenses', ['owner_id', 'spent_at'], unique=False)
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_expenses_owner_spent_at', 'expenses')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('timezone')
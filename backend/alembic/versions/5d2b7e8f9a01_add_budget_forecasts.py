@@ -0,0 +1,43 @@
+"""add budget forecasts
+
+Revision ID: 5d2b7e8f9a01
+Revises: 9a4f0c2b6e13
+Create Date: 2026-10-18 14:05:37.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b7e8f9a01'
+down_revision: Union[str, None] = '9a4f0c2b6e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('budget_forecasts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('budget_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('spent', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('projected', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('projected_ratio', sa.Float(), nullable=False),
+    sa.Column('will_overrun', sa.Boolean(), nullable=False),
+    sa.Column('overrun_on', sa.Date(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['budget_id'], ['budgets.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('budget_id')
+    )
+    op.create_index(op.f('ix_budget_forecasts_owner_id'), 'budget_forecasts', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_budget_forecasts_owner_id'), table_name='budget_forecasts')
+    op.drop_table('budget_forecasts')
@@ -0,0 +1,55 @@
+"""add expense archive
+
+Revision ID: 9a4f0c2b6e13
+Revises: 3c5e9a1d7f20
+Create Date: 2026-10-18 11:40:02.551907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f0c2b6e13'
+down_revision: Union[str, None] = '3c5e9a1d7f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('archived_before', sa.Date(), nullable=True))
+    op.create_table('expense_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('expense_count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('owner_id', 'month', name='uq_expense_archive_owner_month')
+    )
+    op.create_table('expense_archive_totals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('expense_count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('min_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('max_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_expense_archive_totals_owner_month', 'expense_archive_totals', ['owner_id', 'month'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expense_archive_totals_owner_month', table_name='expense_archive_totals')
+    op.drop_table('expense_archive_totals')
+    op.drop_table('expense_archive')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('archived_before')
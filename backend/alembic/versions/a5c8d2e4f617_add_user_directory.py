@@ -0,0 +1,33 @@
+"""add user directory
+
+Revision ID: a5c8d2e4f617
+Revises: 7b3e1f5a9c24
+Create Date: 2026-10-19 13:40:21.907614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5c8d2e4f617'
+down_revision: Union[str, None] = '7b3e1f5a9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_directory',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('moving', sa.Boolean(), server_default=sa.false(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id'),
+    sa.UniqueConstraint('email')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_directory')
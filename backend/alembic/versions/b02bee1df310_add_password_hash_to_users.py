@@ -26,5 +26,6 @@ def upgrade() -> None:
 
 def downgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_column('users', 'password_hash')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('password_hash')
     # ### end Alembic commands ###
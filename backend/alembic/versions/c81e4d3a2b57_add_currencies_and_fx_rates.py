@@ -0,0 +1,37 @@
+"""add currencies and fx rates
+
+Revision ID: c81e4d3a2b57
+Revises: 5d2b7e8f9a01
+Create Date: 2026-10-18 15:48:21.630475
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81e4d3a2b57'
+down_revision: Union[str, None] = '5d2b7e8f9a01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('base_currency', sa.String(length=3), server_default='USD', nullable=False))
+    op.add_column('expenses', sa.Column('currency', sa.String(length=3), server_default='USD', nullable=False))
+    op.create_table('fx_rates',
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=18, scale=8), nullable=False),
+    sa.PrimaryKeyConstraint('currency', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('fx_rates')
+    with op.batch_alter_table('expenses', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('currency')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('base_currency')
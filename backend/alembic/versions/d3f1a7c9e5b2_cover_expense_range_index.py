@@ -0,0 +1,36 @@
+"""cover expense range index
+
+Revision ID: d3f1a7c9e5b2
+Revises: a5c8d2e4f617
+Create Date: 2026-10-19 17:26:54.381026
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f1a7c9e5b2'
+down_revision: Union[str, None] = 'a5c8d2e4f617'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        'ix_expenses_owner_spent_at_covering',
+        'expenses',
+        ['owner_id', 'spent_at'],
+        unique=False,
+        postgresql_include=['id', 'amount', 'category_id'],
+    )
+    drop_index_concurrently('ix_expenses_owner_spent_at', 'expenses')
+
+
+def downgrade() -> None:
+    create_index_concurrently('ix_expenses_owner_spent_at', 'expenses', ['owner_id', 'spent_at'], unique=False)
+    drop_index_concurrently('ix_expenses_owner_spent_at_covering', 'expenses')
@@ -0,0 +1,56 @@
+"""add recurring expenses
+
+Revision ID: e27a9b0c4d68
+Revises: c81e4d3a2b57
+Create Date: 2026-10-18 17:20:11.084392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e27a9b0c4d68'
+down_revision: Union[str, None] = 'c81e4d3a2b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('recurring_expenses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('currency', sa.String(length=3), server_default='USD', nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('frequency', sa.String(length=10), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('start_on', sa.Date(), nullable=False),
+    sa.Column('until', sa.Date(), nullable=True),
+    sa.Column('next_run_on', sa.Date(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_recurring_expenses_id'), 'recurring_expenses', ['id'], unique=False)
+    op.create_index(op.f('ix_recurring_expenses_next_run_on'), 'recurring_expenses', ['next_run_on'], unique=False)
+    op.create_index(op.f('ix_recurring_expenses_owner_id'), 'recurring_expenses', ['owner_id'], unique=False)
+    with op.batch_alter_table('expenses', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.add_column(sa.Column('recurring_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_expenses_recurring_id', 'recurring_expenses', ['recurring_id'], ['id'], ondelete='SET NULL')
+        batch_op.create_unique_constraint('uq_expense_recurring_occurrence', ['recurring_id', 'spent_at'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('expenses', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_constraint('uq_expense_recurring_occurrence', type_='unique')
+        batch_op.drop_constraint('fk_expenses_recurring_id', type_='foreignkey')
+        batch_op.drop_column('recurring_id')
+    op.drop_index(op.f('ix_recurring_expenses_owner_id'), table_name='recurring_expenses')
+    op.drop_index(op.f('ix_recurring_expenses_next_run_on'), table_name='recurring_expenses')
+    op.drop_index(op.f('ix_recurring_expenses_id'), table_name='recurring_expenses')
+    op.drop_table('recurring_expenses')
@@ -0,0 +1,260 @@
+"""Vectorized spending statistics.
+
+A user's full expense history (live and archived, converted to the user's base
+currency in SQL, with days and hours in the user's time zone) is loaded once
+into NumPy column arrays and kept in a bounded in-process LRU cache. An entry
+records the user's ``sync_seq`` when it was loaded, and every write bumps that
+counter, so a read reloads as soon as the user's row shows a newer value,
+whichever worker committed the write; commits in this process also drop the
+entry right away (``sync.on_commit``). Expenses that cannot be converted to the
+base currency fail the request (``fx.check_converted``) instead of turning
+into NaN. All statistics are computed with array
+operations (``bincount``, ``cumsum``, ``percentile``) instead of Python loops or
+one SQL query per figure; see ``benchmarks/bench_analytics.py`` for timings.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import archive, fx, models, schemas, sync, timezones
+from .config import settings
+
+ANOMALY_Z_SCORE = 3.0
+MAX_ANOMALIES = 50
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=timezone.utc)
+ONE_SECOND = timedelta(seconds=1)
+
+
+@dataclass(frozen=True)
+class ExpenseArrays:
+    ids: np.ndarray  # int64
+    amounts: np.ndarray  # float64
+    days: np.ndarray  # int32 proleptic Gregorian ordinal
+    weekdays: np.ndarray  # int8, Monday = 0
+    hours: np.ndarray  # int8
+    category_codes: np.ndarray  # int32 index into category_ids
+    category_ids: list  # code -> category id (None for uncategorized)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+
+def _epoch_seconds(value: datetime) -> int:
+    # Naive timestamps are stored in UTC; timedelta arithmetic beats datetime64 parsing ~5x
+    return (value - (EPOCH if value.tzinfo is None else EPOCH_UTC)) // ONE_SECOND
+
+
+def _utc_offsets(seconds: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """UTC offset in seconds at each instant.
+
+    Offsets are looked up at both ends of every UTC day present; only rows on
+    the rare days where the two differ (DST transitions) are looked up one by one.
+    """
+    def offset(instant: int) -> int:
+        return int(datetime.fromtimestamp(instant, tz).utcoffset().total_seconds())
+
+    days, inverse = np.unique(seconds // 86400, return_inverse=True)
+    at_start = np.fromiter((offset(day * 86400) for day in days.tolist()), dtype=np.int64, count=len(days))
+    at_end = np.fromiter((offset(day * 86400 + 86399) for day in days.tolist()), dtype=np.int64, count=len(days))
+    offsets = at_start[inverse]
+    for i in np.flatnonzero((at_start != at_end)[inverse]).tolist():
+        offsets[i] = offset(int(seconds[i]))
+    return offsets
+
+
+def build_arrays(rows, tz: ZoneInfo | None = None) -> ExpenseArrays:
+    """Pack ``(id, amount, spent_at, category_id)`` rows into column arrays, with days and hours local to ``tz``."""
+    count = len(rows)
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    amounts = np.fromiter((row[1] for row in rows), dtype=np.float64, count=count)
+    seconds = np.fromiter((_epoch_seconds(row[2]) for row in rows), dtype=np.int64, count=count)
+    if tz is not None and count:
+        seconds = seconds + _utc_offsets(seconds, tz)
+    day_numbers, seconds_of_day = np.divmod(seconds, 86400)
+    days = (day_numbers + EPOCH.toordinal()).astype(np.int32)
+    # 1970-01-01 was a Thursday (3 when Monday = 0)
+    weekdays = ((day_numbers + 3) % 7).astype(np.int8)
+    hours = (seconds_of_day // 3600).astype(np.int8)
+
+    category_ids = sorted({row[3] for row in rows}, key=lambda value: (value is None, value or 0))
+    lookup = {category_id: code for code, category_id in enumerate(category_ids)}
+    codes = np.fromiter((lookup[row[3]] for row in rows), dtype=np.int32, count=count)
+    return ExpenseArrays(ids, amounts, days, weekdays, hours, codes, category_ids)
+
+
+def load_arrays(db: Session, user: models.User) -> ExpenseArrays:
+    spend = (
+        fx.converted_expenses(user.base_currency, models.Expense.id, models.Expense.spent_at, models.Expense.category_id)
+        .where(models.Expense.owner_id == user.id)
+        .subquery()
+    )
+    rows = db.execute(select(spend.c.id, spend.c.base_amount, spend.c.spent_at, spend.c.category_id)).all()
+    fx.check_converted(sum(row.base_amount is None for row in rows), user.base_currency)
+    if archive.reaches_archive(user, None):
+        rows += [(e.id, e.base_amount, e.spent_at, e.category_id) for e in archive.archived_expenses(db, user.id)]
+    return build_arrays(rows, timezones.user_zone(user))
+
+
+def _version(user: models.User) -> tuple:
+    """What cached arrays depend on besides the expenses themselves; ``sync_seq`` covers those."""
+    return user.sync_seq, user.timezone, user.base_currency
+
+
+class ArrayCache:
+    """Bounded LRU of per-user expense arrays, checked against the user's ``sync_seq`` on read.
+
+    The user row a request has just loaded is the source of truth: an entry is
+    only served while its version matches, so writes made by other workers are
+    seen on the next read. Arrays are loaded outside the lock. A per-user
+    generation, bumped by ``invalidate`` while a load of that user is in flight,
+    keeps a load that raced with a commit in this process from being cached.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._entries: OrderedDict[int, tuple[tuple, ExpenseArrays]] = OrderedDict()
+        # Only users with loads in flight: their load count and invalidation generation
+        self._loading: dict[int, int] = {}
+        self._generations: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user: models.User) -> ExpenseArrays:
+        # Read before loading: the arrays then include at least every write up to this version
+        version = _version(user)
+        with self._lock:
+            entry = self._entries.get(user.id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(user.id)
+                return entry[1]
+            generation = self._generations.setdefault(user.id, 0)
+            self._loading[user.id] = self._loading.get(user.id, 0) + 1
+        arrays = None
+        try:
+            arrays = load_arrays(db, user)
+        finally:
+            with self._lock:
+                if arrays is not None and self._generations[user.id] == generation:
+                    self._entries[user.id] = (version, arrays)
+                    while len(self._entries) > self.max_users:
+                        self._entries.popitem(last=False)
+                self._loading[user.id] -= 1
+                if not self._loading[user.id]:
+                    del self._loading[user.id]
+                    del self._generations[user.id]
+        return arrays
+
+    def invalidate(self, changes: dict) -> None:
+        with self._lock:
+            for user_id in changes:
+                self._entries.pop(user_id, None)
+                if user_id in self._generations:
+                    self._generations[user_id] += 1
+
+
+array_cache = ArrayCache(settings.analytics_cache_users)
+sync.on_commit(array_cache.invalidate)
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over ``window`` entries (shorter at the start of the series)."""
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def compute_stats(
+    arrays: ExpenseArrays,
+    start: date | None = None,
+    end: date | None = None,
+    series_days: int = 90,
+) -> schemas.SpendingStats:
+    mask = np.ones(len(arrays), dtype=bool)
+    if start is not None:
+        mask &= arrays.days >= start.toordinal()
+    if end is not None:
+        mask &= arrays.days <= end.toordinal()
+
+    amounts = arrays.amounts[mask]
+    days = arrays.days[mask]
+    codes = arrays.category_codes[mask]
+    ids = arrays.ids[mask]
+    if not len(amounts):
+        return schemas.SpendingStats(
+            count=0, total=0, mean=0, p50=0, p90=0, p99=0,
+            daily=[], weekday_hour=np.zeros((7, 24)).tolist(), categories=[], anomalies=[],
+        )
+
+    p50, p90, p99 = np.percentile(amounts, [50, 90, 99])
+
+    # Dense daily series so rolling windows count days without spending as zero
+    first_day = start.toordinal() if start is not None else int(days.min())
+    last_day = end.toordinal() if end is not None else int(days.max())
+    daily_totals = np.bincount(days - first_day, weights=amounts, minlength=last_day - first_day + 1)
+    avg_7 = _rolling_mean(daily_totals, 7)
+    avg_30 = _rolling_mean(daily_totals, 30)
+    tail = slice(max(len(daily_totals) - series_days, 0), None)
+    daily = [
+        schemas.DailyStat(day=date.fromordinal(first_day + offset), total=total, avg_7=a7, avg_30=a30)
+        for offset, total, a7, a30 in zip(
+            range(tail.start, len(daily_totals)), daily_totals[tail], avg_7[tail], avg_30[tail]
+        )
+    ]
+
+    heatmap = np.bincount(
+        arrays.weekdays[mask].astype(np.int64) * 24 + arrays.hours[mask], weights=amounts, minlength=7 * 24
+    ).reshape(7, 24)
+
+    n_categories = len(arrays.category_ids)
+    counts = np.bincount(codes, minlength=n_categories)
+    sums = np.bincount(codes, weights=amounts, minlength=n_categories)
+    squares = np.bincount(codes, weights=amounts * amounts, minlength=n_categories)
+    present = counts > 0
+    means = np.divide(sums, counts, out=np.zeros(n_categories), where=present)
+    variances = np.divide(squares, counts, out=np.zeros(n_categories), where=present) - means * means
+    variances = np.maximum(variances, 0)
+    categories = [
+        schemas.CategoryStat(
+            category_id=arrays.category_ids[code],
+            count=int(counts[code]),
+            total=sums[code],
+            mean=means[code],
+            variance=variances[code],
+        )
+        for code in np.flatnonzero(present)
+    ]
+
+    stds = np.sqrt(variances)
+    row_std = stds[codes]
+    z_scores = np.divide(amounts - means[codes], row_std, out=np.zeros(len(amounts)), where=row_std > 0)
+    flagged = np.flatnonzero(z_scores > ANOMALY_Z_SCORE)
+    anomalies = [
+        schemas.Anomaly(
+            expense_id=int(ids[i]),
+            category_id=arrays.category_ids[codes[i]],
+            amount=amounts[i],
+            z_score=z_scores[i],
+        )
+        for i in flagged[np.argsort(-z_scores[flagged])][:MAX_ANOMALIES]
+    ]
+
+    return schemas.SpendingStats(
+        count=len(amounts),
+        total=amounts.sum(),
+        mean=amounts.mean(),
+        p50=p50,
+        p90=p90,
+        p99=p99,
+        daily=daily,
+        weekday_hour=heatmap.tolist(),
+        categories=categories,
+        anomalies=anomalies,
+    )
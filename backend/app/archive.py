@@ -0,0 +1,249 @@
+"""Archival of closed months out of the hot ``expenses`` table.
+
+``archive_expenses`` moves every expense dated before the archive cutoff into
+one ``expense_archive`` row per (user, month). Each row holds the month's
+expenses as zlib-compressed column arrays plus its count and total, and
+``expense_archive_totals`` keeps per-category count/total/min/max so reports
+never have to decode payloads. Totals are in the owner's base currency,
+converted with the rates of each expense's day. ``users.archived_before`` records how far back
+a user has been archived, so readers only look at the archive when a request
+actually reaches into an archived period.
+
+Archived expenses keep their id, ``recurring_id`` and ``sync_seq``. They are
+read-only: ``PUT``/``DELETE`` answer 409 (``archived_expense``), and moving
+them is not a change for sync, so ``/changes`` keeps serving them from the
+archive (a full sync returns them, incremental clients already hold them).
+Expenses backdated into an archived month after the fact stay in the hot table
+and are merged into the archive on the next run.
+
+Run it from cron with ``python -m app.archive``.
+"""
+import json
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .shards import engines, shard_session
+from . import fx, models, timezones
+
+DELETE_CHUNK = 1000
+
+COLUMNS = ("id", "description", "amount", "currency", "base_amount", "spent_at", "category_id")
+# Added later; payloads written before them decode with these defaults
+OPTIONAL_COLUMNS = {"recurring_id": None, "sync_seq": 0}
+
+
+@dataclass(frozen=True)
+class ArchivedExpense:
+    id: int
+    owner_id: int
+    description: str
+    amount: Decimal
+    currency: str
+    base_amount: Decimal  # in the owner's base currency at archive time
+    spent_at: datetime
+    category_id: Optional[int]
+    recurring_id: Optional[int] = None
+    sync_seq: int = 0
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def archive_cutoff(older_than_days: int | None = None, today: date | None = None) -> date:
+    """First day of the oldest month that stays hot."""
+    days = settings.archive_after_days if older_than_days is None else older_than_days
+    return month_start((today or date.today()) - timedelta(days=days))
+
+
+def encode_payload(expenses: list[ArchivedExpense]) -> bytes:
+    columns = {
+        "id": [e.id for e in expenses],
+        "description": [e.description for e in expenses],
+        "amount": [str(e.amount) for e in expenses],
+        "currency": [e.currency for e in expenses],
+        "base_amount": [str(e.base_amount) for e in expenses],
+        "spent_at": [e.spent_at.isoformat() for e in expenses],
+        "category_id": [e.category_id for e in expenses],
+        "recurring_id": [e.recurring_id for e in expenses],
+        "sync_seq": [e.sync_seq for e in expenses],
+    }
+    return zlib.compress(json.dumps(columns, separators=(",", ":")).encode(), 9)
+
+
+def decode_payload(owner_id: int, payload: bytes) -> list[ArchivedExpense]:
+    columns = json.loads(zlib.decompress(payload))
+    count = len(columns["id"])
+    extra = [columns.get(name, [default] * count) for name, default in OPTIONAL_COLUMNS.items()]
+    return [
+        ArchivedExpense(
+            id=id_,
+            owner_id=owner_id,
+            description=description,
+            amount=Decimal(amount),
+            currency=currency,
+            base_amount=Decimal(base_amount),
+            spent_at=timezones.naive_utc(datetime.fromisoformat(spent_at)),
+            category_id=category_id,
+            recurring_id=recurring_id,
+            sync_seq=sync_seq,
+        )
+        for id_, description, amount, currency, base_amount, spent_at, category_id, recurring_id, sync_seq
+        in zip(*(columns[name] for name in COLUMNS), *extra)
+    ]
+
+
+def reaches_archive(user: models.User, start: date | None) -> bool:
+    """Whether a range starting at ``start`` (None = unbounded) can touch archived months."""
+    return user.archived_before is not None and (start is None or start < user.archived_before)
+
+
+def archived_expenses(
+    db: Session,
+    owner_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    category_id: int | None = None,
+) -> list[ArchivedExpense]:
+    """Decode the archived expenses of a user within the half-open timestamp range ``[start, end)``."""
+    query = select(models.ArchivedMonth.payload).where(models.ArchivedMonth.owner_id == owner_id)
+    if start is not None:
+        query = query.where(models.ArchivedMonth.month >= month_start(start.date()))
+    if end is not None:
+        query = query.where(models.ArchivedMonth.month <= end.date())
+
+    result = []
+    for payload in db.scalars(query):
+        for expense in decode_payload(owner_id, payload):
+            if start is not None and expense.spent_at < start:
+                continue
+            if end is not None and expense.spent_at >= end:
+                continue
+            if category_id is not None and expense.category_id != category_id:
+                continue
+            result.append(expense)
+    return result
+
+
+def is_archived(db: Session, user: models.User, expense_id: int) -> bool:
+    """Whether ``expense_id`` is one of ``user``'s archived expenses (decodes their archive; for error paths)."""
+    if user.archived_before is None:
+        return False
+    return any(expense.id == expense_id for expense in archived_expenses(db, user.id))
+
+
+def _month_totals(owner_id: int, month: date, expenses: list[ArchivedExpense]) -> list[models.ArchivedMonthTotal]:
+    by_category: dict[Optional[int], list[Decimal]] = defaultdict(list)
+    for expense in expenses:
+        by_category[expense.category_id].append(expense.base_amount)
+    return [
+        models.ArchivedMonthTotal(
+            owner_id=owner_id,
+            month=month,
+            category_id=category_id,
+            expense_count=len(amounts),
+            total=sum(amounts, Decimal("0")),
+            min_amount=min(amounts),
+            max_amount=max(amounts),
+        )
+        for category_id, amounts in by_category.items()
+    ]
+
+
+def archive_owner(db: Session, owner_id: int, cutoff: date) -> int:
+    """Move one user's expenses dated before ``cutoff`` into the archive. Returns rows moved."""
+    user = db.get(models.User, owner_id)
+    rows = db.execute(
+        fx.converted_expenses(
+            user.base_currency,
+            models.Expense.id,
+            models.Expense.owner_id,
+            models.Expense.description,
+            models.Expense.amount,
+            models.Expense.currency,
+            models.Expense.spent_at,
+            models.Expense.category_id,
+            models.Expense.recurring_id,
+            models.Expense.sync_seq,
+        )
+        .where(models.Expense.owner_id == owner_id)
+        .where(models.Expense.spent_at < datetime.combine(cutoff, datetime.min.time()))
+        .order_by(models.Expense.spent_at)
+        .with_for_update(of=models.Expense)
+    ).all()
+    if not rows:
+        return 0
+
+    by_month: dict[date, list[ArchivedExpense]] = defaultdict(list)
+    for row in rows:
+        expense = ArchivedExpense(**{**row._mapping, "spent_at": timezones.naive_utc(row.spent_at)})
+        by_month[month_start(expense.spent_at.date())].append(expense)
+
+    for month, expenses in by_month.items():
+        archived = db.scalar(
+            select(models.ArchivedMonth)
+            .where(models.ArchivedMonth.owner_id == owner_id, models.ArchivedMonth.month == month)
+        )
+        if archived is None:
+            archived = models.ArchivedMonth(owner_id=owner_id, month=month)
+            db.add(archived)
+        else:
+            # Backdated expenses added after the month was archived
+            expenses = sorted(decode_payload(owner_id, archived.payload) + expenses, key=lambda e: e.spent_at)
+        archived.expense_count = len(expenses)
+        archived.total = sum((e.base_amount for e in expenses), Decimal("0"))
+        archived.payload = encode_payload(expenses)
+        archived.archived_at = datetime.utcnow()
+
+        db.execute(
+            delete(models.ArchivedMonthTotal)
+            .where(models.ArchivedMonthTotal.owner_id == owner_id, models.ArchivedMonthTotal.month == month)
+        )
+        db.add_all(_month_totals(owner_id, month, expenses))
+
+    # Core deletes bypass the sync hook on purpose: archived expenses stay in the change feed
+    ids = [row.id for row in rows]
+    for i in range(0, len(ids), DELETE_CHUNK):
+        db.execute(delete(models.Expense).where(models.Expense.id.in_(ids[i:i + DELETE_CHUNK])))
+
+    if user.archived_before is None or user.archived_before < cutoff:
+        user.archived_before = cutoff
+    return len(rows)
+
+
+def archive_expenses(older_than_days: int | None = None) -> int:
+    """Archive every user's closed months. Each user is moved in its own transaction."""
+    cutoff = archive_cutoff(older_than_days)
+    moved = 0
+    for shard in range(len(engines)):
+        with shard_session(shard) as db:
+            owner_ids = db.scalars(
+                select(models.Expense.owner_id)
+                .where(models.Expense.spent_at < datetime.combine(cutoff, datetime.min.time()))
+                .group_by(models.Expense.owner_id)
+            ).all()
+        for owner_id in owner_ids:
+            with shard_session(shard) as db:
+                moved += archive_owner(db, owner_id, cutoff)
+    return moved
+
+
+def archived_spend(owner_id: int):
+    """Selectable of (category_id, base_amount) archive rows, to union with live expenses in reports."""
+    return (
+        select(models.ArchivedMonthTotal.category_id, models.ArchivedMonthTotal.total.label("base_amount"))
+        .where(models.ArchivedMonthTotal.owner_id == owner_id)
+    )
+
+
+if __name__ == "__main__":
+    count = archive_expenses()
+    print(f"Archived {count} expenses older than {archive_cutoff()}")
@@ -0,0 +1,200 @@
+"""Receipt storage.
+
+Files live on local disk under ``ATTACHMENT_DIR``, named by their SHA-256
+(``objects/ab/abcdef...``), so identical uploads share one file; an
+``Attachment`` row ties a file to an expense.
+
+* Uploads are read from the request body as it arrives and written to a
+  temporary file in ``ATTACHMENT_WRITE_BYTES`` blocks while being hashed, then
+  renamed into place (or dropped when the object already exists). Memory per
+  upload is bounded by the block size, whatever the file size.
+* Downloads are ``FileResponse``s: streamed from disk in chunks, with ``Range``
+  requests and the content hash as a strong ``ETag``. The stored type is the
+  one the client declared, so only ``INLINE_TYPES`` are shown inline, everything
+  else is sent as a download, and ``nosniff`` stops browsers from second-guessing
+  either.
+* Image thumbnails are rendered after the upload has been answered, in a pool
+  of ``THUMBNAIL_WORKERS`` processes with at most ``THUMBNAIL_QUEUE_SIZE``
+  waiting; beyond that a thumbnail is skipped. They need the optional
+  ``Pillow`` package.
+
+Rows are deleted with their expense or by the API; files are only removed by
+``python -m app.attachments gc``, once no row on any shard references them and
+they have not been written for ``GC_GRACE``.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from . import models, shards
+from .config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: no thumbnails
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "application/pdf")
+THUMBNAIL_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+# Raster images render without running anything; PDFs can carry scripts
+INLINE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+GC_GRACE = timedelta(hours=1)
+
+root = Path(settings.attachment_dir)
+
+
+def object_path(sha256: str) -> Path:
+    return root / "objects" / sha256[:2] / sha256
+
+
+def thumbnail_path(sha256: str) -> Path:
+    return root / "thumbnails" / sha256[:2] / f"{sha256}.jpg"
+
+
+def _write(handle, digest, data: bytearray) -> None:
+    digest.update(data)
+    handle.write(data)
+
+
+def _commit(temp_path: str, sha256: str) -> None:
+    target = object_path(sha256)
+    if target.exists():
+        os.unlink(temp_path)
+        # Counts as a fresh write, so gc leaves the object alone while its new row is committed
+        os.utime(target)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, target)
+
+
+async def store(chunks, declared_size: int | None = None) -> tuple[str, int]:
+    """Write an async iterator of byte chunks to storage; return its SHA-256 and size."""
+    limit = settings.attachment_max_bytes
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Attachments are limited to {limit} bytes",
+    )
+    if declared_size is not None and declared_size > limit:
+        raise too_large
+
+    temp_dir = root / "tmp"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    handle = await run_in_threadpool(tempfile.NamedTemporaryFile, dir=temp_dir, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    block = bytearray()
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > limit:
+                raise too_large
+            block += chunk
+            if len(block) >= settings.attachment_write_bytes:
+                await run_in_threadpool(_write, handle, digest, block)
+                block = bytearray()
+        await run_in_threadpool(_write, handle, digest, block)
+        await run_in_threadpool(handle.close)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        sha256 = digest.hexdigest()
+        await run_in_threadpool(_commit, handle.name, sha256)
+    except BaseException:
+        handle.close()
+        Path(handle.name).unlink(missing_ok=True)
+        raise
+    return sha256, size
+
+
+def render_thumbnail(source: str, target: str, size: int) -> None:
+    """Write a JPEG no larger than ``size`` pixels per side (runs in a pool process)."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        temp = f"{target}.{os.getpid()}.tmp"
+        image.convert("RGB").save(temp, "JPEG", quality=80)
+    os.replace(temp, target)
+
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.thumbnail_workers + settings.thumbnail_queue_size)
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned, not forked: workers must not inherit the server's threads and connections
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.thumbnail_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _thumbnail_done(sha256: str, future) -> None:
+    _slots.release()
+    if future.exception() is not None:
+        logger.warning("Thumbnail of %s failed: %s", sha256, future.exception())
+
+
+def schedule_thumbnail(sha256: str, content_type: str) -> None:
+    """Queue a thumbnail for an image unless it exists, Pillow is missing or the queue is full."""
+    target = thumbnail_path(sha256)
+    if Image is None or content_type not in THUMBNAIL_TYPES or target.exists():
+        return
+    if not _slots.acquire(blocking=False):
+        logger.warning("Thumbnail queue full; skipping %s", sha256)
+        return
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        future = _pool().submit(render_thumbnail, str(object_path(sha256)), str(target), settings.thumbnail_size)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda done: _thumbnail_done(sha256, done))
+
+
+def referenced_hashes() -> set[str]:
+    hashes = set()
+    for shard in range(len(shards.engines)):
+        with shards.shard_session(shard) as db:
+            hashes.update(db.scalars(select(models.Attachment.sha256).distinct()))
+    return hashes
+
+
+def collect_garbage() -> int:
+    """Delete stored files no attachment row references; return how many objects went."""
+    cutoff = time.time() - GC_GRACE.total_seconds()
+    referenced = referenced_hashes()
+    removed = 0
+    for path in (root / "objects").glob("*/*"):
+        if path.name not in referenced and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            thumbnail_path(path.name).unlink(missing_ok=True)
+            removed += 1
+    # Temporary files of uploads that were interrupted by a crash
+    for path in (root / "tmp").glob("*"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+    return removed
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["gc"]:
+        sys.exit("usage: python -m app.attachments gc")
+    print(f"Removed {collect_garbage()} unreferenced attachment files")
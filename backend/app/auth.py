@@ -17,6 +17,9 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme for token extraction (must match /auth/login)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_prefix}/auth/login")
 
+# Scope claim of event stream tickets, which travel in URLs and so expire within seconds
+STREAM_TICKET_SCOPE = "events"
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
@@ -40,8 +43,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
-    """Dependency to get the current authenticated user from JWT token."""
+def create_stream_ticket(user_id: int) -> str:
+    """Create a short-lived token that only opens the event stream (``GET /events``)."""
+    return create_access_token(
+        data={"sub": str(user_id), "scope": STREAM_TICKET_SCOPE},
+        expires_delta=timedelta(seconds=settings.stream_ticket_seconds),
+    )
+
+
+def authenticate_token(token: str, db: Session, scope: str | None = None) -> models.User:
+    """Resolve a JWT to its user, raising 401 if it is invalid or not issued for ``scope``.
+
+    Access tokens carry no scope; stream tickets are only accepted with ``scope=STREAM_TICKET_SCOPE``.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,7 +64,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         user_id: int | None = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
@@ -59,3 +73,8 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if user is None:
         raise credentials_exception
     return user
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+    """Dependency to get the current authenticated user from JWT token."""
+    return authenticate_token(token, db)
@@ -0,0 +1,275 @@
+"""Response compression.
+
+``CompressionMiddleware`` negotiates ``br`` (when the optional ``brotli``
+package is installed) or ``gzip`` from ``Accept-Encoding`` q-values and
+compresses JSON and text responses of at least ``COMPRESSION_MIN_SIZE`` bytes.
+
+* Complete bodies are compressed in one call; bodies over ``OFFLOAD_BYTES``
+  are compressed in the threadpool so the event loop is not blocked.
+* Streamed bodies (several body messages) go through an incremental encoder
+  that flushes after every chunk, so clients still receive each chunk as it is
+  produced. Server-sent events are left alone.
+* GET responses are cached compressed, keyed by a hash of the uncompressed body
+  and the encoding, in a byte-bounded LRU (``COMPRESSION_CACHE_BYTES``). A
+  repeated identical response (an unchanged dashboard or expense page) costs
+  one hash instead of a compression pass. Compression is deterministic (gzip
+  mtime is fixed), so cached and fresh bytes are identical.
+
+Per-route ratios, CPU time and cache hits are served by ``/metrics/compression``.
+"""
+import gzip
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "text/",
+    "application/javascript",
+    "application/xml",
+    "application/msgpack",
+    "application/vnd.expenses.columnar+msgpack",
+)
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+OFFLOAD_BYTES = 64 * 1024
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Best supported encoding for an ``Accept-Encoding`` header; brotli wins ties."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in (("br",) if brotli else ()) + ("gzip",):
+        quality = offered.get(encoding, offered.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str) -> tuple[bytes, float]:
+    """Compress ``data``; returns the result and the CPU seconds spent."""
+    started = time.thread_time()
+    if encoding == "br":
+        result = brotli.compress(data, quality=settings.brotli_quality)
+    else:
+        result = gzip.compress(data, compresslevel=settings.gzip_level, mtime=0)
+    return result, time.thread_time() - started
+
+
+class StreamEncoder:
+    """Incremental encoder that flushes after each chunk."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if last else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressedCache:
+    """Byte-bounded LRU of (body hash, encoding) -> compressed body."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[bytes, str]) -> bytes | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple[bytes, str], value: bytes) -> None:
+        if len(value) > self.max_bytes // 8:
+            return  # one huge export must not flush everything else
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+@dataclass
+class RouteStats:
+    responses: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    cpu_seconds: float = 0.0
+    cache_hits: int = 0
+
+
+class CompressionStats:
+    def __init__(self):
+        self._routes: dict[tuple[str, str], RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float, cache_hit: bool):
+        with self._lock:
+            stats = self._routes.setdefault((route, encoding), RouteStats())
+            stats.responses += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.cpu_seconds += cpu_seconds
+            stats.cache_hits += cache_hit
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "route": route,
+                    "encoding": encoding,
+                    "responses": stats.responses,
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "ratio": stats.bytes_in / stats.bytes_out if stats.bytes_out else 0.0,
+                    "cpu_ms": stats.cpu_seconds * 1000,
+                    "cache_hits": stats.cache_hits,
+                }
+                for (route, encoding), stats in sorted(self._routes.items())
+            ]
+
+
+compressed_cache = CompressedCache(settings.compression_cache_bytes)
+compression_stats = CompressionStats()
+
+
+def _route_name(scope) -> str:
+    # Set by routing once the request has been handled; the template keeps ids out of the key
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        "content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+    )
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next((value for name, value in scope.get("headers", ()) if name == b"accept-encoding"), b"")
+        encoding = choose_encoding(accept.decode("latin-1")) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+        bytes_in = bytes_out = 0
+        cpu_seconds = 0.0
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough, bytes_in, bytes_out, cpu_seconds
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(scope=start)
+                if not _compressible(headers) or start["status"] in (204, 304):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                declared = headers.get("content-length")
+                small = len(body) < settings.compression_min_size if not more_body else (
+                    declared is not None and int(declared) < settings.compression_min_size
+                )
+                if small:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                if not more_body:
+                    compressed = await self._compress_whole(scope, start, body, encoding)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                del headers["Content-Length"]
+                encoder = StreamEncoder(encoding)
+                await send(start)
+
+            started = time.thread_time()
+            chunk = encoder.chunk(body, last=not more_body)
+            cpu_seconds += time.thread_time() - started
+            bytes_in += len(body)
+            bytes_out += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if not more_body:
+                compression_stats.record(_route_name(scope), encoding, bytes_in, bytes_out, cpu_seconds, False)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _compress_whole(self, scope, start, body: bytes, encoding: str) -> bytes:
+        cacheable = scope["method"] == "GET" and "no-store" not in MutableHeaders(scope=start).get("cache-control", "")
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding) if cacheable else None
+        compressed = compressed_cache.get(key) if key else None
+        if compressed is not None:
+            compression_stats.record(_route_name(scope), encoding, len(body), len(compressed), 0.0, True)
+            return compressed
+
+        if len(body) > OFFLOAD_BYTES:
+            compressed, cpu_seconds = await run_in_threadpool(compress, body, encoding)
+        else:
+            compressed, cpu_seconds = compress(body, encoding)
+        if key:
+            compressed_cache.put(key, compressed)
+        compression_stats.record(_route_name(scope), encoding, len(body), len(compressed), cpu_seconds, False)
+        return compressed
@@ -1,11 +1,51 @@
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from .config import settings
+from .sql import sqlite_local_date
 
 
-db_engine = create_engine(settings.database_url, future=True)
+def _sqlite_pragmas() -> dict[str, str | int]:
+    return {
+        # Readers no longer block the writer and vice versa; NORMAL sync is durable in WAL mode
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",  # ON DELETE CASCADE / SET NULL, as on PostgreSQL
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "cache_size": -settings.sqlite_cache_mb * 1024,  # negative = KiB
+        "temp_store": "MEMORY",
+        "mmap_size": settings.sqlite_mmap_mb * 1024 * 1024,
+    }
+
+
+def create_db_engine(url: str) -> Engine:
+    """Engine for ``url``; SQLite connections get WAL, tuned pragmas and ``local_date`` on connect.
+
+    PostgreSQL sessions run in UTC, so the naive UTC timestamps the app writes
+    are stored as the instants they denote whatever the server's ``TimeZone``.
+    """
+    if url.startswith("postgresql"):
+        return create_engine(url, future=True, connect_args={"options": "-c timezone=UTC"})
+    if not url.startswith("sqlite"):
+        return create_engine(url, future=True)
+
+    engine = create_engine(url, future=True, connect_args={"check_same_thread": False})
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+        dbapi_connection.create_function("local_date", 2, sqlite_local_date, deterministic=True)
+
+    return engine
+
+
+db_engine = create_db_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=db_engine, future=True)
 
 
@@ -14,8 +54,8 @@ class Base(DeclarativeBase):
 
 
 @contextmanager
-def get_session():
-    session = SessionLocal()
+def get_session(bind: Engine | None = None):
+    session = SessionLocal(bind=bind) if bind is not None else SessionLocal()
     try:
         yield session
         session.commit()
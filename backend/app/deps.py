@@ -1,10 +1,112 @@
-from fastapi import Depends
+"""Request-scoped database sessions.
+
+``get_db`` gives a request a session on the caller's shard. A session checks out
+a pooled connection only when it first runs a statement, and in routers built
+with ``route_class=SessionRoute`` it gives the connection back as soon as the
+endpoint returns, before FastAPI validates and serializes the response: the
+session commits if it still holds unsaved writes (read-only requests skip the
+commit) and closes. Request sessions do not expire objects on commit, so the
+rows a handler returns stay readable once the session is closed.
+"""
+import functools
+import inspect
+from contextvars import ContextVar
+
+from fastapi import Request
+from fastapi.routing import APIRoute
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from .database import get_session
+from . import shards
+from .database import SessionLocal
+
+# Sessions opened by get_db for the request being handled in this context
+_request_sessions: ContextVar[list[Session] | None] = ContextVar("request_sessions", default=None)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_unsaved(session: Session, flush_context) -> None:
+    session.info["unsaved_writes"] = True
+
 
+@event.listens_for(SessionLocal, "after_commit")
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _clear_unsaved(session: Session, *args) -> None:
+    session.info.pop("unsaved_writes", None)
 
-def get_db() -> Session:
-    # FastAPI dependency to provide a SQLAlchemy session per request
-    with get_session() as session:
+
+def release(session: Session) -> None:
+    """Commit ``session`` if it holds writes that were not committed, then return its connection."""
+    try:
+        if session.info.get("unsaved_writes") or session.new or session.dirty or session.deleted:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def serve(session: Session):
+    """Yield ``session`` to one request and release it afterwards (also used by ``app.testing``)."""
+    sessions = _request_sessions.get()
+    if sessions is not None:
+        sessions.append(session)
+    try:
         yield session
+        release(session)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_db(request: Request) -> Session:
+    # FastAPI dependency to provide a SQLAlchemy session per request, on the caller's shard
+    yield from serve(SessionLocal(bind=shards.engine_for_request(request), expire_on_commit=False))
+
+
+def _releasing(endpoint):
+    """Wrap ``endpoint`` to release the request's sessions once it has returned."""
+    if getattr(endpoint, "releases_sessions", False):
+        # include_router() builds its routes again from the already wrapped endpoints
+        return endpoint
+
+    def release_all():
+        for session in _request_sessions.get() or ():
+            release(session)
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            release_all()
+            return result
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            result = endpoint(*args, **kwargs)
+            release_all()
+            return result
+    wrapper.releases_sessions = True
+    return wrapper
+
+
+class SessionRoute(APIRoute):
+    """Route that releases ``get_db`` sessions between the endpoint and response serialization."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _releasing(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            token = _request_sessions.set([])
+            try:
+                return await handler(request)
+            finally:
+                _request_sessions.reset(token)
+
+        return route_handler
@@ -0,0 +1,189 @@
+"""Nightly budget overrun forecasting for all users.
+
+The user id space of each shard is cut into contiguous ranges that are
+processed in parallel by a process pool. Inside a range, users are streamed in fixed-size chunks:
+for each chunk one query loads the chunk's budgets for the current month and
+one aggregate query loads its month-to-date spend per (owner, category), with
+expenses assigned to months in each owner's time zone. Burn rates and month-end
+projections are then computed for the whole chunk at once with NumPy, and the
+chunk's ``budget_forecasts`` rows are replaced in bulk.
+Memory therefore depends on ``FORECAST_CHUNK_USERS``, not on the user count.
+
+Run it nightly with ``python -m app.forecast``; ``GET /budgets/forecasts``
+only reads the precomputed rows.
+"""
+import calendar
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+
+from .config import settings
+from . import fx, models
+from .shards import engines, shard_session
+from .sql import local_day
+
+logger = logging.getLogger(__name__)
+
+# Budgets and spend are matched on owner_id << 32 | category_id; 0 stands for "all categories"
+CATEGORY_BITS = 32
+# No time zone is further than this from UTC
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+
+def _keys(owners: np.ndarray, categories: np.ndarray) -> np.ndarray:
+    return (owners.astype(np.int64) << CATEGORY_BITS) | categories.astype(np.int64)
+
+
+def forecast_chunk(shard: int, first_owner: int, last_owner: int, today: date) -> int:
+    """Recompute forecasts for owners in ``[first_owner, last_owner]`` on one shard. Returns rows written."""
+    month = today.replace(day=1)
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    elapsed = today.day
+    month_start = datetime.combine(month, datetime.min.time())
+    next_month = month_start + timedelta(days=days_in_month)
+
+    with shard_session(shard) as db:
+        budgets = db.execute(
+            select(models.Budget.id, models.Budget.owner_id, models.Budget.category_id, models.Budget.amount)
+            .where(models.Budget.owner_id.between(first_owner, last_owner))
+            .where(models.Budget.month == month)
+        ).all()
+        if budgets:
+            # Converted to each owner's base currency, which budgets are expressed in. The UTC
+            # range is widened by the largest zone offsets, then narrowed to each owner's local month.
+            local = local_day(models.Expense.spent_at, models.User.timezone)
+            converted = (
+                fx.converted_expenses(None, models.Expense.owner_id, models.Expense.category_id)
+                .where(models.Expense.owner_id.between(first_owner, last_owner))
+                .where(models.Expense.spent_at >= month_start - MAX_UTC_OFFSET)
+                .where(models.Expense.spent_at < next_month + MAX_UTC_OFFSET)
+                .where(local >= month, local < next_month.date())
+                .subquery()
+            )
+            grouped = db.execute(
+                select(
+                    converted.c.owner_id,
+                    converted.c.category_id,
+                    func.coalesce(func.sum(converted.c.base_amount), 0),
+                    fx.unconverted(converted.c.base_amount),
+                )
+                .group_by(converted.c.owner_id, converted.c.category_id)
+            ).all()
+            for owner_id in sorted({row[0] for row in grouped if row[3]}):
+                logger.warning("Forecast for user %s leaves out expenses without an exchange rate", owner_id)
+            spend = [row[:3] for row in grouped]
+        else:
+            spend = []
+
+        db.execute(
+            delete(models.BudgetForecast)
+            .where(models.BudgetForecast.owner_id.between(first_owner, last_owner))
+        )
+        if not budgets:
+            return 0
+
+        budget_ids = np.fromiter((row[0] for row in budgets), dtype=np.int64, count=len(budgets))
+        budget_owners = np.fromiter((row[1] for row in budgets), dtype=np.int64, count=len(budgets))
+        budget_categories = np.fromiter((row[2] or 0 for row in budgets), dtype=np.int64, count=len(budgets))
+        budget_amounts = np.fromiter((row[3] for row in budgets), dtype=np.float64, count=len(budgets))
+
+        spend_owners = np.fromiter((row[0] for row in spend), dtype=np.int64, count=len(spend))
+        spend_categories = np.fromiter((row[1] or 0 for row in spend), dtype=np.int64, count=len(spend))
+        spend_totals = np.fromiter((row[2] for row in spend), dtype=np.float64, count=len(spend))
+
+        # Overall (category 0) spend per owner, including uncategorized expenses
+        unique_owners, owner_index = np.unique(spend_owners, return_inverse=True)
+        owner_totals = np.bincount(owner_index, weights=spend_totals, minlength=len(unique_owners))
+        categorized = spend_categories != 0
+        keys = np.concatenate([
+            _keys(spend_owners[categorized], spend_categories[categorized]),
+            _keys(unique_owners, np.zeros_like(unique_owners)),
+        ])
+        values = np.concatenate([spend_totals[categorized], owner_totals])
+        order = np.argsort(keys)
+        keys, values = keys[order], values[order]
+
+        wanted = _keys(budget_owners, budget_categories)
+        if len(keys):
+            positions = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+            spent = np.where(keys[positions] == wanted, values[positions], 0.0)
+        else:
+            spent = np.zeros(len(wanted))
+
+        daily_rate = spent / elapsed
+        projected = daily_rate * days_in_month
+        ratio = np.divide(projected, budget_amounts, out=np.zeros_like(projected), where=budget_amounts > 0)
+        will_overrun = projected > budget_amounts
+        days_to_exhaust = np.divide(budget_amounts, daily_rate, out=np.full_like(daily_rate, np.inf), where=daily_rate > 0)
+
+        computed_at = datetime.utcnow()
+        rows = [
+            {
+                "budget_id": int(budget_ids[i]),
+                "owner_id": int(budget_owners[i]),
+                "month": month,
+                "spent": round(float(spent[i]), 2),
+                "projected": round(float(projected[i]), 2),
+                "projected_ratio": float(ratio[i]),
+                "will_overrun": bool(will_overrun[i]),
+                "overrun_on": (
+                    month + timedelta(days=max(math.ceil(days_to_exhaust[i]) - 1, 0))
+                    if will_overrun[i] else None
+                ),
+                "computed_at": computed_at,
+            }
+            for i in range(len(budgets))
+        ]
+        db.execute(insert(models.BudgetForecast), rows)
+    return len(rows)
+
+
+def forecast_range(shard: int, first_owner: int, last_owner: int, today: date, chunk_users: int) -> int:
+    written = 0
+    for start in range(first_owner, last_owner + 1, chunk_users):
+        written += forecast_chunk(shard, start, min(start + chunk_users - 1, last_owner), today)
+    return written
+
+
+def _init_worker() -> None:
+    # Pooled connections inherited through fork must not be shared with the parent
+    for engine in engines:
+        engine.dispose(close=False)
+
+
+def run_forecasts(today: date | None = None, workers: int | None = None, chunk_users: int | None = None) -> int:
+    """Forecast every budget of the current month. Returns the number of forecasts written."""
+    today = today or date.today()
+    workers = workers or settings.forecast_workers
+    chunk_users = chunk_users or settings.forecast_chunk_users
+
+    ranges = []
+    for shard in range(len(engines)):
+        with shard_session(shard) as db:
+            first_owner, last_owner = db.execute(select(func.min(models.User.id), func.max(models.User.id))).one()
+        if first_owner is None:
+            continue
+        # Several ranges per worker so one dense range does not leave the others idle
+        span = last_owner - first_owner + 1
+        range_size = max(chunk_users, math.ceil(span / (workers * 4)))
+        ranges += [
+            (shard, start, min(start + range_size - 1, last_owner))
+            for start in range(first_owner, last_owner + 1, range_size)
+        ]
+    if workers == 1 or len(ranges) <= 1:
+        return sum(forecast_range(shard, lo, hi, today, chunk_users) for shard, lo, hi in ranges)
+
+    for engine in engines:
+        engine.dispose()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(forecast_range, shard, lo, hi, today, chunk_users) for shard, lo, hi in ranges]
+        return sum(future.result() for future in futures)
+
+
+if __name__ == "__main__":
+    count = run_forecasts()
+    print(f"Wrote {count} budget forecasts")
@@ -0,0 +1,175 @@
+"""Binary response formats selected by the ``Accept`` header.
+
+JSON stays the default. Endpoints that opt in also offer:
+
+* ``application/msgpack``: the same document as the JSON response, MessagePack
+  encoded. Decimals and datetimes keep their JSON string form, so no precision
+  is lost.
+* ``application/vnd.expenses.columnar+msgpack``, for row lists: a MessagePack
+  map of columns. Numeric columns are packed little-endian int64 byte strings
+  (amounts as integers scaled by ``amount_scale``, timestamps as microseconds
+  since the Unix epoch, nullable ids with 0 for null) and text columns are
+  plain lists. Clients decode them with e.g. ``numpy.frombuffer(col, "<i8")``.
+
+List endpoints with a ``fields=`` parameter narrow every format to the named
+fields of their response model (``field_selection``, ``sparse_model``).
+
+See ``benchmarks/bench_formats.py`` for encode time and size against JSON.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+
+import msgpack
+import numpy as np
+from fastapi import Header, HTTPException, Query, Response, status
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR = "application/vnd.expenses.columnar+msgpack"
+SUPPORTED = (JSON, MSGPACK, COLUMNAR)
+
+# OpenAPI documentation for endpoints that offer the binary formats
+BINARY_RESPONSES = {200: {"content": {MSGPACK: {}, COLUMNAR: {}}}}
+
+AMOUNT_SCALE = 2
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def response_format(response: Response, accept: str | None = Header(default=None)) -> str:
+    """Dependency: the supported media type with the highest q-value in ``Accept`` (JSON on ties).
+
+    Marks the response as varying on ``Accept`` whatever the outcome, so caches
+    never hand a default JSON body to a client asking for MessagePack.
+    """
+    response.headers["Vary"] = "Accept"
+    best, best_quality = JSON, 0.0
+    for part in (accept or "").split(","):
+        media_type, _, params = part.partition(";")
+        media_type = media_type.strip().lower()
+        if media_type not in SUPPORTED:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def field_selection(model: type[BaseModel]):
+    """Dependency factory: the ``fields=`` query parameter as a tuple of ``model`` fields, or None for all."""
+    allowed = tuple(model.model_fields)
+
+    def dependency(
+        fields: str | None = Query(default=None, description=f"Comma-separated subset of: {', '.join(allowed)}"),
+    ) -> tuple[str, ...] | None:
+        requested = {name.strip() for name in (fields or "").split(",") if name.strip()}
+        if not requested:
+            # "?fields=", "?fields=," and blanks select everything, like no parameter at all
+            return None
+        unknown = requested.difference(allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+        # Schema order, so equal selections share one query and one model
+        return tuple(name for name in allowed if name in requested)
+
+    return dependency
+
+
+@lru_cache(maxsize=None)
+def sparse_model(model: type[BaseModel], fields: tuple[str, ...] | None) -> type[BaseModel]:
+    """``model`` restricted to ``fields`` (the model itself for None)."""
+    if fields is None:
+        return model
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields},
+    )
+
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def _packed(values, count: int) -> bytes:
+    return np.fromiter(values, dtype="<i8", count=count).tobytes()
+
+
+def _scaled(amount: Decimal) -> int:
+    scaled = amount.scaleb(AMOUNT_SCALE)
+    integral = scaled.to_integral_value()
+    if integral != scaled:
+        raise ValueError(f"{amount} has more than {AMOUNT_SCALE} decimal places")
+    return int(integral)
+
+
+def _micros(value: datetime) -> int:
+    return (value - (EPOCH if value.tzinfo is None else EPOCH_UTC)) // ONE_MICROSECOND
+
+
+def expense_columns(expenses, fields: tuple[str, ...] | None = None) -> dict:
+    count = len(expenses)
+    columns = {
+        "id": lambda: _packed((e.id for e in expenses), count),
+        "owner_id": lambda: _packed((e.owner_id for e in expenses), count),
+        "amount": lambda: _packed((_scaled(e.amount) for e in expenses), count),
+        "spent_at": lambda: _packed((_micros(e.spent_at) for e in expenses), count),
+        "category_id": lambda: _packed((e.category_id or 0 for e in expenses), count),
+        "recurring_id": lambda: _packed((e.recurring_id or 0 for e in expenses), count),
+        "description": lambda: [e.description for e in expenses],
+        "currency": lambda: [e.currency for e in expenses],
+    }
+    return {
+        "count": count,
+        "amount_scale": AMOUNT_SCALE,
+        **{name: build() for name, build in columns.items() if fields is None or name in fields},
+    }
+
+
+def daily_total_columns(totals) -> dict:
+    count = len(totals)
+    return {
+        "count": count,
+        "amount_scale": AMOUNT_SCALE,
+        # Days since the Unix epoch
+        "day": _packed((t.day.toordinal() - EPOCH.toordinal() for t in totals), count),
+        "total": _packed((_scaled(Decimal(t.total)) for t in totals), count),
+    }
+
+
+def render(media_type: str, model, data, columns=None, fields: tuple[str, ...] | None = None):
+    """Return ``data`` for FastAPI to serialize as JSON, or an encoded binary ``Response``.
+
+    ``model`` is the endpoint's response model; ``columns`` builds the columnar
+    layout and is omitted by endpoints that do not return row lists, which then
+    answer columnar requests with plain MessagePack. With ``fields``, ``model``
+    is the matching ``sparse_model`` and JSON is encoded here, since the data no
+    longer fits the endpoint's declared response model.
+    """
+    if media_type == JSON:
+        if fields is None:
+            return data
+        adapter = _adapter(model)
+        content = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+        return Response(content, media_type=JSON, headers={"Vary": "Accept"})
+    if media_type == COLUMNAR and columns is not None:
+        content = columns(data, fields) if fields is not None else columns(data)
+    else:
+        media_type = MSGPACK
+        adapter = _adapter(model)
+        content = adapter.dump_python(adapter.validate_python(data, from_attributes=True), mode="json")
+    return Response(msgpack.packb(content), media_type=media_type, headers={"Vary": "Accept"})
@@ -0,0 +1,147 @@
+"""Currency conversion.
+
+``fx_rates`` holds one rate per (currency, day): the value of one unit of that
+currency in the pivot currency (``FX_PIVOT_CURRENCY``, which is implicitly 1).
+Reports convert expenses to the user's base currency inside the aggregation
+query by joining ``fx_rates`` twice (expense currency and base currency) on the
+expense day, so no rows are pulled into Python and no per-expense lookups are
+made. Writes validate that the rates they will need exist, through a bounded
+in-process cache of recent rates, for the UTC day the join uses.
+
+A foreign expense whose day has no rate (rates loaded late, templates
+materialized ahead of them) converts to NULL, which SQL sums would skip.
+Aggregates count those rows with ``unconverted`` and refuse to answer with
+``check_converted`` rather than report a silently short total.
+
+Load rates with ``python -m app.fx rates.csv`` (columns: currency,day,rate).
+"""
+import csv
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from fastapi import HTTPException, status
+from sqlalchemy import BindParameter, and_, case, func, literal, select
+from sqlalchemy.orm import Session, aliased
+
+from .config import settings
+from . import models, shards
+from .sql import day_of
+
+
+class RateCache:
+    """Bounded LRU of (currency, day) -> rate. Only hits are cached."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, date], Decimal] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, currency: str, day: date) -> Decimal | None:
+        if currency == settings.fx_pivot_currency:
+            return Decimal(1)
+        key = (currency, day)
+        with self._lock:
+            rate = self._entries.get(key)
+            if rate is not None:
+                self._entries.move_to_end(key)
+                return rate
+        row = db.get(models.FxRate, key)
+        if row is None:
+            return None
+        with self._lock:
+            self._entries[key] = row.rate
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return row.rate
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+rate_cache = RateCache(settings.fx_cache_size)
+
+
+def require_rates(db: Session, currency: str, base_currency: str, day: date) -> None:
+    """Reject a write whose amount could not be converted to the user's base currency."""
+    if currency == base_currency:
+        return
+    for code in (currency, base_currency):
+        if rate_cache.get(db, code, day) is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"No exchange rate for {code} on {day.isoformat()}",
+            )
+
+
+def unconverted(base_amount):
+    """Aggregate: how many rows have no ``base_amount`` (a foreign amount without a rate for its day)."""
+    return (func.count() - func.count(base_amount)).label("unconverted")
+
+
+def check_converted(count: int, base_currency: str) -> None:
+    """Fail a report that would leave out ``count`` expenses it cannot convert."""
+    if count:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{count} expense(s) have no exchange rate into {base_currency} for their day",
+        )
+
+
+def _rate(alias, currency):
+    return case((currency == settings.fx_pivot_currency, literal(1)), else_=alias.rate)
+
+
+def converted_expenses(base_currency: str | BindParameter | None, *columns):
+    """``select(*columns, base_amount)`` over expenses, converted to the base currency.
+
+    Pass the user's base currency (a string or a bound parameter), or None to
+    convert every row to its owner's base currency (joins ``users``). Callers
+    add their own filters and grouping.
+    """
+    expense = models.Expense
+    if base_currency is None:
+        base = models.User.base_currency
+    elif isinstance(base_currency, str):
+        base = literal(base_currency)
+    else:
+        base = base_currency
+    day = day_of(expense.spent_at)
+    source = aliased(models.FxRate)
+    target = aliased(models.FxRate)
+    foreign = expense.currency != base
+
+    amount = case(
+        (expense.currency == base, expense.amount),
+        else_=func.round(expense.amount * _rate(source, expense.currency) / _rate(target, base), 2),
+    ).label("base_amount")
+
+    query = select(*columns, amount).select_from(expense)
+    if base_currency is None:
+        query = query.join(models.User, models.User.id == expense.owner_id)
+    return (
+        query
+        .outerjoin(source, and_(foreign, source.currency == expense.currency, source.day == day))
+        .outerjoin(target, and_(foreign, target.currency == base, target.day == day))
+    )
+
+
+def load_rates(rows) -> int:
+    """Insert or replace ``(currency, day, rate)`` rows on every shard."""
+    rows = [(currency.upper(), day, Decimal(rate)) for currency, day, rate in rows]
+    for shard in range(len(shards.engines)):
+        with shards.shard_session(shard) as db:
+            for currency, day, rate in rows:
+                db.merge(models.FxRate(currency=currency, day=day, rate=rate))
+    rate_cache.clear()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], newline="") as handle:
+        reader = csv.DictReader(handle)
+        count = load_rates((row["currency"], date.fromisoformat(row["day"]), row["rate"]) for row in reader)
+    print(f"Loaded {count} exchange rates")
@@ -0,0 +1,165 @@
+"""Background report jobs.
+
+Long-range reports can take longer than a proxy allows a request to run.
+``POST /reports/jobs`` stores a ``ReportJob`` row and hands its id to a local
+thread pool; the request returns at once, and the client polls
+``GET /reports/jobs/{id}`` and fetches ``GET /reports/jobs/{id}/result``.
+
+* A job's key hashes its kind, its parameters and the owner's data version
+  (``users.sync_seq``, time zone and base currency). A submission whose key
+  matches a queued, running or unexpired finished job gets that job back, so
+  identical in-flight requests share one computation and a finished result is
+  reused for ``REPORT_RESULT_TTL_SECONDS`` or until the owner's data changes.
+* Each process runs at most ``REPORT_WORKERS`` jobs and lets
+  ``REPORT_QUEUE_SIZE`` more wait; further submissions get 503.
+* Workers hold a database session only while loading data and while storing
+  the result, never during the computation itself.
+* Jobs still queued or running ``STALE_AFTER`` after submission (their process
+  stopped) are reported as failed and no longer deduplicated against.
+"""
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from pydantic import TypeAdapter
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import analytics, models, repository, schemas, timezones
+from .config import settings
+from .shards import session_for
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(hours=1)
+MAX_ERROR_LENGTH = 500
+
+_executor = ThreadPoolExecutor(max_workers=settings.report_workers, thread_name_prefix="report-job")
+_slots = threading.BoundedSemaphore(settings.report_workers + settings.report_queue_size)
+
+
+def stats_report(owner_id: int, request: schemas.ReportJobCreate) -> bytes:
+    with session_for(owner_id) as db:
+        user = db.get(models.User, owner_id)
+        arrays = analytics.array_cache.get(db, user)
+    stats = analytics.compute_stats(arrays, request.start_date, request.end_date, request.series_days)
+    return stats.model_dump_json().encode()
+
+
+def daily_report(owner_id: int, request: schemas.ReportJobCreate) -> bytes:
+    with session_for(owner_id) as db:
+        user = db.get(models.User, owner_id)
+        today = timezones.local_today(timezones.user_zone(user))
+        start = request.start_date or today - timedelta(days=6)
+        end = request.end_date or today
+        totals = repository.daily_totals(db, user, start, end)
+    return TypeAdapter(list[schemas.DailyTotal]).dump_json(totals)
+
+
+REPORTS = {
+    "stats": stats_report,
+    "daily": daily_report,
+}
+
+
+def job_key(user: models.User, request: schemas.ReportJobCreate) -> str:
+    version = [user.sync_seq, user.timezone, user.base_currency]
+    document = json.dumps([request.model_dump(mode="json"), version], sort_keys=True)
+    return hashlib.sha256(document.encode()).hexdigest()
+
+
+def is_stale(job: models.ReportJob, now: datetime) -> bool:
+    return job.status in ("queued", "running") and timezones.naive_utc(job.created_at) < now - STALE_AFTER
+
+
+def submit(db: Session, user: models.User, request: schemas.ReportJobCreate) -> models.ReportJob:
+    """Return a matching live job, or queue a new one."""
+    now = datetime.utcnow()
+    key = job_key(user, request)
+    candidates = db.scalars(
+        select(models.ReportJob)
+        .where(models.ReportJob.owner_id == user.id, models.ReportJob.key == key)
+        .where(models.ReportJob.status != "failed")
+        .where(or_(models.ReportJob.expires_at.is_(None), models.ReportJob.expires_at > now))
+        .order_by(models.ReportJob.created_at.desc())
+    )
+    for job in candidates:
+        if not is_stale(job, now):
+            return job
+
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Report queue is full",
+            headers={"Retry-After": "10"},
+        )
+    try:
+        job = models.ReportJob(
+            id=uuid.uuid4().hex,
+            owner_id=user.id,
+            kind=request.kind,
+            params=request.model_dump_json(),
+            key=key,
+            status="queued",
+            created_at=now,
+        )
+        db.add(job)
+        db.commit()
+        _executor.submit(_run, user.id, job.id)
+    except BaseException:
+        _slots.release()
+        raise
+    return job
+
+
+def get_job(db: Session, owner_id: int, job_id: str) -> models.ReportJob:
+    job = db.get(models.ReportJob, job_id)
+    if not job or job.owner_id != owner_id:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    now = datetime.utcnow()
+    if job.expires_at is not None and timezones.naive_utc(job.expires_at) <= now:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if is_stale(job, now):
+        job.status = "failed"
+        job.error = "Interrupted before completion"
+        job.expires_at = _expiry()
+        db.commit()
+    return job
+
+
+def _expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.report_result_ttl_seconds)
+
+
+def _finish(owner_id: int, job_id: str, **values) -> None:
+    now = datetime.utcnow()
+    with session_for(owner_id) as db:
+        db.execute(update(models.ReportJob).where(models.ReportJob.id == job_id).values(finished_at=now, **values))
+        db.execute(delete(models.ReportJob).where(models.ReportJob.expires_at < now))
+
+
+def _run(owner_id: int, job_id: str) -> None:
+    try:
+        with session_for(owner_id) as db:
+            job = db.get(models.ReportJob, job_id)
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            request = schemas.ReportJobCreate.model_validate_json(job.params)
+
+        try:
+            result = REPORTS[request.kind](owner_id, request)
+        except Exception as exc:
+            logger.exception("Report job %s failed", job_id)
+            error = str(exc)[:MAX_ERROR_LENGTH] or type(exc).__name__
+            _finish(owner_id, job_id, status="failed", error=error, expires_at=_expiry())
+        else:
+            _finish(owner_id, job_id, status="done", result=result.decode(), expires_at=_expiry())
+    except Exception:
+        logger.exception("Report job %s could not be run", job_id)
+    finally:
+        _slots.release()
@@ -3,7 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .config import settings
 from .database import Base, db_engine
-from .routers import users, categories, expenses, budgets, reports, auth
+from .shards import engines
+from . import sync  # noqa: F401  registers the change-tracking flush hook
+from .ratelimit import AdmissionControlMiddleware
+from .tracing import SqlTraceMiddleware
+from .profiling import ProfilerMiddleware
+from .compression import CompressionMiddleware
+from .routers import users, categories, expenses, attachments, budgets, batch, reports, auth, changes, events, recurring, profiles, metrics
 
 
 app = FastAPI(
@@ -13,6 +19,12 @@ app = FastAPI(
     redoc_url=f"{settings.api_prefix}/redoc",
 )
 
+# Added innermost first: profiling, tracing, admission control, compression, then CORS so
+# rejections carry CORS headers
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(SqlTraceMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
@@ -24,7 +36,8 @@ app.add_middleware(
 
 @app.on_event("startup")
 def startup():
-    Base.metadata.create_all(bind=db_engine)
+    for engine in {db_engine, *engines}:
+        Base.metadata.create_all(bind=engine)
 
 
 @app.get("/health")
@@ -36,5 +49,12 @@ app.include_router(auth.router, prefix=settings.api_prefix)
 app.include_router(users.router, prefix=settings.api_prefix)
 app.include_router(categories.router, prefix=settings.api_prefix)
 app.include_router(expenses.router, prefix=settings.api_prefix)
+app.include_router(attachments.router, prefix=settings.api_prefix)
 app.include_router(budgets.router, prefix=settings.api_prefix)
+app.include_router(batch.router, prefix=settings.api_prefix)
+app.include_router(recurring.router, prefix=settings.api_prefix)
 app.include_router(reports.router, prefix=settings.api_prefix)
+app.include_router(changes.router, prefix=settings.api_prefix)
+app.include_router(events.router, prefix=settings.api_prefix)
+app.include_router(profiles.router, prefix=settings.api_prefix)
+app.include_router(metrics.router, prefix=settings.api_prefix)
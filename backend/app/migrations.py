@@ -0,0 +1,206 @@
+"""Online schema changes for Alembic revisions, and in-process migration runs.
+
+Revisions that touch large tables use these instead of the plain operations:
+
+* ``create_index_concurrently`` / ``drop_index_concurrently`` build and drop
+  indexes with ``CONCURRENTLY`` on PostgreSQL, outside the revision's
+  transaction, so writes continue during the build. An invalid index left by an
+  interrupted build is dropped and rebuilt; a valid one is kept.
+* ``with_lock_retry`` runs DDL that needs an exclusive lock (adding columns or
+  constraints) in a savepoint with a short ``lock_timeout``, retrying with
+  backoff. A waiting ``ALTER`` otherwise queues every query on the table
+  behind it for as long as the longest running transaction lasts.
+* ``backfill`` runs an ``UPDATE`` in primary key batches, each committed on its
+  own with a pause in between. Progress is printed, and the last finished key
+  is kept in ``migration_checkpoints``, so an interrupted run resumes there.
+
+On other dialects (SQLite) they run the plain operation.
+
+``python -m app.migrations upgrade [REVISION]`` applies revisions to the home
+database and every shard through the Alembic API, in this process;
+``python -m app.migrations current`` shows where each database is.
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+import sqlalchemy as sa
+from alembic import command, op
+from alembic.config import Config
+from sqlalchemy.exc import DBAPIError
+
+from .config import settings
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+LOCK_NOT_AVAILABLE = "55P03"
+MAX_RETRY_DELAY = 30  # seconds
+
+checkpoints = sa.Table(
+    "migration_checkpoints",
+    sa.MetaData(),
+    sa.Column("name", sa.String(200), primary_key=True),
+    sa.Column("last_key", sa.BigInteger, nullable=False),
+    sa.Column("updated_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+)
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def _index_valid(index_name: str) -> bool | None:
+    """True/False for a valid/invalid index, None if it does not exist."""
+    return op.get_bind().scalar(
+        sa.text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+        ),
+        {"name": index_name},
+    )
+
+
+def create_index_concurrently(index_name: str, table_name: str, columns: list, **kw) -> None:
+    if not _is_postgresql():
+        op.create_index(index_name, table_name, columns, **kw)
+        return
+    with op.get_context().autocommit_block():
+        valid = _index_valid(index_name)
+        if valid is False:
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+        if not valid:
+            op.create_index(index_name, table_name, columns, postgresql_concurrently=True, **kw)
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    if not _is_postgresql():
+        op.drop_index(index_name, table_name=table_name)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+
+
+def with_lock_retry(operation, timeout_ms: int | None = None, attempts: int | None = None) -> None:
+    """Run ``operation()`` with a short lock timeout, retrying while the lock is not granted."""
+    if not _is_postgresql():
+        operation()
+        return
+    timeout_ms = timeout_ms or settings.migration_lock_timeout_ms
+    attempts = attempts or settings.migration_lock_attempts
+    bind = op.get_bind()
+    for attempt in range(1, attempts + 1):
+        savepoint = bind.begin_nested()
+        bind.execute(sa.text(f"SET LOCAL lock_timeout = {int(timeout_ms)}"))
+        try:
+            operation()
+        except DBAPIError as exc:
+            savepoint.rollback()
+            if getattr(exc.orig, "pgcode", None) != LOCK_NOT_AVAILABLE or attempt == attempts:
+                raise
+            delay = min(MAX_RETRY_DELAY, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            print(f"  lock not granted within {timeout_ms} ms (attempt {attempt}/{attempts}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            savepoint.commit()
+            bind.execute(sa.text("SET LOCAL lock_timeout = DEFAULT"))
+            return
+
+
+def backfill(
+    name: str,
+    table: sa.TableClause,
+    values: dict,
+    where=None,
+    key: str = "id",
+    batch_rows: int | None = None,
+    pause_ms: int | None = None,
+) -> int:
+    """``UPDATE table SET values [WHERE where]`` in committed batches of ``batch_rows`` keys.
+
+    ``table`` is an ``sa.table()`` naming the key and the columns used; ``name``
+    identifies the checkpoint. Make ``where`` skip rows that are already done so
+    a rerun after completion costs little. Returns the number of rows updated.
+    """
+    batch_rows = batch_rows or settings.backfill_batch_rows
+    pause = (settings.backfill_pause_ms if pause_ms is None else pause_ms) / 1000
+    key_column = table.c[key]
+    updated = 0
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        checkpoints.create(bind, checkfirst=True)
+        low, high = bind.execute(sa.select(sa.func.min(key_column), sa.func.max(key_column))).one()
+        if low is None:
+            return 0
+        resumed = bind.scalar(sa.select(checkpoints.c.last_key).where(checkpoints.c.name == name))
+        done = resumed if resumed is not None else low - 1
+        if resumed is not None:
+            print(f"  {name}: resuming after {key} {resumed}")
+
+        started = time.monotonic()
+        while done < high:
+            upper = min(done + batch_rows, high)
+            statement = sa.update(table).where(key_column > done, key_column <= upper).values(values)
+            if where is not None:
+                statement = statement.where(where)
+            updated += bind.execute(statement).rowcount
+            done = upper
+            _save_checkpoint(bind, name, done)
+            elapsed = time.monotonic() - started
+            print(
+                f"  {name}: {key} {done}/{high} ({(done - low + 1) / (high - low + 1):.1%}), "
+                f"{updated} rows updated, {updated / elapsed if elapsed else 0:.0f} rows/s"
+            )
+            if pause and done < high:
+                time.sleep(pause)
+        bind.execute(sa.delete(checkpoints).where(checkpoints.c.name == name))
+    return updated
+
+
+def _save_checkpoint(bind, name: str, last_key: int) -> None:
+    saved = bind.execute(
+        sa.update(checkpoints).where(checkpoints.c.name == name).values(last_key=last_key, updated_at=sa.func.now())
+    ).rowcount
+    if not saved:
+        bind.execute(sa.insert(checkpoints).values(name=name, last_key=last_key))
+
+
+def alembic_config(shard: int | None = None, url: str | None = None) -> Config:
+    """Alembic configuration for the home database, ``SHARD_URLS[shard]`` or ``url``."""
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    if url is not None:
+        config.cmd_opts = argparse.Namespace(x=[f"url={url}"])
+    elif shard is not None:
+        config.cmd_opts = argparse.Namespace(x=[f"shard={shard}"])
+    return config
+
+
+def databases() -> list[int | None]:
+    """The home database (None) followed by every shard number."""
+    return [None, *range(len(settings.shard_urls))]
+
+
+def upgrade(revision: str = "head") -> None:
+    for shard in databases():
+        print(f"Upgrading {'home database' if shard is None else f'shard {shard}'} to {revision}")
+        command.upgrade(alembic_config(shard), revision)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="Apply revisions to the home database and every shard")
+    upgrade_parser.add_argument("revision", nargs="?", default="head")
+    commands.add_parser("current", help="Show the revision of each database")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        upgrade(args.revision)
+    else:
+        for shard in databases():
+            print("home database" if shard is None else f"shard {shard}")
+            command.current(alembic_config(shard))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ from datetime import datetime, date
 from decimal import Decimal
 from typing import Optional
 
-from sqlalchemy import Date, DateTime, ForeignKey, Numeric, String, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, Numeric, String, Text, UniqueConstraint, false
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -15,7 +15,14 @@ class User(Base):
     name: Mapped[str] = mapped_column(String(100))
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True)
     password_hash: Mapped[str] = mapped_column(String(255))
+    base_currency: Mapped[str] = mapped_column(String(3), default="USD", server_default="USD")
+    # IANA zone that decides which local day and month an expense falls on in reports
+    timezone: Mapped[str] = mapped_column(String(64), default="UTC", server_default="UTC")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    # Per-user change counter; the last value handed out to a synced row (see app/sync.py)
+    sync_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+    # Expenses dated before this day may have been moved to the archive tables (see app/archive.py)
+    archived_before: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
 
     categories: Mapped[list["Category"]] = relationship(back_populates="owner", cascade="all, delete-orphan")
     expenses: Mapped[list["Expense"]] = relationship(back_populates="owner", cascade="all, delete-orphan")
@@ -24,12 +31,17 @@ class User(Base):
 
 class Category(Base):
     __tablename__ = "categories"
-    __table_args__ = (UniqueConstraint("name", "owner_id", name="uq_category_name_owner"),)
+    __table_args__ = (
+        UniqueConstraint("name", "owner_id", name="uq_category_name_owner"),
+        Index("ix_categories_owner_sync_seq", "owner_id", "sync_seq"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100))
     color: Mapped[str] = mapped_column(String(20), default="#4f46e5")
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    sync_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
 
     owner: Mapped[User] = relationship(back_populates="categories")
     expenses: Mapped[list["Expense"]] = relationship(back_populates="category")
@@ -37,13 +49,34 @@ class Category(Base):
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_owner_sync_seq", "owner_id", "sync_seq"),
+        # Per-user date range scans; local day boundaries are converted to UTC before querying.
+        # The included columns let narrow lists (?fields=id,amount,spent_at) skip the table on PostgreSQL
+        Index(
+            "ix_expenses_owner_spent_at_covering",
+            "owner_id",
+            "spent_at",
+            postgresql_include=["id", "amount", "category_id"],
+        ),
+        # One materialized expense per recurring template occurrence
+        UniqueConstraint("recurring_id", "spent_at", name="uq_expense_recurring_occurrence"),
+        # Archived expenses keep their ids, so SQLite must never hand out a used id again
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     description: Mapped[str] = mapped_column(String(255))
     amount: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    currency: Mapped[str] = mapped_column(String(3), default="USD", server_default="USD")
     spent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, index=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     category_id: Mapped[Optional[int]] = mapped_column(ForeignKey("categories.id"), nullable=True, index=True)
+    recurring_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("recurring_expenses.id", ondelete="SET NULL"), nullable=True
+    )
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    sync_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
 
     owner: Mapped[User] = relationship(back_populates="expenses")
     category: Mapped[Optional[Category]] = relationship(back_populates="expenses")
@@ -51,13 +84,161 @@ class Expense(Base):
 
 class Budget(Base):
     __tablename__ = "budgets"
-    __table_args__ = (UniqueConstraint("owner_id", "category_id", "month", name="uq_budget_owner_category_month"),)
+    __table_args__ = (
+        UniqueConstraint("owner_id", "category_id", "month", name="uq_budget_owner_category_month"),
+        Index("ix_budgets_owner_sync_seq", "owner_id", "sync_seq"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     month: Mapped[date] = mapped_column(Date, index=True)
     amount: Mapped[Decimal] = mapped_column(Numeric(12, 2))
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     category_id: Mapped[Optional[int]] = mapped_column(ForeignKey("categories.id"), nullable=True, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    sync_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
 
     owner: Mapped[User] = relationship(back_populates="budgets")
     category: Mapped[Optional[Category]] = relationship()
+
+
+class RecurringExpense(Base):
+    """Template for an expense that repeats, materialized by app/recurring.py."""
+
+    __tablename__ = "recurring_expenses"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    description: Mapped[str] = mapped_column(String(255))
+    amount: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    currency: Mapped[str] = mapped_column(String(3), default="USD", server_default="USD")
+    category_id: Mapped[Optional[int]] = mapped_column(ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+    frequency: Mapped[str] = mapped_column(String(10))
+    interval: Mapped[int] = mapped_column(Integer, default=1)
+    start_on: Mapped[date] = mapped_column(Date)
+    until: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    # Date of the next occurrence not yet materialized; NULL once the template has ended
+    next_run_on: Mapped[Optional[date]] = mapped_column(Date, nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class FxRate(Base):
+    """Value of one unit of ``currency`` in the pivot currency on ``day`` (see app/fx.py)."""
+
+    __tablename__ = "fx_rates"
+
+    currency: Mapped[str] = mapped_column(String(3), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    rate: Mapped[Decimal] = mapped_column(Numeric(18, 8))
+
+
+class Tombstone(Base):
+    """Marker left behind when a synced row is deleted, so /changes can report it."""
+
+    __tablename__ = "tombstones"
+    __table_args__ = (Index("ix_tombstones_owner_sync_seq", "owner_id", "sync_seq"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(String(20))
+    entity_id: Mapped[int] = mapped_column()
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    deleted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    sync_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+
+
+class ArchivedMonth(Base):
+    """One closed month of a user's expenses, stored as compressed column arrays."""
+
+    __tablename__ = "expense_archive"
+    __table_args__ = (UniqueConstraint("owner_id", "month", name="uq_expense_archive_owner_month"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    month: Mapped[date] = mapped_column(Date)
+    expense_count: Mapped[int] = mapped_column(Integer)
+    total: Mapped[Decimal] = mapped_column(Numeric(14, 2))
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class ArchivedMonthTotal(Base):
+    """Precomputed per-category totals of an archived month."""
+
+    __tablename__ = "expense_archive_totals"
+    __table_args__ = (Index("ix_expense_archive_totals_owner_month", "owner_id", "month"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    month: Mapped[date] = mapped_column(Date)
+    category_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    expense_count: Mapped[int] = mapped_column(Integer)
+    total: Mapped[Decimal] = mapped_column(Numeric(14, 2))
+    min_amount: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    max_amount: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+
+
+class BudgetForecast(Base):
+    """Month-end spend projection for a budget, written by the nightly job in app/forecast.py."""
+
+    __tablename__ = "budget_forecasts"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    budget_id: Mapped[int] = mapped_column(ForeignKey("budgets.id", ondelete="CASCADE"), unique=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    month: Mapped[date] = mapped_column(Date)
+    spent: Mapped[Decimal] = mapped_column(Numeric(14, 2))
+    projected: Mapped[Decimal] = mapped_column(Numeric(14, 2))
+    projected_ratio: Mapped[float] = mapped_column(Float)
+    will_overrun: Mapped[bool] = mapped_column(Boolean)
+    overrun_on: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class ReportJob(Base):
+    """A report computed in the background by app/jobs.py; identical requests share one row."""
+
+    __tablename__ = "report_jobs"
+    __table_args__ = (Index("ix_report_jobs_owner_key", "owner_id", "key"),)
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    kind: Mapped[str] = mapped_column(String(32))
+    params: Mapped[str] = mapped_column(Text)
+    # Hash of kind, params and the owner's data version; equal keys give equal results
+    key: Mapped[str] = mapped_column(String(64))
+    status: Mapped[str] = mapped_column(String(16), default="queued")
+    result: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class UserDirectory(Base):
+    """Which shard holds each user; kept in the home database when SHARD_URLS is set (app/shards.py)."""
+
+    __tablename__ = "user_directory"
+
+    # Allocates user ids for every shard
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    email: Mapped[str] = mapped_column(String(255), unique=True)
+    shard: Mapped[int] = mapped_column(Integer)
+    # Set while app/shards.py moves the user; requests get 503 until it is done
+    moving: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
+
+
+class Attachment(Base):
+    """A receipt file stored by app/attachments.py under its SHA-256; equal files share storage."""
+
+    __tablename__ = "attachments"
+    __table_args__ = (Index("ix_attachments_owner_expense", "owner_id", "expense_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    # No foreign key: archived expenses keep their ids and their receipts
+    expense_id: Mapped[int] = mapped_column(Integer)
+    filename: Mapped[str] = mapped_column(String(255))
+    content_type: Mapped[str] = mapped_column(String(100))
+    size: Mapped[int] = mapped_column(BigInteger)
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
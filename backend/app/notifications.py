@@ -0,0 +1,201 @@
+"""Per-user change notifications streamed to dashboards over server-sent events.
+
+Writes record the users (and expense timestamps) they touched in ``session.info``
+(see ``app/sync.py``). After the transaction commits, those users are handed to
+the in-process ``broadcaster``. For each user with at least one open stream it
+recomputes the dashboard summary and the affected daily totals (local days in
+the user's time zone) *once*, and fans
+the result out to every connection of that user. Bursts of writes that arrive
+while a refresh is running are coalesced into the next one.
+
+Streams are plain coroutines waiting on small queues, so idle connections cost
+a few hundred bytes each and no threads or DB connections.
+
+On PostgreSQL, changes travel through the database so that every API worker
+sees them, including writes made by other workers and by ``app.recurring``: a
+committing session sends ``NOTIFY expense_changes`` with the users and
+timestamps it touched (delivered only if the transaction commits), and each
+worker with open streams runs one listener thread holding a ``LISTEN``
+connection per database. On SQLite (a single node) changes are handed to the
+broadcaster in-process. Clients do not poll; after a reconnect they refetch
+once, since updates may have been missed meanwhile.
+
+``EventSource`` cannot send headers, so a stream is opened with a ticket from
+``POST /events/ticket`` (a JWT scoped to the stream that expires within
+seconds) instead of the access token, which would otherwise end up in proxy and
+access logs.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+
+from . import models, repository, sync, timezones
+from .database import db_engine
+from .shards import engines, session_for
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+LISTEN_RETRY_SECONDS = 5
+
+_databases = list({db_engine, *engines})
+THROUGH_DATABASE = all(engine.dialect.name == "postgresql" for engine in _databases)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._pending: dict[int, set[datetime]] = {}
+        self._refreshing: set[int] = set()
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        if THROUGH_DATABASE:
+            listener.start()
+        # Only the latest snapshot matters, so a slow client just skips stale ones
+        queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def subscribed_users(self) -> list[int]:
+        return list(self._subscribers)
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def notify(self, changes: dict[int, set[datetime]]) -> None:
+        """Thread-safe entry point called after a commit."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        watched = {user_id: times for user_id, times in changes.items() if user_id in self._subscribers}
+        if watched:
+            loop.call_soon_threadsafe(self._schedule, watched)
+
+    def _schedule(self, changes: dict[int, set[datetime]]) -> None:
+        for user_id, times in changes.items():
+            self._pending.setdefault(user_id, set()).update(times)
+            if user_id not in self._refreshing:
+                self._refreshing.add(user_id)
+                asyncio.ensure_future(self._refresh(user_id))
+
+    async def _refresh(self, user_id: int) -> None:
+        try:
+            while user_id in self._pending and user_id in self._subscribers:
+                times = self._pending.pop(user_id)
+                try:
+                    messages = await run_in_threadpool(build_messages, user_id, times)
+                except Exception:
+                    logger.exception("Failed to build live update for user %s", user_id)
+                    return
+                for queue in list(self._subscribers.get(user_id, ())):
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(messages)
+        finally:
+            self._pending.pop(user_id, None)
+            self._refreshing.discard(user_id)
+
+
+broadcaster = Broadcaster()
+
+
+class Listener:
+    """Thread holding a ``LISTEN`` connection per database and feeding the broadcaster."""
+
+    def __init__(self):
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        reconnecting = False
+        while True:
+            connections = []
+            try:
+                for engine in _databases:
+                    # A dedicated DBAPI connection, so listening never takes a slot of the pool
+                    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+                    connection = engine.dialect.connect(*cargs, **cparams)
+                    connection.autocommit = True
+                    connection.cursor().execute(f"LISTEN {sync.CHANNEL}")
+                    connections.append(connection)
+                if reconnecting:
+                    # Notifications sent while disconnected are lost; refresh every open stream once
+                    broadcaster.notify({user_id: set() for user_id in broadcaster.subscribed_users()})
+                self._receive(connections)
+            except Exception:
+                logger.exception("Change listener failed; reconnecting in %s s", LISTEN_RETRY_SECONDS)
+            finally:
+                for connection in connections:
+                    connection.close()
+            reconnecting = True
+            time.sleep(LISTEN_RETRY_SECONDS)
+
+    def _receive(self, connections) -> None:
+        while True:
+            readable, _, _ = select.select(connections, [], [], HEARTBEAT_SECONDS)
+            for connection in readable:
+                connection.poll()
+                while connection.notifies:
+                    broadcaster.notify(sync.decode_changes(connection.notifies.pop(0).payload))
+
+
+listener = Listener()
+
+
+if not THROUGH_DATABASE:
+    sync.on_commit(broadcaster.notify)
+
+
+def format_event(name: str, data) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def build_messages(user_id: int, times: set[datetime]) -> str:
+    """Compute the dashboard and daily-total deltas for one user as SSE frames."""
+    with session_for(user_id) as db:
+        user = db.get(models.User, user_id)
+        summary = repository.dashboard(db, user)
+        daily = []
+        if times:
+            tz = timezones.user_zone(user)
+            days = {timezones.local_date(value, tz) for value in times}
+            totals = {row.day: row.total for row in repository.daily_totals(db, user, min(days), max(days))}
+            daily = [{"day": day, "total": totals.get(day, 0)} for day in sorted(days)]
+
+    frames = format_event("dashboard", summary.model_dump(mode="json"))
+    if daily:
+        frames += format_event("daily", daily)
+    return frames
+
+
+async def stream(user_id: int, is_disconnected):
+    """Async generator of SSE frames for one connection."""
+    queue = broadcaster.subscribe(user_id)
+    try:
+        yield format_event("ready", {"user_id": user_id})
+        while not await is_disconnected():
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+    finally:
+        broadcaster.unsubscribe(user_id, queue)
@@ -0,0 +1,194 @@
+"""On-demand sampling profiler for individual requests.
+
+``ProfilerMiddleware`` profiles a request when it carries
+``X-Profile: <PROFILE_TOKEN>`` or is picked by ``PROFILE_SAMPLE_RATE``. Requests
+that are not selected cost one header scan and one ``random()`` call; no
+profiler thread runs unless a profiled request is in flight.
+
+A profiled request gets its own sampler thread that reads
+``sys._current_frames()`` every ``PROFILE_INTERVAL_MS`` and keeps the stacks
+that belong to the request: on the event loop, stacks passing through the
+middleware's own frame; in threadpool workers (sync endpoints and
+dependencies), stacks whose worker frame holds the request's copied context.
+Stacks are written in collapsed format (``frame;frame;frame count``), which
+speedscope and flamegraph.pl read directly, to ``PROFILE_DIR``. Only the newest
+``PROFILE_MAX_FILES`` profiles are kept. ``/profiles`` lists and serves them.
+"""
+import contextvars
+import hmac
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+MAX_CONCURRENT_PROFILES = 4
+# Worker frames holding the copied context sit at the bottom of the thread's stack
+OWNER_SEARCH_DEPTH = 8
+PROFILE_ID = re.compile(r"^\d{17}-[0-9a-f]{8}$")
+
+current_profile: contextvars.ContextVar["RequestProfile | None"] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+_active = threading.BoundedSemaphore(MAX_CONCURRENT_PROFILES)
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    def __init__(self, root_frame, interval: float):
+        self.root_frame = root_frame
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Signal the sampler to stop; ``join`` waits for it (off the event loop)."""
+        self._stop.set()
+
+    def join(self) -> None:
+        self._thread.join()
+
+    def _owns(self, frame) -> bool:
+        return any(
+            isinstance(value, contextvars.Context) and value.get(current_profile) is self
+            for value in frame.f_locals.values()
+        )
+
+    def _stack(self, frame) -> list | None:
+        chain = []
+        while frame is not None:
+            chain.append(frame)
+            if frame is self.root_frame:
+                return chain
+            frame = frame.f_back
+        for depth in range(len(chain) - 1, max(len(chain) - 1 - OWNER_SEARCH_DEPTH, -1), -1):
+            if self._owns(chain[depth]):
+                return chain[:depth + 1]
+        return None
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = self._stack(frame)
+                if stack:
+                    self.samples[";".join(_label(f.f_code) for f in reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def profile_dir() -> Path:
+    return Path(settings.profile_dir)
+
+
+def save_profile(profile: RequestProfile, metadata: dict) -> str:
+    """Write a profile and its metadata, then drop the oldest beyond ``PROFILE_MAX_FILES``."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S%f}"[:17] + f"-{uuid.uuid4().hex[:8]}"
+    (directory / f"{profile_id}.collapsed").write_text(profile.collapsed())
+    (directory / f"{profile_id}.json").write_text(json.dumps({"id": profile_id, **metadata}))
+    for stale in sorted(directory.glob("*.collapsed"))[:-settings.profile_max_files]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix(".json").unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles() -> list[dict]:
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    profiles = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # removed or half-written by a concurrent request
+    return profiles
+
+
+def profile_path(profile_id: str) -> Path | None:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = profile_dir() / f"{profile_id}.collapsed"
+    return path if path.exists() else None
+
+
+def token_matches(value: str | None) -> bool:
+    """Whether ``value`` is the configured ``PROFILE_TOKEN``, compared in constant time."""
+    if not settings.profile_token or value is None:
+        return False
+    return hmac.compare_digest(value.encode(), settings.profile_token.encode())
+
+
+def _finish(profile: RequestProfile, metadata: dict) -> str:
+    """Wait for the sampler thread to exit, then store the profile (runs in the threadpool)."""
+    try:
+        profile.join()
+    finally:
+        _active.release()
+    return save_profile(profile, {**metadata, "samples": sum(profile.samples.values())})
+
+
+def _requested(scope) -> bool:
+    if scope["path"].startswith(f"{settings.api_prefix}/events"):
+        return False  # the stream would keep a sampler running for as long as it is open
+    if settings.profile_token:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                return token_matches(value.decode("latin-1"))
+    return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope) or not _active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(sys._getframe(), settings.profile_interval_ms / 1000)
+        token = current_profile.set(profile)
+        response_status = None
+
+        async def send_with_status(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+            await run_in_threadpool(_finish, profile, {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": response_status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "created_at": datetime.utcnow().isoformat(),
+            })
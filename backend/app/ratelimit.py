@@ -0,0 +1,155 @@
+"""Admission control: per-user rate limits and load shedding.
+
+``AdmissionControlMiddleware`` runs before any routing or DB work:
+
+* Every request takes a token from the caller's user bucket and then from the
+  caller's bucket for that route (path with numeric ids collapsed). The caller
+  is the JWT subject, or the client address for anonymous requests. Empty
+  buckets get ``429`` with ``Retry-After``; a request refused by the user
+  bucket does not touch the route bucket, so a throttled client does not keep
+  draining it.
+* At most ``MAX_IN_FLIGHT`` requests run at once per worker. The default is the
+  ``db_engine`` pool size plus overflow, since nearly every request needs a
+  connection. Beyond that, requests get an immediate ``503`` instead of queueing
+  on the pool, which keeps latency bounded for the requests that are admitted.
+
+Buckets live in process memory by default. Set ``RATE_LIMIT_BACKEND`` to
+``"package.module:ClassName"`` to share them between workers, e.g. through
+Redis; the class must implement ``RateLimitBackend``. ``take`` is awaited on
+the event loop, so a backend doing network I/O must use an async client (or
+hand blocking calls to a thread) rather than block every request.
+"""
+import importlib
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from jose import JWTError, jwt
+
+from .config import settings
+from .database import db_engine
+
+NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+class RateLimitBackend(Protocol):
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token from ``key``'s bucket; return 0 if allowed, else seconds until one is free."""
+
+
+class InMemoryBackend:
+    """Token buckets in a bounded LRU; least recently used buckets are dropped first."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return self._take(key, rate, burst)
+
+    def _take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def load_backend(path: str | None) -> RateLimitBackend:
+    if not path:
+        return InMemoryBackend()
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def default_in_flight_limit() -> int:
+    pool = db_engine.pool
+    size = pool.size() if hasattr(pool, "size") else 5
+    return size + max(getattr(pool, "_max_overflow", 0), 0)
+
+
+def route_key(method: str, path: str) -> str:
+    return f"{method} {NUMERIC_SEGMENT.sub('/{id}', path)}"
+
+
+def caller_key(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+                except JWTError:
+                    break
+                if payload.get("sub") is not None:
+                    return f"user:{payload['sub']}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app, backend: RateLimitBackend | None = None, max_in_flight: int | None = None):
+        self.app = app
+        self.backend = backend or load_backend(settings.rate_limit_backend)
+        self.max_in_flight = max_in_flight or settings.max_in_flight or default_in_flight_limit()
+        self.in_flight = 0
+        self.user_rate = settings.rate_limit_user_per_minute / 60
+        self.route_rate = settings.rate_limit_route_per_minute / 60
+        # Long-lived streams hold no DB connection and must not count against the cap. Exact
+        # paths only: a prefix would also exempt POST /events/ticket, an ordinary DB-backed request
+        self.unlimited = {f"{settings.api_prefix}/events", f"{settings.api_prefix}/events/", "/health"}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled or scope["path"] in self.unlimited:
+            await self.app(scope, receive, send)
+            return
+
+        caller = caller_key(scope)
+        wait = await self.backend.take(caller, self.user_rate, settings.rate_limit_user_burst)
+        if wait == 0:
+            wait = await self.backend.take(
+                f"{caller}:{route_key(scope['method'], scope['path'])}",
+                self.route_rate,
+                settings.rate_limit_route_burst,
+            )
+        if wait > 0:
+            await _reject(send, 429, "Too many requests", wait)
+            return
+
+        if self.in_flight >= self.max_in_flight:
+            await _reject(send, 503, "Server busy, retry shortly", 1)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
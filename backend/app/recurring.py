@@ -0,0 +1,167 @@
+"""Materialization of recurring expense templates.
+
+``materialize_due`` selects templates whose ``next_run_on`` has been reached in
+their owner's time zone (through its index), expands every missed occurrence up
+to the owner's local today in Python, starting from ``next_run_on`` rather than
+from ``start_on`` so a run costs what is due, not the template's history,
+inserts all resulting expenses with one multi-row ``INSERT ... ON CONFLICT DO
+NOTHING`` per batch, and advances the templates with one executemany UPDATE.
+The unique (recurring_id, spent_at) constraint makes re-runs and overlapping
+runs idempotent, and catching up after downtime is the same single pass.
+
+Run it from cron with ``python -m app.recurring``.
+"""
+import calendar
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .shards import engines, shard_session
+from . import models, sync, timezones
+from .sql import local_day
+
+BATCH_SIZE = 500
+# No time zone is further ahead of UTC than this
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+
+def _add_months(day: date, months: int, anchor_day: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence(template: models.RecurringExpense, n: int) -> date:
+    """Date of the template's ``n``-th occurrence (0-based), anchored on ``start_on``."""
+    step = n * template.interval
+    if template.frequency == "daily":
+        return template.start_on + timedelta(days=step)
+    if template.frequency == "weekly":
+        return template.start_on + timedelta(weeks=step)
+    if template.frequency == "monthly":
+        return _add_months(template.start_on, step, template.start_on.day)
+    return _add_months(template.start_on, 12 * step, template.start_on.day)
+
+
+def first_index(template: models.RecurringExpense, day: date) -> int:
+    """Index of the template's first occurrence on or after ``day``."""
+    if day <= template.start_on:
+        return 0
+    start = template.start_on
+    if template.frequency in ("daily", "weekly"):
+        period = template.interval * (7 if template.frequency == "weekly" else 1)
+        n = (day - start).days // period
+    else:
+        period = template.interval * (12 if template.frequency == "yearly" else 1)
+        n = ((day.year - start.year) * 12 + day.month - start.month) // period
+    # The estimate is at most one step short (month-end clamping, partial periods)
+    while occurrence(template, n) < day:
+        n += 1
+    return n
+
+
+def due_dates(template: models.RecurringExpense, through: date) -> tuple[list[date], date | None]:
+    """Occurrences from ``next_run_on`` up to ``through``, and the following occurrence (None when ended)."""
+    dates = []
+    n = first_index(template, template.next_run_on)
+    while True:
+        day = occurrence(template, n)
+        n += 1
+        if template.until is not None and day > template.until:
+            return dates, None
+        if day > through:
+            return dates, day
+        dates.append(day)
+
+
+def _insert_ignoring_duplicates(db: Session):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(models.Expense).on_conflict_do_nothing(
+        index_elements=["recurring_id", "spent_at"]
+    )
+
+
+def materialize_batch(db: Session, now: datetime) -> int:
+    """Materialize one batch of due templates as of the instant ``now``. Returns the number processed."""
+    now = timezones.naive_utc(now)
+    # Bound aware: PostgreSQL would read a naive value as local time in each zone
+    moment = bindparam("now", now.replace(tzinfo=timezone.utc), type_=DateTime(timezone=True))
+    local_today = local_day(moment, models.User.timezone)
+    query = (
+        select(models.RecurringExpense, models.User.timezone)
+        .join(models.User, models.User.id == models.RecurringExpense.owner_id)
+        # The first bound is served by the next_run_on index; the owner's local today narrows it
+        .where(models.RecurringExpense.next_run_on <= (now + MAX_UTC_OFFSET).date())
+        .where(models.RecurringExpense.next_run_on <= local_today)
+        .order_by(models.RecurringExpense.id)
+        .limit(BATCH_SIZE)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # Concurrent schedulers split the work instead of waiting on each other
+        query = query.with_for_update(skip_locked=True, of=models.RecurringExpense)
+    templates = db.execute(query).all()
+    if not templates:
+        return 0
+
+    rows = []
+    advances = []
+    for template, zone_name in templates:
+        # Occurrences are dated at local midnight in the owner's time zone
+        tz = timezones.zone(zone_name)
+        dates, next_run_on = due_dates(template, timezones.local_date(now, tz))
+        advances.append({"template_id": template.id, "next_run_on": next_run_on})
+        rows.extend(
+            {
+                "description": template.description,
+                "amount": template.amount,
+                "currency": template.currency,
+                "spent_at": timezones.utc_start_of(day, tz),
+                "owner_id": template.owner_id,
+                "category_id": template.category_id,
+                "recurring_id": template.id,
+            }
+            for day in dates
+        )
+
+    if rows:
+        # Bulk Core inserts skip the ORM flush hook, so allocate sync sequences here
+        updated_at = datetime.utcnow()
+        for owner_id, count in Counter(row["owner_id"] for row in rows).items():
+            next_seq = sync.reserve_seqs(db, owner_id, count)
+            for row in rows:
+                if row["owner_id"] == owner_id:
+                    row["sync_seq"] = next_seq
+                    row["updated_at"] = updated_at
+                    next_seq += 1
+        inserted = db.execute(_insert_ignoring_duplicates(db).returning(models.Expense.owner_id, models.Expense.spent_at), rows)
+        for owner_id, spent_at in inserted:
+            sync.record_change(db, owner_id, {spent_at})
+
+    table = models.RecurringExpense.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("template_id")).values(next_run_on=bindparam("next_run_on")),
+        advances,
+    )
+    return len(templates)
+
+
+def materialize_due(now: datetime | None = None) -> int:
+    """Materialize all occurrences due by each owner's local today. Returns the number of templates processed."""
+    now = now or datetime.now(timezone.utc)
+    processed = 0
+    for shard in range(len(engines)):
+        while True:
+            with shard_session(shard) as db:
+                count = materialize_batch(db, now)
+            processed += count
+            if count < BATCH_SIZE:
+                break
+    return processed
+
+
+if __name__ == "__main__":
+    count = materialize_due()
+    print(f"Materialized occurrences for {count} recurring expenses")
@@ -0,0 +1,281 @@
+"""Precompiled Core queries for the hot read paths.
+
+The expense list and its summary, daily totals, dashboard, category and budget
+lists run ``select()`` statements that are built once, at import or once per
+filter combination, with ``bindparam()`` placeholders. A statement's cache key is
+memoized on the object and its compiled form sits in the engine's compiled
+cache, so a request neither rebuilds nor recompiles SQL; it only binds values.
+
+Statements run on the session's connection rather than through the ORM, and
+results are returned as Core rows (tuples with attribute access by column
+name): no identity map, no instance state, no lazy loaders. Response models
+read them with ``from_attributes`` exactly like ORM instances, and rows can be
+merged with ``archive.ArchivedExpense`` records, which have the same names.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+
+from sqlalchemy import Row, String, bindparam, func, select, union_all
+from sqlalchemy.orm import Session
+
+from . import archive, fx, models, schemas, timezones
+from .sql import local_day, local_month
+
+expenses = models.Expense.__table__
+categories = models.Category.__table__
+budgets = models.Budget.__table__
+
+_owner_id = bindparam("owner_id")
+_base_currency = bindparam("base_currency", type_=String)
+_timezone = bindparam("timezone", type_=String)
+
+EXPENSE_COLUMNS = (
+    expenses.c.id,
+    expenses.c.owner_id,
+    expenses.c.description,
+    expenses.c.amount,
+    expenses.c.currency,
+    expenses.c.spent_at,
+    expenses.c.category_id,
+    expenses.c.recurring_id,
+)
+
+
+@lru_cache(maxsize=None)
+def _expense_list(by_category: bool, from_start: bool, to_end: bool, fields: tuple[str, ...] | None = None):
+    columns = EXPENSE_COLUMNS if fields is None else [column for column in EXPENSE_COLUMNS if column.name in fields]
+    query = select(*columns).where(expenses.c.owner_id == _owner_id)
+    if by_category:
+        query = query.where(expenses.c.category_id == bindparam("category_id"))
+    if from_start:
+        query = query.where(expenses.c.spent_at >= bindparam("start"))
+    if to_end:
+        query = query.where(expenses.c.spent_at < bindparam("end"))
+    return query.order_by(expenses.c.spent_at.desc())
+
+
+@lru_cache(maxsize=None)
+def _expense_facets(by_category: bool, from_start: bool, to_end: bool):
+    """Count, sum, min and max per (category, local month) over the expense list's filter."""
+    spend = fx.converted_expenses(
+        _base_currency,
+        models.Expense.category_id,
+        local_month(models.Expense.spent_at, _timezone).label("month"),
+    ).where(models.Expense.owner_id == _owner_id)
+    if by_category:
+        spend = spend.where(models.Expense.category_id == bindparam("category_id"))
+    if from_start:
+        spend = spend.where(models.Expense.spent_at >= bindparam("start"))
+    if to_end:
+        spend = spend.where(models.Expense.spent_at < bindparam("end"))
+    spend = spend.subquery()
+    return select(
+        spend.c.category_id,
+        spend.c.month,
+        func.count().label("count"),
+        func.sum(spend.c.base_amount).label("total"),
+        func.min(spend.c.base_amount).label("min_amount"),
+        func.max(spend.c.base_amount).label("max_amount"),
+        fx.unconverted(spend.c.base_amount),
+    ).group_by(spend.c.category_id, spend.c.month)
+
+
+_daily_spend = (
+    fx.converted_expenses(_base_currency, local_day(models.Expense.spent_at, _timezone).label("day"))
+    .where(models.Expense.owner_id == _owner_id)
+    .where(models.Expense.spent_at >= bindparam("start"))
+    .where(models.Expense.spent_at < bindparam("end"))
+    .subquery()
+)
+DAILY_TOTALS = (
+    select(
+        _daily_spend.c.day,
+        func.sum(_daily_spend.c.base_amount).label("total"),
+        fx.unconverted(_daily_spend.c.base_amount),
+    )
+    .group_by(_daily_spend.c.day)
+    .order_by(_daily_spend.c.day)
+)
+
+# Live expenses in the base currency plus the precomputed per-category totals of archived months
+_all_spend = union_all(
+    fx.converted_expenses(_base_currency, models.Expense.category_id).where(models.Expense.owner_id == _owner_id),
+    archive.archived_spend(_owner_id),
+).subquery()
+# Top categories and the month cover a subset of these rows, so one unconverted count covers the dashboard
+TOTAL_SPENT = select(
+    func.coalesce(func.sum(_all_spend.c.base_amount), 0).label("total"),
+    fx.unconverted(_all_spend.c.base_amount),
+)
+
+_month_spend = (
+    fx.converted_expenses(_base_currency)
+    .where(models.Expense.owner_id == _owner_id)
+    .where(models.Expense.spent_at >= bindparam("month_start"))
+    .subquery()
+)
+MONTH_TO_DATE = select(func.coalesce(func.sum(_month_spend.c.base_amount), 0))
+
+TOP_CATEGORIES = (
+    select(
+        categories.c.id.label("category_id"),
+        categories.c.name,
+        categories.c.color,
+        func.coalesce(func.sum(_all_spend.c.base_amount), 0).label("total"),
+    )
+    .join(_all_spend, categories.c.id == _all_spend.c.category_id)
+    .where(categories.c.owner_id == _owner_id)
+    .group_by(categories.c.id, categories.c.name, categories.c.color)
+    .order_by(func.sum(_all_spend.c.base_amount).desc())
+    .limit(4)
+)
+
+CATEGORIES = select(categories).where(categories.c.owner_id == _owner_id).order_by(categories.c.name)
+BUDGETS = select(budgets).where(budgets.c.owner_id == _owner_id).order_by(budgets.c.month.desc())
+
+
+def list_expenses(
+    db: Session,
+    user: models.User,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    category_id: int | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> list:
+    """A user's expenses between two inclusive local dates, newest first, archived months included.
+
+    ``fields`` limits the selected columns; narrow selections of indexed
+    columns are answered from the covering (owner_id, spent_at) index.
+    """
+    # Filter on the UTC range equivalent to the local days so the (owner_id, spent_at) index is used
+    start, end = timezones.utc_range(start_date, end_date, timezones.user_zone(user))
+    with_archive = archive.reaches_archive(user, start.date() if start is not None else None)
+    if fields is not None and with_archive and "spent_at" not in fields:
+        # Merging in archived expenses sorts on spent_at
+        fields = tuple(column.name for column in EXPENSE_COLUMNS if column.name in {*fields, "spent_at"})
+    query = _expense_list(category_id is not None, start is not None, end is not None, fields)
+    params = {"owner_id": user.id, "category_id": category_id, "start": start, "end": end}
+    rows = db.connection().execute(query, params).all()
+
+    if with_archive:
+        archived = archive.archived_expenses(db, user.id, start, end, category_id)
+        # Live rows come back offset-aware from PostgreSQL, archived ones as naive UTC
+        rows = sorted(rows + archived, key=lambda e: timezones.naive_utc(e.spent_at), reverse=True)
+    return rows
+
+
+def expense_summary(
+    db: Session,
+    user: models.User,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    category_id: int | None = None,
+) -> schemas.ExpenseSummary:
+    """Totals, extremes and per-category and per-month facets of what ``list_expenses`` returns.
+
+    One grouped query over the (owner_id, spent_at) range yields a cell per
+    (category, month); the overall figures and both facets are rolled up from
+    those cells, which are far fewer than the expenses themselves.
+    """
+    tz = timezones.user_zone(user)
+    start, end = timezones.utc_range(start_date, end_date, tz)
+    query = _expense_facets(category_id is not None, start is not None, end is not None)
+    params = {
+        "owner_id": user.id,
+        "base_currency": user.base_currency,
+        "timezone": user.timezone,
+        "category_id": category_id,
+        "start": start,
+        "end": end,
+    }
+    rows = db.connection().execute(query, params).all()
+    fx.check_converted(sum(row.unconverted for row in rows), user.base_currency)
+    cells = [(row.category_id, row.month, row.count, row.total, row.min_amount, row.max_amount) for row in rows]
+    if archive.reaches_archive(user, start.date() if start is not None else None):
+        for expense in archive.archived_expenses(db, user.id, start, end, category_id):
+            month = timezones.local_date(expense.spent_at, tz).replace(day=1)
+            amount = expense.base_amount
+            cells.append((expense.category_id, month, 1, amount, amount, amount))
+
+    by_category = defaultdict(lambda: [0, Decimal("0")])
+    by_month = defaultdict(lambda: [0, Decimal("0")])
+    minimum = maximum = None
+    for category, month, count, total, low, high in cells:
+        for facet in (by_category[category], by_month[month]):
+            facet[0] += count
+            facet[1] += total
+        minimum = low if minimum is None or low < minimum else minimum
+        maximum = high if maximum is None or high > maximum else maximum
+
+    return schemas.ExpenseSummary(
+        count=sum(count for count, _ in by_month.values()),
+        total=sum((total for _, total in by_month.values()), Decimal("0")),
+        min_amount=minimum,
+        max_amount=maximum,
+        categories=sorted(
+            (schemas.CategoryFacet(category_id=key, count=count, total=total) for key, (count, total) in by_category.items()),
+            key=lambda facet: facet.total,
+            reverse=True,
+        ),
+        months=[
+            schemas.MonthFacet(month=key, count=count, total=total) for key, (count, total) in sorted(by_month.items())
+        ],
+    )
+
+
+def daily_totals(db: Session, user: models.User, start: date, end: date) -> list[schemas.DailyTotal]:
+    """Sum a user's expenses per local calendar day between two inclusive dates."""
+    tz = timezones.user_zone(user)
+    start_ts, end_ts = timezones.utc_range(start, end, tz)
+    params = {
+        "owner_id": user.id,
+        "base_currency": user.base_currency,
+        "timezone": user.timezone,
+        "start": start_ts,
+        "end": end_ts,
+    }
+    rows = db.connection().execute(DAILY_TOTALS, params).all()
+    fx.check_converted(sum(row.unconverted for row in rows), user.base_currency)
+    totals = [schemas.DailyTotal(day=row.day, total=row.total) for row in rows]
+
+    if archive.reaches_archive(user, start_ts.date()):
+        by_day = {item.day: item.total for item in totals}
+        for expense in archive.archived_expenses(db, user.id, start_ts, end_ts):
+            day = timezones.local_date(expense.spent_at, tz)
+            by_day[day] = by_day.get(day, 0) + expense.base_amount
+        totals = [schemas.DailyTotal(day=day, total=total) for day, total in sorted(by_day.items())]
+    return totals
+
+
+def dashboard(db: Session, user: models.User) -> schemas.DashboardSummary:
+    """Aggregate the dashboard numbers for one user."""
+    tz = timezones.user_zone(user)
+    conn = db.connection()
+    params = {
+        "owner_id": user.id,
+        "base_currency": user.base_currency,
+        "month_start": timezones.utc_start_of(timezones.local_today(tz).replace(day=1), tz),
+    }
+    total_spent, unconverted = conn.execute(TOTAL_SPENT, params).one()
+    fx.check_converted(unconverted, user.base_currency)
+    month_to_date = conn.execute(MONTH_TO_DATE, params).scalar()
+    top_categories = [
+        schemas.TopCategoryBreakdown(category_id=row.category_id, name=row.name, color=row.color, total=row.total)
+        for row in conn.execute(TOP_CATEGORIES, params)
+    ]
+    return schemas.DashboardSummary(
+        total_spent=total_spent or Decimal("0"),
+        month_to_date=month_to_date or Decimal("0"),
+        budgets=list_budgets(db, user.id),
+        top_categories=top_categories,
+    )
+
+
+def list_categories(db: Session, owner_id: int) -> list[Row]:
+    return db.connection().execute(CATEGORIES, {"owner_id": owner_id}).all()
+
+
+def list_budgets(db: Session, owner_id: int) -> list[Row]:
+    return db.connection().execute(BUDGETS, {"owner_id": owner_id}).all()
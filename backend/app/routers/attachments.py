@@ -0,0 +1,150 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import attachments, models, schemas
+from ..auth import get_current_user
+from ..deps import SessionRoute, get_db
+from .expenses import missing_expense
+
+router = APIRouter(tags=["attachments"], route_class=SessionRoute)
+
+
+def _out(attachment: models.Attachment) -> schemas.Attachment:
+    result = schemas.Attachment.model_validate(attachment)
+    result.thumbnail = attachments.thumbnail_path(attachment.sha256).exists()
+    return result
+
+
+def _owned_attachment(db: Session, user: models.User, attachment_id: int) -> models.Attachment:
+    attachment = db.get(models.Attachment, attachment_id)
+    if not attachment or attachment.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachment
+
+
+def _check_expense(db: Session, user: models.User, expense_id: int) -> int:
+    expense = db.get(models.Expense, expense_id)
+    if not expense or expense.owner_id != user.id:
+        raise missing_expense(db, user, expense_id)
+    owner_id = user.id
+    # Hand the connection back to the pool while the body is being received
+    db.commit()
+    return owner_id
+
+
+def _add(db: Session, attachment: models.Attachment) -> schemas.Attachment:
+    db.add(attachment)
+    db.commit()
+    db.refresh(attachment)
+    return _out(attachment)
+
+
+@router.post(
+    "/expenses/{expense_id}/attachments",
+    response_model=schemas.Attachment,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {"content": {media: {} for media in attachments.ALLOWED_TYPES}, "required": True}},
+)
+async def upload_attachment(
+    expense_id: int,
+    request: Request,
+    filename: str = Query(min_length=1, max_length=255),
+    content_type: str = Header(description="Media type of the raw request body"),
+    content_length: int | None = Header(default=None),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Attach a receipt sent as the raw request body (not multipart)."""
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type not in attachments.ALLOWED_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Accepted types: {', '.join(attachments.ALLOWED_TYPES)}",
+        )
+    owner_id = await run_in_threadpool(_check_expense, db, current_user, expense_id)
+    sha256, size = await attachments.store(request.stream(), content_length)
+
+    attachment = models.Attachment(
+        owner_id=owner_id,
+        expense_id=expense_id,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        sha256=sha256,
+    )
+    result = await run_in_threadpool(_add, db, attachment)
+    attachments.schedule_thumbnail(sha256, content_type)
+    return result
+
+
+@router.get("/expenses/{expense_id}/attachments", response_model=list[schemas.Attachment])
+def list_attachments(
+    expense_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    rows = db.scalars(
+        select(models.Attachment)
+        .where(models.Attachment.owner_id == current_user.id, models.Attachment.expense_id == expense_id)
+        .order_by(models.Attachment.id)
+    )
+    return [_out(row) for row in rows]
+
+
+def _file_response(path, etag: str, media_type: str, if_none_match: str | None, filename: str | None = None):
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        content_disposition_type="inline" if media_type in attachments.INLINE_TYPES else "attachment",
+        # Content never changes under a hash; the strong ETag also drives If-Range
+        headers={
+            "ETag": etag,
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+
+@router.get("/attachments/{attachment_id}/content", response_class=FileResponse)
+def download_attachment(
+    attachment_id: int,
+    if_none_match: str | None = Header(default=None),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """The stored file; supports ``Range`` and ``If-None-Match``."""
+    attachment = _owned_attachment(db, current_user, attachment_id)
+    path = attachments.object_path(attachment.sha256)
+    etag = f'"{attachment.sha256}"'
+    return _file_response(path, etag, attachment.content_type, if_none_match, attachment.filename)
+
+
+@router.get("/attachments/{attachment_id}/thumbnail", response_class=FileResponse)
+def download_thumbnail(
+    attachment_id: int,
+    if_none_match: str | None = Header(default=None),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    attachment = _owned_attachment(db, current_user, attachment_id)
+    path = attachments.thumbnail_path(attachment.sha256)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    return _file_response(path, f'"{attachment.sha256}-thumbnail"', "image/jpeg", if_none_match)
+
+
+@router.delete("/attachments/{attachment_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_attachment(
+    attachment_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    db.delete(_owned_attachment(db, current_user, attachment_id))
+    db.commit()
+    return None
@@ -2,37 +2,33 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import models, schemas, shards
 from ..auth import create_access_token, get_current_user, get_password_hash, verify_password
-from ..deps import get_db
+from ..config import settings
+from ..deps import SessionRoute, get_db
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=SessionRoute)
 
 
 @router.post("/signup", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
 def signup(payload: schemas.UserRegister, db: Session = Depends(get_db)):
     """Register a new user."""
-    # Check if email already exists
-    if db.query(models.User).filter(models.User.email == payload.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create new user with hashed password
+    # Create new user with hashed password; fails if the email is already registered
     user = models.User(
         name=payload.name,
         email=payload.email,
-        password_hash=get_password_hash(payload.password)
+        password_hash=get_password_hash(payload.password),
+        base_currency=payload.base_currency or settings.default_currency,
+        timezone=payload.timezone or settings.default_timezone,
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    return shards.add_user(db, user)
 
 
 @router.post("/login", response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Authenticate user and return JWT token."""
     # Find user by email (username field in OAuth2 form)
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+    user = shards.find_user_by_email(db, form_data.username)
     
     if not user or not verify_password(form_data.password, user.password_hash):
         raise HTTPException(
@@ -50,3 +46,17 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 def get_me(current_user: models.User = Depends(get_current_user)):
     """Get current authenticated user."""
     return current_user
+
+
+@router.patch("/me", response_model=schemas.User)
+def update_me(
+    payload: schemas.UserSettingsUpdate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Update the current user's settings."""
+    for key, value in payload.model_dump(exclude_none=True).items():
+        setattr(current_user, key, value)
+    db.commit()
+    db.refresh(current_user)
+    return current_user
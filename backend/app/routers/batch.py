@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models, repository, schemas, timezones
+from ..auth import get_current_user
+from ..config import settings
+from ..deps import SessionRoute, get_db
+from . import budgets, categories, expenses
+
+router = APIRouter(prefix="/batch", tags=["batch"], route_class=SessionRoute)
+
+# (entity, action) -> (payload schema, write, response schema); writes flush, the batch commits once
+OPERATIONS = {
+    ("expense", "create"): (schemas.ExpenseBase, expenses.add_expense, schemas.Expense),
+    ("expense", "update"): (schemas.ExpenseUpdate, expenses.change_expense, schemas.Expense),
+    ("expense", "delete"): (None, expenses.remove_expense, None),
+    ("category", "create"): (schemas.CategoryBase, categories.add_category, schemas.Category),
+    ("category", "update"): (schemas.CategoryUpdate, categories.change_category, schemas.Category),
+    ("category", "delete"): (None, categories.remove_category, None),
+    ("budget", "create"): (schemas.BudgetBase, budgets.add_budget, schemas.Budget),
+    ("budget", "delete"): (None, budgets.remove_budget, None),
+}
+
+STATUS = {
+    "create": status.HTTP_201_CREATED,
+    "update": status.HTTP_200_OK,
+    "delete": status.HTTP_204_NO_CONTENT,
+}
+
+
+def apply(db: Session, user: models.User, operation: schemas.BatchOperation):
+    """Run one operation's write and return ``(response schema, row)``; nothing is committed."""
+    handler = OPERATIONS.get((operation.entity, operation.action))
+    if handler is None:
+        raise HTTPException(status_code=400, detail=f"Cannot {operation.action} a {operation.entity}")
+    payload_schema, write, response_schema = handler
+    args = []
+    if operation.action != "create":
+        if operation.id is None:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="id is required")
+        args.append(operation.id)
+    if payload_schema is not None:
+        try:
+            args.append(payload_schema.model_validate(operation.data or {}))
+        except ValidationError as exc:
+            detail = jsonable_encoder(exc.errors(include_url=False))
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+    return response_schema, write(db, user, *args)
+
+
+@router.post("/", response_model=schemas.BatchResponse)
+def run_batch(
+    payload: schemas.BatchRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Apply creates, updates and deletes in order in one transaction; if one fails, none are applied.
+
+    A failure answers with that operation's status (409 when its write violates a
+    constraint) and ``{"detail": {"operation": <index>, "detail": <its error>}}``.
+    """
+    if len(payload.operations) > settings.batch_max_operations:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.batch_max_operations} operations per batch",
+        )
+
+    written = []
+    try:
+        for index, operation in enumerate(payload.operations):
+            try:
+                written.append(apply(db, current_user, operation))
+            except HTTPException as exc:
+                raise HTTPException(
+                    status_code=exc.status_code,
+                    detail={"operation": index, "detail": exc.detail},
+                    headers=exc.headers,
+                )
+            except IntegrityError:
+                # e.g. a second budget for the same category and month (uq_budget_owner_category_month)
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail={"operation": index, "detail": "Conflicts with an existing row"},
+                )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    results = []
+    for operation, (response_schema, row) in zip(payload.operations, written):
+        data = None
+        if response_schema is not None:
+            # Refreshed after the commit, like the single-item endpoints, so values come back as stored
+            # (unless a later operation of the batch deleted the row)
+            if inspect(row).persistent:
+                db.refresh(row)
+            data = response_schema.model_validate(row)
+        results.append(schemas.BatchResult(status=STATUS[operation.action], data=data))
+    response = schemas.BatchResponse(results=results)
+    if "dashboard" in payload.refresh:
+        response.dashboard = repository.dashboard(db, current_user)
+    if "daily" in payload.refresh:
+        today = timezones.local_today(timezones.user_zone(current_user))
+        response.daily = repository.daily_totals(db, current_user, today - timedelta(days=6), today)
+    return response
@@ -1,11 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import models, repository, schemas
 from ..auth import get_current_user
-from ..deps import get_db
+from ..deps import SessionRoute, get_db
 
-router = APIRouter(prefix="/budgets", tags=["budgets"])
+router = APIRouter(prefix="/budgets", tags=["budgets"], route_class=SessionRoute)
+
+
+def add_budget(db: Session, user: models.User, payload: schemas.BudgetBase) -> models.Budget:
+    budget = models.Budget(owner_id=user.id, **payload.model_dump())
+    db.add(budget)
+    db.flush()
+    return budget
+
+
+def remove_budget(db: Session, user: models.User, budget_id: int) -> None:
+    budget = db.get(models.Budget, budget_id)
+    if not budget or budget.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    db.delete(budget)
+    db.flush()
 
 
 @router.post("/", response_model=schemas.Budget, status_code=status.HTTP_201_CREATED)
@@ -14,13 +29,8 @@ def create_budget(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    budget = models.Budget(owner_id=current_user.id, **payload.model_dump())
-    db.add(budget)
-    try:
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
+    budget = add_budget(db, current_user, payload)
+    db.commit()
     db.refresh(budget)
     return budget
 
@@ -30,10 +40,19 @@ def list_budgets(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    return repository.list_budgets(db, current_user.id)
+
+
+@router.get("/forecasts", response_model=list[schemas.BudgetForecast])
+def list_forecasts(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Month-end projections from the latest nightly forecast run."""
     return (
-        db.query(models.Budget)
-        .filter(models.Budget.owner_id == current_user.id)
-        .order_by(models.Budget.month.desc())
+        db.query(models.BudgetForecast)
+        .filter(models.BudgetForecast.owner_id == current_user.id)
+        .order_by(models.BudgetForecast.projected_ratio.desc())
         .all()
     )
 
@@ -44,9 +63,6 @@ def delete_budget(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    budget = db.get(models.Budget, budget_id)
-    if not budget or budget.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Budget not found")
-    db.delete(budget)
+    remove_budget(db, current_user, budget_id)
     db.commit()
     return None
@@ -1,28 +1,53 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import models, repository, schemas
 from ..auth import get_current_user
-from ..deps import get_db
+from ..deps import SessionRoute, get_db
 
-router = APIRouter(prefix="/categories", tags=["categories"])
+router = APIRouter(prefix="/categories", tags=["categories"], route_class=SessionRoute)
 
 
-@router.post("/", response_model=schemas.Category, status_code=status.HTTP_201_CREATED)
-def create_category(
-    payload: schemas.CategoryBase,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+def add_category(db: Session, user: models.User, payload: schemas.CategoryBase) -> models.Category:
     exists = (
         db.query(models.Category)
-        .filter(models.Category.owner_id == current_user.id, models.Category.name == payload.name)
+        .filter(models.Category.owner_id == user.id, models.Category.name == payload.name)
         .first()
     )
     if exists:
         raise HTTPException(status_code=400, detail="Category already exists")
-    category = models.Category(owner_id=current_user.id, **payload.model_dump())
+    category = models.Category(owner_id=user.id, **payload.model_dump())
     db.add(category)
+    db.flush()
+    return category
+
+
+def change_category(db: Session, user: models.User, category_id: int, payload: schemas.CategoryUpdate) -> models.Category:
+    category = db.get(models.Category, category_id)
+    if not category or category.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Category not found")
+    for key, value in payload.model_dump(exclude_none=True).items():
+        setattr(category, key, value)
+    db.add(category)
+    db.flush()
+    return category
+
+
+def remove_category(db: Session, user: models.User, category_id: int) -> None:
+    category = db.get(models.Category, category_id)
+    if not category or category.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Category not found")
+    db.delete(category)
+    db.flush()
+
+
+@router.post("/", response_model=schemas.Category, status_code=status.HTTP_201_CREATED)
+def create_category(
+    payload: schemas.CategoryBase,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    category = add_category(db, current_user, payload)
     db.commit()
     db.refresh(category)
     return category
@@ -33,12 +58,7 @@ def list_categories(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    return (
-        db.query(models.Category)
-        .filter(models.Category.owner_id == current_user.id)
-        .order_by(models.Category.name)
-        .all()
-    )
+    return repository.list_categories(db, current_user.id)
 
 
 @router.put("/{category_id}", response_model=schemas.Category)
@@ -48,12 +68,7 @@ def update_category(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    category = db.get(models.Category, category_id)
-    if not category or category.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Category not found")
-    for key, value in payload.model_dump(exclude_none=True).items():
-        setattr(category, key, value)
-    db.add(category)
+    category = change_category(db, current_user, category_id, payload)
     db.commit()
     db.refresh(category)
     return category
@@ -65,9 +80,6 @@ def delete_category(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    category = db.get(models.Category, category_id)
-    if not category or category.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Category not found")
-    db.delete(category)
+    remove_category(db, current_user, category_id)
     db.commit()
     return None
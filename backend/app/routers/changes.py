@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import archive, models, schemas
+from ..auth import get_current_user
+from ..deps import SessionRoute, get_db
+
+router = APIRouter(prefix="/changes", tags=["changes"], route_class=SessionRoute)
+
+FEEDS = {
+    "expenses": models.Expense,
+    "categories": models.Category,
+    "budgets": models.Budget,
+    "deleted": models.Tombstone,
+}
+
+
+@router.get("/", response_model=schemas.ChangeFeed)
+def list_changes(
+    since: int | None = Query(default=None, ge=0, description="Cursor from a previous call; omit for a full sync"),
+    limit: int = Query(default=1000, ge=1, le=10000, description="Maximum rows per entity type"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Return rows created, changed or deleted after `since`, ordered by sync sequence."""
+    rows = {}
+    for key, model in FEEDS.items():
+        query = db.query(model).filter(model.owner_id == current_user.id)
+        if since is not None:
+            query = query.filter(model.sync_seq > since)
+        rows[key] = query.order_by(model.sync_seq).limit(limit + 1).all()
+    if current_user.archived_before is not None:
+        # Archived expenses are unchanged, only read-only, and keep their place in the feed
+        archived = [
+            expense for expense in archive.archived_expenses(db, current_user.id)
+            if since is None or expense.sync_seq > since
+        ]
+        rows["expenses"] = sorted(rows["expenses"] + archived, key=lambda row: row.sync_seq)[:limit + 1]
+
+    # Sequence values are shared by all entity types of a user, so when any feed
+    # overflows we cut every feed at the same point to keep the cursor consistent.
+    overflowing = [items[limit - 1].sync_seq for items in rows.values() if len(items) > limit]
+    has_more = bool(overflowing)
+    if has_more:
+        cutoff = min(overflowing)
+        rows = {key: [row for row in items if row.sync_seq <= cutoff] for key, items in rows.items()}
+        cursor = cutoff
+    else:
+        cursor = max((items[-1].sync_seq for items in rows.values() if items), default=since or 0)
+
+    return schemas.ChangeFeed(cursor=cursor, has_more=has_more, **rows)
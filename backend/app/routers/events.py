@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from .. import models, notifications, schemas
+from ..auth import STREAM_TICKET_SCOPE, authenticate_token, create_stream_ticket, get_current_user
+from ..config import settings
+from ..database import get_session
+from ..shards import engine_for_token
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+def _user_id_for(ticket: str) -> int:
+    with get_session(bind=engine_for_token(ticket)) as db:
+        return authenticate_token(ticket, db, scope=STREAM_TICKET_SCOPE).id
+
+
+@router.post("/ticket", response_model=schemas.StreamTicket)
+def stream_ticket(current_user: models.User = Depends(get_current_user)):
+    """Issue a short-lived ticket for ``GET /events``, so access tokens never appear in URLs or logs."""
+    return {"ticket": create_stream_ticket(current_user.id), "expires_in": settings.stream_ticket_seconds}
+
+
+@router.get("/")
+async def live_updates(
+    request: Request,
+    ticket: str = Query(description="Ticket from POST /events/ticket; EventSource cannot send headers"),
+):
+    """Stream dashboard and daily-total updates for the current user as server-sent events."""
+    # Authenticate with a short-lived session so the stream never pins a DB connection
+    user_id = await run_in_threadpool(_user_id_for, ticket)
+    return StreamingResponse(
+        notifications.stream(user_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,13 +1,60 @@
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import archive, formats, fx, models, repository, schemas, timezones
 from ..auth import get_current_user
-from ..deps import get_db
+from ..deps import SessionRoute, get_db
 
-router = APIRouter(prefix="/expenses", tags=["expenses"])
+router = APIRouter(prefix="/expenses", tags=["expenses"], route_class=SessionRoute)
+
+
+def missing_expense(db: Session, user: models.User, expense_id: int) -> HTTPException:
+    """404 for an unknown expense, 409 for one that has been moved to the (read-only) archive."""
+    if archive.is_archived(db, user, expense_id):
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Expense is archived and read-only")
+    return HTTPException(status_code=404, detail="Expense not found")
+
+
+def add_expense(db: Session, user: models.User, payload: schemas.ExpenseBase) -> models.Expense:
+    if payload.category_id:
+        category = db.get(models.Category, payload.category_id)
+        if not category or category.owner_id != user.id:
+            raise HTTPException(status_code=404, detail="Category not found")
+    data = payload.model_dump()
+    data["currency"] = data["currency"] or user.base_currency
+    # spent_at is naive UTC (schemas.UtcTimestamp): its date is the UTC day rates are joined on
+    fx.require_rates(db, data["currency"], user.base_currency, data["spent_at"].date())
+    expense = models.Expense(owner_id=user.id, **data)
+    db.add(expense)
+    db.flush()
+    return expense
+
+
+def change_expense(db: Session, user: models.User, expense_id: int, payload: schemas.ExpenseUpdate) -> models.Expense:
+    expense = db.get(models.Expense, expense_id)
+    if not expense or expense.owner_id != user.id:
+        raise missing_expense(db, user, expense_id)
+    data = payload.model_dump(exclude_none=True)
+    if "currency" in data or "spent_at" in data:
+        day = timezones.naive_utc(data.get("spent_at", expense.spent_at)).date()
+        fx.require_rates(db, data.get("currency", expense.currency), user.base_currency, day)
+    for key, value in data.items():
+        setattr(expense, key, value)
+    db.add(expense)
+    db.flush()
+    return expense
+
+
+def remove_expense(db: Session, user: models.User, expense_id: int) -> None:
+    expense = db.get(models.Expense, expense_id)
+    if not expense or expense.owner_id != user.id:
+        raise missing_expense(db, user, expense_id)
+    # Stored files are left to `python -m app.attachments gc`
+    db.execute(delete(models.Attachment).where(models.Attachment.expense_id == expense.id))
+    db.delete(expense)
+    db.flush()
 
 
 @router.post("/", response_model=schemas.Expense, status_code=status.HTTP_201_CREATED)
@@ -16,34 +63,37 @@ def create_expense(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    if payload.category_id:
-        category = db.get(models.Category, payload.category_id)
-        if not category or category.owner_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Category not found")
-    expense = models.Expense(owner_id=current_user.id, **payload.model_dump())
-    db.add(expense)
+    expense = add_expense(db, current_user, payload)
     db.commit()
     db.refresh(expense)
     return expense
 
 
-@router.get("/", response_model=list[schemas.Expense])
+@router.get("/", response_model=list[schemas.Expense], responses=formats.BINARY_RESPONSES)
 def list_expenses(
+    category_id: int | None = None,
+    start_date: date | None = Query(default=None, description="Inclusive start date"),
+    end_date: date | None = Query(default=None, description="Inclusive end date"),
+    fields: tuple[str, ...] | None = Depends(formats.field_selection(schemas.Expense)),
+    media_type: str = Depends(formats.response_format),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    expenses = repository.list_expenses(db, current_user, start_date, end_date, category_id, fields)
+    model = list[formats.sparse_model(schemas.Expense, fields)]
+    return formats.render(media_type, model, expenses, formats.expense_columns, fields)
+
+
+@router.get("/summary", response_model=schemas.ExpenseSummary)
+def expense_summary(
     category_id: int | None = None,
     start_date: date | None = Query(default=None, description="Inclusive start date"),
     end_date: date | None = Query(default=None, description="Inclusive end date"),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    query = db.query(models.Expense).filter(models.Expense.owner_id == current_user.id)
-    if category_id is not None:
-        query = query.filter(models.Expense.category_id == category_id)
-    if start_date is not None:
-        query = query.filter(models.Expense.spent_at >= datetime.combine(start_date, datetime.min.time()))
-    if end_date is not None:
-        end_ts = datetime.combine(end_date, datetime.max.time())
-        query = query.filter(models.Expense.spent_at <= end_ts)
-    return query.order_by(models.Expense.spent_at.desc()).all()
+    """Totals and facets of the expenses ``GET /expenses/`` returns for the same filters."""
+    return repository.expense_summary(db, current_user, start_date, end_date, category_id)
 
 
 @router.put("/{expense_id}", response_model=schemas.Expense)
@@ -53,13 +103,7 @@ def update_expense(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    expense = db.get(models.Expense, expense_id)
-    if not expense or expense.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Expense not found")
-    data = payload.model_dump(exclude_none=True)
-    for key, value in data.items():
-        setattr(expense, key, value)
-    db.add(expense)
+    expense = change_expense(db, current_user, expense_id, payload)
     db.commit()
     db.refresh(expense)
     return expense
@@ -71,32 +115,22 @@ def delete_expense(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    expense = db.get(models.Expense, expense_id)
-    if not expense or expense.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Expense not found")
-    db.delete(expense)
+    remove_expense(db, current_user, expense_id)
     db.commit()
     return None
 
 
-@router.get("/daily", response_model=list[schemas.DailyTotal])
+@router.get("/daily", response_model=list[schemas.DailyTotal], responses=formats.BINARY_RESPONSES)
 def daily_totals(
     start_date: date = Query(default=None, description="Defaults to last 7 days"),
     end_date: date = Query(default=None, description="Defaults to today"),
+    media_type: str = Depends(formats.response_format),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    today = date.today()
+    today = timezones.local_today(timezones.user_zone(current_user))
     start = start_date or today - timedelta(days=6)
     end = end_date or today
 
-    query = (
-        db.query(func.date(models.Expense.spent_at).label("day"), func.sum(models.Expense.amount).label("total"))
-        .filter(models.Expense.owner_id == current_user.id)
-        .filter(models.Expense.spent_at >= datetime.combine(start, datetime.min.time()))
-        .filter(models.Expense.spent_at <= datetime.combine(end, datetime.max.time()))
-        .group_by(func.date(models.Expense.spent_at))
-        .order_by(func.date(models.Expense.spent_at))
-    )
-
-    return [schemas.DailyTotal(day=row.day, total=row.total) for row in query.all()]
+    totals = repository.daily_totals(db, current_user, start, end)
+    return formats.render(media_type, list[schemas.DailyTotal], totals, formats.daily_total_columns)
@@ -0,0 +1,16 @@
+from typing import List
+
+from fastapi import APIRouter, Depends
+
+from .. import models, schemas
+from ..auth import get_current_user
+from ..compression import compression_stats
+from ..deps import SessionRoute
+
+router = APIRouter(prefix="/metrics", tags=["metrics"], route_class=SessionRoute)
+
+
+@router.get("/compression", response_model=List[schemas.CompressionStat])
+def get_compression_stats(current_user: models.User = Depends(get_current_user)):
+    """Compression ratio, CPU time and cache hits per route and encoding since this worker started."""
+    return compression_stats.snapshot()
@@ -0,0 +1,29 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from .. import profiling, schemas
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+def require_profile_token(x_profile: str | None = Header(default=None)):
+    # Profiles expose code paths and timings, so they share the token that triggers profiling
+    if not profiling.token_matches(x_profile):
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+@router.get("/", response_model=List[schemas.ProfileInfo], dependencies=[Depends(require_profile_token)])
+def list_profiles():
+    """Stored request profiles, newest first."""
+    return profiling.list_profiles()
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_profile_token)])
+def download_profile(profile_id: str):
+    """Collapsed stacks for one profile; open in speedscope or pipe into flamegraph.pl."""
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
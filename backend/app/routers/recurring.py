@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..auth import get_current_user
+from ..deps import SessionRoute, get_db
+
+router = APIRouter(prefix="/recurring", tags=["recurring"], route_class=SessionRoute)
+
+
+@router.post("/", response_model=schemas.RecurringExpense, status_code=status.HTTP_201_CREATED)
+def create_recurring_expense(
+    payload: schemas.RecurringExpenseBase,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if payload.category_id:
+        category = db.get(models.Category, payload.category_id)
+        if not category or category.owner_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Category not found")
+    if payload.until is not None and payload.until < payload.start_on:
+        raise HTTPException(status_code=400, detail="until must not be before start_on")
+    data = payload.model_dump()
+    data["currency"] = data["currency"] or current_user.base_currency
+    template = models.RecurringExpense(owner_id=current_user.id, next_run_on=payload.start_on, **data)
+    db.add(template)
+    db.commit()
+    db.refresh(template)
+    return template
+
+
+@router.get("/", response_model=list[schemas.RecurringExpense])
+def list_recurring_expenses(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return (
+        db.query(models.RecurringExpense)
+        .filter(models.RecurringExpense.owner_id == current_user.id)
+        .order_by(models.RecurringExpense.start_on)
+        .all()
+    )
+
+
+@router.delete("/{recurring_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_recurring_expense(
+    recurring_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stop a recurring expense. Already materialized expenses are kept."""
+    template = db.get(models.RecurringExpense, recurring_id)
+    if not template or template.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    # Unlink through the ORM rather than the foreign key's SET NULL, so synced clients see the change
+    for expense in db.scalars(select(models.Expense).where(models.Expense.recurring_id == template.id)):
+        expense.recurring_id = None
+    db.delete(template)
+    db.commit()
+    return None
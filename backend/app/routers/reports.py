@@ -1,64 +1,63 @@
-from datetime import date, datetime
-from decimal import Decimal
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import analytics, formats, jobs, models, repository, schemas
 from ..auth import get_current_user
-from ..deps import get_db
+from ..deps import SessionRoute, get_db
 
-router = APIRouter(prefix="/reports", tags=["reports"])
+router = APIRouter(prefix="/reports", tags=["reports"], route_class=SessionRoute)
 
 
-@router.get("/dashboard", response_model=schemas.DashboardSummary)
+@router.get("/dashboard", response_model=schemas.DashboardSummary, responses={200: {"content": {formats.MSGPACK: {}}}})
 def dashboard(
+    media_type: str = Depends(formats.response_format),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    total_spent = db.query(func.coalesce(func.sum(models.Expense.amount), 0)).filter(models.Expense.owner_id == current_user.id).scalar()
+    return formats.render(media_type, schemas.DashboardSummary, repository.dashboard(db, current_user))
 
-    today = date.today()
-    month_start = datetime(today.year, today.month, 1)
-    month_to_date = (
-        db.query(func.coalesce(func.sum(models.Expense.amount), 0))
-        .filter(models.Expense.owner_id == current_user.id)
-        .filter(models.Expense.spent_at >= month_start)
-        .scalar()
-    )
 
-    budgets = (
-        db.query(models.Budget)
-        .filter(models.Budget.owner_id == current_user.id)
-        .order_by(models.Budget.month.desc())
-        .all()
-    )
+@router.get("/stats", response_model=schemas.SpendingStats)
+def spending_stats(
+    start_date: date | None = Query(default=None, description="Inclusive start date"),
+    end_date: date | None = Query(default=None, description="Inclusive end date"),
+    series_days: int = Query(default=90, ge=1, le=3660, description="Days of rolling averages to return"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Percentiles, rolling averages, weekday/hour heatmap, per-category variance and anomalies."""
+    arrays = analytics.array_cache.get(db, current_user)
+    return analytics.compute_stats(arrays, start_date, end_date, series_days)
+
 
-    top_categories_rows = (
-        db.query(
-            models.Category.id.label("category_id"),
-            models.Category.name,
-            models.Category.color,
-            func.coalesce(func.sum(models.Expense.amount), 0).label("total"),
-        )
-        .join(models.Expense, models.Category.id == models.Expense.category_id)
-        .filter(models.Expense.owner_id == current_user.id)
-        .group_by(models.Category.id, models.Category.name, models.Category.color)
-        .order_by(func.sum(models.Expense.amount).desc())
-        .limit(4)
-        .all()
-    )
+@router.post("/jobs", response_model=schemas.ReportJob, status_code=status.HTTP_202_ACCEPTED)
+def create_report_job(
+    payload: schemas.ReportJobCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Queue a report to run in the background, or return the identical job already queued or done."""
+    return jobs.submit(db, current_user, payload)
 
-    top_categories = [
-        schemas.TopCategoryBreakdown(
-            category_id=row.category_id, name=row.name, color=row.color, total=row.total
-        )
-        for row in top_categories_rows
-    ]
 
-    return schemas.DashboardSummary(
-        total_spent=total_spent or Decimal("0"),
-        month_to_date=month_to_date or Decimal("0"),
-        budgets=budgets,
-        top_categories=top_categories,
-    )
+@router.get("/jobs/{job_id}", response_model=schemas.ReportJob)
+def get_report_job(
+    job_id: str,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return jobs.get_job(db, current_user.id, job_id)
+
+
+@router.get("/jobs/{job_id}/result", responses={200: {"description": "The report, as its synchronous endpoint returns it"}})
+def get_report_job_result(
+    job_id: str,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    job = jobs.get_job(db, current_user.id, job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    # Stored as the serialized response; served as is
+    return Response(job.result, media_type="application/json")
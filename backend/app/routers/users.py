@@ -1,31 +1,42 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..deps import get_db
+from .. import models, schemas, shards
+from ..config import settings
+from ..deps import SessionRoute, get_db
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=SessionRoute)
 
 
 @router.post("/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
 def create_user(payload: schemas.UserCreate, db: Session = Depends(get_db)):
-    if db.query(models.User).filter(models.User.email == payload.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    user = models.User(name=payload.name, email=payload.email)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    user = models.User(
+        name=payload.name,
+        email=payload.email,
+        base_currency=settings.default_currency,
+        timezone=settings.default_timezone,
+    )
+    return shards.add_user(db, user)
+
+
+def _shard_users(shard: int) -> list[schemas.User]:
+    with shards.shard_session(shard) as db:
+        users = db.scalars(select(models.User).order_by(models.User.created_at.desc()))
+        return [schemas.User.model_validate(user) for user in users]
 
 
 @router.get("/", response_model=list[schemas.User])
-def list_users(db: Session = Depends(get_db)):
-    return db.query(models.User).order_by(models.User.created_at.desc()).all()
+def list_users():
+    # Gathered from every shard
+    users = [user for part in shards.scatter(_shard_users) for user in part]
+    return sorted(users, key=lambda user: user.created_at, reverse=True)
 
 
 @router.get("/{user_id}", response_model=schemas.User)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.get(models.User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+def get_user(user_id: int):
+    with shards.session_for(user_id) as db:
+        user = db.get(models.User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return schemas.User.model_validate(user)
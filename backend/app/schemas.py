@@ -1,8 +1,23 @@
 from datetime import datetime, date
 from decimal import Decimal
-from typing import Optional, List
+from typing import Annotated, Literal, Optional, List, Union
 
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field
+
+from . import timezones
+
+CURRENCY_PATTERN = r"^[A-Z]{3}$"
+
+
+def _known_timezone(name: Optional[str]) -> Optional[str]:
+    if name is not None and not timezones.is_valid(name):
+        raise ValueError(f"Unknown time zone {name!r}")
+    return name
+
+
+TimezoneName = Annotated[Optional[str], AfterValidator(_known_timezone)]
+# Stored as naive UTC: SQLite would otherwise keep the wall time and drop the offset
+UtcTimestamp = Annotated[datetime, AfterValidator(timezones.naive_utc)]
 
 
 class UserBase(BaseModel):
@@ -16,6 +31,12 @@ class UserCreate(UserBase):
 
 class UserRegister(UserBase):
     password: str = Field(..., min_length=6)
+    base_currency: Optional[str] = Field(default=None, pattern=CURRENCY_PATTERN, description="ISO 4217 code reports are shown in")
+    timezone: TimezoneName = Field(default=None, description="IANA zone reports bucket days and months in, e.g. Europe/Berlin")
+
+
+class UserSettingsUpdate(BaseModel):
+    timezone: TimezoneName = None
 
 
 class UserLogin(BaseModel):
@@ -28,12 +49,19 @@ class Token(BaseModel):
     token_type: str
 
 
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
+
 class TokenData(BaseModel):
     user_id: Optional[int] = None
 
 
 class User(UserBase):
     id: int
+    base_currency: str
+    timezone: str
     created_at: datetime
 
     model_config = dict(from_attributes=True)
@@ -63,7 +91,8 @@ class Category(CategoryBase):
 class ExpenseBase(BaseModel):
     description: str
     amount: Decimal = Field(..., gt=0)
-    spent_at: datetime = Field(default_factory=datetime.utcnow)
+    currency: Optional[str] = Field(default=None, pattern=CURRENCY_PATTERN, description="Defaults to the user's base currency")
+    spent_at: UtcTimestamp = Field(default_factory=datetime.utcnow)
     category_id: Optional[int] = None
 
 
@@ -74,13 +103,37 @@ class ExpenseCreate(ExpenseBase):
 class ExpenseUpdate(BaseModel):
     description: Optional[str] = None
     amount: Optional[Decimal] = Field(default=None, gt=0)
-    spent_at: Optional[datetime] = None
+    currency: Optional[str] = Field(default=None, pattern=CURRENCY_PATTERN)
+    spent_at: Optional[UtcTimestamp] = None
     category_id: Optional[int] = None
 
 
 class Expense(ExpenseBase):
     id: int
     owner_id: int
+    currency: str
+    spent_at: datetime
+    recurring_id: Optional[int] = None
+
+    model_config = dict(from_attributes=True)
+
+
+class RecurringExpenseBase(BaseModel):
+    description: str
+    amount: Decimal = Field(..., gt=0)
+    currency: Optional[str] = Field(default=None, pattern=CURRENCY_PATTERN, description="Defaults to the user's base currency")
+    category_id: Optional[int] = None
+    frequency: Literal["daily", "weekly", "monthly", "yearly"]
+    interval: int = Field(default=1, ge=1, le=366, description="Repeat every N periods")
+    start_on: date = Field(description="Date of the first occurrence")
+    until: Optional[date] = Field(default=None, description="Last possible occurrence date")
+
+
+class RecurringExpense(RecurringExpenseBase):
+    id: int
+    owner_id: int
+    currency: str
+    next_run_on: Optional[date]
 
     model_config = dict(from_attributes=True)
 
@@ -102,6 +155,19 @@ class Budget(BudgetBase):
     model_config = dict(from_attributes=True)
 
 
+class BudgetForecast(BaseModel):
+    budget_id: int
+    month: date
+    spent: Decimal
+    projected: Decimal = Field(description="Month-end spend at the current burn rate")
+    projected_ratio: float = Field(description="Projected spend divided by the budget amount")
+    will_overrun: bool
+    overrun_on: Optional[date] = Field(default=None, description="Day the budget runs out at the current burn rate")
+    computed_at: datetime
+
+    model_config = dict(from_attributes=True)
+
+
 class DailyTotal(BaseModel):
     day: date
     total: Decimal
@@ -119,3 +185,154 @@ class DashboardSummary(BaseModel):
     month_to_date: Decimal
     budgets: List[Budget]
     top_categories: List[TopCategoryBreakdown]
+
+
+class BatchOperation(BaseModel):
+    action: Literal["create", "update", "delete"]
+    entity: Literal["expense", "category", "budget"]
+    id: Optional[int] = Field(default=None, description="Target of `update` and `delete`")
+    data: Optional[dict] = Field(default=None, description="Body of the matching single-item endpoint")
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, description="Applied in order, all or none")
+    refresh: List[Literal["dashboard", "daily"]] = Field(
+        default=[], description="Also return the dashboard and/or the last 7 days of daily totals after the writes"
+    )
+
+
+class BatchResult(BaseModel):
+    status: int = Field(description="Status the single-item endpoint would have returned")
+    data: Optional[Union[Expense, Category, Budget]] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+    dashboard: Optional[DashboardSummary] = None
+    daily: Optional[List[DailyTotal]] = None
+
+
+class Attachment(BaseModel):
+    id: int
+    expense_id: int
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    created_at: datetime
+    thumbnail: bool = Field(default=False, description="Whether a thumbnail is available yet (images only)")
+
+    model_config = dict(from_attributes=True)
+
+
+class CategoryFacet(BaseModel):
+    category_id: Optional[int]
+    count: int
+    total: Decimal
+
+
+class MonthFacet(BaseModel):
+    month: date = Field(description="First day of the month in the user's time zone")
+    count: int
+    total: Decimal
+
+
+class ExpenseSummary(BaseModel):
+    count: int
+    total: Decimal = Field(description="In the user's base currency, like every amount here")
+    min_amount: Optional[Decimal] = None
+    max_amount: Optional[Decimal] = None
+    categories: List[CategoryFacet]
+    months: List[MonthFacet]
+
+
+class DailyStat(BaseModel):
+    day: date
+    total: float
+    avg_7: float = Field(description="Trailing 7-day average of daily totals")
+    avg_30: float = Field(description="Trailing 30-day average of daily totals")
+
+
+class CategoryStat(BaseModel):
+    category_id: Optional[int]
+    count: int
+    total: float
+    mean: float
+    variance: float
+
+
+class Anomaly(BaseModel):
+    expense_id: int
+    category_id: Optional[int]
+    amount: float
+    z_score: float = Field(description="Standard deviations above the category mean")
+
+
+class SpendingStats(BaseModel):
+    count: int
+    total: float
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    daily: List[DailyStat]
+    weekday_hour: List[List[float]] = Field(description="7x24 spend totals, Monday first, in the user's time zone")
+    categories: List[CategoryStat]
+    anomalies: List[Anomaly]
+
+
+class Tombstone(BaseModel):
+    entity: str = Field(description="Table the deleted row belonged to")
+    entity_id: int
+    sync_seq: int
+
+    model_config = dict(from_attributes=True)
+
+
+class ChangeFeed(BaseModel):
+    cursor: int = Field(description="Pass back as `since` to fetch the next batch of changes")
+    has_more: bool
+    expenses: List[Expense]
+    categories: List[Category]
+    budgets: List[Budget]
+    deleted: List[Tombstone]
+
+
+class ReportJobCreate(BaseModel):
+    kind: Literal["stats", "daily"] = Field(description="`stats` as /reports/stats, `daily` as /expenses/daily")
+    start_date: Optional[date] = Field(default=None, description="Inclusive start date")
+    end_date: Optional[date] = Field(default=None, description="Inclusive end date")
+    series_days: int = Field(default=90, ge=1, le=3660, description="Days of rolling averages (`stats` only)")
+
+
+class ReportJob(BaseModel):
+    id: str
+    kind: str
+    status: Literal["queued", "running", "done", "failed"]
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+    model_config = dict(from_attributes=True)
+
+
+class ProfileInfo(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: Optional[int]
+    duration_ms: float
+    samples: int
+    created_at: datetime
+
+
+class CompressionStat(BaseModel):
+    route: str
+    encoding: str
+    responses: int
+    bytes_in: int
+    bytes_out: int
+    ratio: float = Field(description="Uncompressed over compressed bytes")
+    cpu_ms: float
+    cache_hits: int
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta, date
 from decimal import Decimal
 
 from .database import get_session
-from . import models
+from . import models, sync  # noqa: F401
 
 
 COLORS = ["#ec4899", "#8b5cf6", "#06b6d4", "#10b981", "#f59e0b"]
@@ -69,6 +69,28 @@ def seed():
         ]
         db.add_all(budgets)
 
+        month_start = date(today.year, today.month, 1)
+        db.add_all([
+            models.RecurringExpense(
+                description="Rent",
+                amount=Decimal("950.00"),
+                owner_id=user.id,
+                category_id=categories[2].id,
+                frequency="monthly",
+                start_on=month_start,
+                next_run_on=month_start,
+            ),
+            models.RecurringExpense(
+                description="Bus pass",
+                amount=Decimal("45.00"),
+                owner_id=user.id,
+                category_id=categories[1].id,
+                frequency="monthly",
+                start_on=today + timedelta(days=28),
+                next_run_on=today + timedelta(days=28),
+            ),
+        ])
+
         db.commit()
         print("Seed data inserted for demo user")
 
@@ -0,0 +1,399 @@
+"""Owner sharding.
+
+With ``SHARD_URLS`` set, every user lives on one of several databases together
+with everything they own (every table with an ``owner_id``). Reference data
+(``fx_rates``) is written to all shards. Without ``SHARD_URLS`` every function
+here routes to ``db_engine`` and the directory is never read.
+
+* Routing: ``user_directory`` in the home database (``DATABASE_URL``) maps user
+  ids to shard numbers. Lookups are cached per process for
+  ``SHARD_DIRECTORY_TTL_SECONDS``. ``deps.get_db`` opens each request's session
+  on the caller's shard (read from the bearer token); background work uses
+  ``session_for(owner_id)``. Each shard has its own engine and pool.
+* Ids: user ids are allocated by the directory, so they are unique across
+  shards. Other tables keep a sequence per shard, which
+  ``python -m app.shards init`` makes step by ``MAX_SHARDS`` from the shard
+  number (PostgreSQL only), so a moved user's rows keep their ids. ``init``
+  also enters existing users into the directory.
+* Cross-user work: ``scatter(fn)`` runs ``fn(shard)`` on every shard at once
+  (``GET /users``); batch jobs walk the shards with ``shard_session``.
+* Rebalancing: ``python -m app.shards move USER_ID SHARD`` copies a user's rows
+  to another shard, switches the directory entry and deletes the originals;
+  ``python -m app.shards rebalance`` moves users from the fullest to the
+  emptiest shards until their counts differ by at most one. A moving user's
+  requests get 503, and synced writes from jobs wait on the lock the move holds
+  on the user's row, then fail rather than write to the old shard.
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import Base, create_db_engine, db_engine, get_session
+
+logger = logging.getLogger(__name__)
+
+# Sequences step by this much, so it is also the most shards ids can be kept unique for
+MAX_SHARDS = 16
+DIRECTORY_CACHE_SIZE = 100_000
+COPY_BATCH_ROWS = 5000
+REBALANCE_BATCH_USERS = 100
+
+SHARDED = bool(settings.shard_urls)
+engines: list[Engine] = [create_db_engine(url) for url in settings.shard_urls] if SHARDED else [db_engine]
+
+directory_table = models.UserDirectory.__table__
+users_table = models.User.__table__
+
+
+class ShardDirectory:
+    """Per-process cache of user id -> (shard, moving), read from the home database."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, tuple[int, bool, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, user_id: int) -> tuple[int, bool] | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0], entry[1]
+
+        with db_engine.connect() as conn:
+            row = conn.execute(
+                select(directory_table.c.shard, directory_table.c.moving)
+                .where(directory_table.c.user_id == user_id)
+            ).first()
+        if row is None:
+            return None
+        with self._lock:
+            self._entries[user_id] = (row.shard, row.moving, now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return row.shard, row.moving
+
+    def forget(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+directory = ShardDirectory(settings.shard_directory_ttl_seconds, DIRECTORY_CACHE_SIZE)
+
+
+def shard_of(user_id: int) -> int:
+    """Shard holding ``user_id``; unknown users map to shard 0, where lookups simply find nothing."""
+    if not SHARDED:
+        return 0
+    entry = directory.lookup(user_id)
+    return entry[0] if entry is not None else 0
+
+
+def session_for(user_id: int):
+    """``get_session()`` on the shard holding ``user_id``."""
+    return get_session(bind=engines[shard_of(user_id)])
+
+
+def shard_session(shard: int):
+    return get_session(bind=engines[shard])
+
+
+def token_subject(token: str) -> int | None:
+    try:
+        payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return int(subject) if subject is not None and str(subject).isdigit() else None
+
+
+def engine_for_token(token: str | None) -> Engine:
+    """Engine of the shard holding a bearer token's user; 503 while that user is being moved."""
+    if not SHARDED:
+        return db_engine
+    user_id = token_subject(token) if token else None
+    entry = directory.lookup(user_id) if user_id is not None else None
+    if entry is None:
+        return engines[0]  # no such user; authentication fails there
+    shard, moving = entry
+    if moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Account is being moved, retry shortly",
+            headers={"Retry-After": str(settings.shard_directory_ttl_seconds)},
+        )
+    return engines[shard]
+
+
+def engine_for_request(request: Request) -> Engine:
+    if not SHARDED:
+        return db_engine
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return engine_for_token(token if scheme.lower() == "bearer" else None)
+
+
+def scatter(fn) -> list:
+    """Run ``fn(shard)`` on every shard concurrently; results come back in shard order."""
+    if len(engines) == 1:
+        return [fn(0)]
+    with ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix="shard-scatter") as pool:
+        return list(pool.map(fn, range(len(engines))))
+
+
+def _least_populated(home: Session) -> int:
+    counts = dict(home.execute(
+        select(directory_table.c.shard, func.count()).group_by(directory_table.c.shard)
+    ).all())
+    return min(range(len(engines)), key=lambda shard: (counts.get(shard, 0), shard))
+
+
+def add_user(db: Session, user: models.User) -> models.User:
+    """Insert a new user, or fail with 400 if the email is taken.
+
+    Sharded, the directory allocates the user's id and assigns the least
+    populated shard; the returned user is detached from that shard's session.
+    """
+    email_taken = HTTPException(status_code=400, detail="Email already registered")
+    if not SHARDED:
+        if db.scalar(select(models.User.id).where(models.User.email == user.email)) is not None:
+            raise email_taken
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+
+    try:
+        with get_session() as home:
+            entry = models.UserDirectory(email=user.email, shard=_least_populated(home))
+            home.add(entry)
+            home.flush()
+            user.id, shard = entry.user_id, entry.shard
+    except IntegrityError:
+        raise email_taken
+    try:
+        with shard_session(shard) as shard_db:
+            shard_db.add(user)
+            shard_db.flush()
+            shard_db.refresh(user)
+            shard_db.expunge(user)
+    except Exception:
+        with get_session() as home:
+            home.execute(delete(directory_table).where(directory_table.c.user_id == user.id))
+        raise
+    return user
+
+
+def find_user_by_email(db: Session, email: str) -> models.User | None:
+    """The user registered with ``email``, from whichever shard holds them."""
+    if not SHARDED:
+        return db.scalars(select(models.User).where(models.User.email == email)).first()
+    with db_engine.connect() as conn:
+        user_id = conn.scalar(select(directory_table.c.user_id).where(directory_table.c.email == email))
+    if user_id is None:
+        return None
+    with session_for(user_id) as shard_db:
+        user = shard_db.get(models.User, user_id)
+        if user is not None:
+            shard_db.expunge(user)
+    return user
+
+
+def owned_tables() -> list:
+    """``users`` and every table with an ``owner_id``, parents before children."""
+    return [table for table in Base.metadata.sorted_tables if table.name == "users" or "owner_id" in table.c]
+
+
+def _owner_column(table):
+    return table.c.id if table.name == "users" else table.c.owner_id
+
+
+def _stride_sequences(engine: Engine, shard: int) -> None:
+    if engine.dialect.name != "postgresql":
+        logger.warning("Shard %d (%s): sequences cannot step; moved rows may collide", shard, engine.dialect.name)
+        return
+    with engine.begin() as conn:
+        for table in owned_tables():
+            if table.name == "users":
+                continue  # ids come from the directory
+            sequence = conn.scalar(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table.name})
+            if sequence is None:
+                continue
+            top = conn.scalar(select(func.coalesce(func.max(table.c.id), 0)))
+            # Smallest id above the current ones that belongs to this shard
+            start = top + 1 + (shard - top - 1) % MAX_SHARDS
+            conn.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {MAX_SHARDS} RESTART WITH {start}"))
+
+
+def init() -> int:
+    """Enter existing users into the directory and set up per-shard sequences. Returns users added."""
+    if len(engines) > MAX_SHARDS:
+        raise SystemExit(f"At most {MAX_SHARDS} shards are supported")
+    added = 0
+    with get_session() as home:
+        known = set(home.scalars(select(directory_table.c.user_id)))
+        for shard in range(len(engines)):
+            with shard_session(shard) as db:
+                rows = db.execute(select(users_table.c.id, users_table.c.email)).all()
+            new = [{"user_id": id_, "email": email, "shard": shard} for id_, email in rows if id_ not in known]
+            if new:
+                home.execute(insert(directory_table), new)
+                added += len(new)
+        if db_engine.dialect.name == "postgresql":
+            home.execute(text(
+                "SELECT setval(pg_get_serial_sequence('user_directory', 'user_id'), "
+                "(SELECT coalesce(max(user_id), 0) + 1 FROM user_directory), false)"
+            ))
+    for shard, engine in enumerate(engines):
+        _stride_sequences(engine, shard)
+    return added
+
+
+def _set_moving(user_ids: list[int], moving: bool) -> None:
+    with get_session() as home:
+        home.execute(update(directory_table).where(directory_table.c.user_id.in_(user_ids)).values(moving=moving))
+    for user_id in user_ids:
+        directory.forget(user_id)
+
+
+def _copy_owner(source: Session, target: Session, user_id: int) -> int:
+    copied = 0
+    for table in owned_tables():
+        result = source.connection().execution_options(yield_per=COPY_BATCH_ROWS).execute(
+            select(table).where(_owner_column(table) == user_id)
+        )
+        for batch in result.mappings().partitions():
+            target.connection().execute(insert(table), [dict(row) for row in batch])
+            copied += len(batch)
+    return copied
+
+
+def _delete_owner(db: Session, user_id: int) -> None:
+    for table in reversed(owned_tables()):
+        db.execute(delete(table).where(_owner_column(table) == user_id))
+
+
+def move_user(user_id: int, target: int, wait: bool = True) -> int:
+    """Move a user and all their rows to shard ``target``. Returns the number of rows copied.
+
+    ``wait=False`` skips marking the user as moving and waiting out other
+    processes' cached routes; the caller has done both.
+    """
+    with db_engine.connect() as conn:
+        source = conn.scalar(select(directory_table.c.shard).where(directory_table.c.user_id == user_id))
+    if source is None:
+        raise ValueError(f"User {user_id} is not in the directory")
+    if source == target:
+        return 0
+    if wait:
+        _set_moving([user_id], True)
+        time.sleep(settings.shard_directory_ttl_seconds)
+
+    switched = False
+    try:
+        with shard_session(source) as source_db:
+            # Synced writes update the user's row first, so they queue behind this lock
+            source_db.execute(select(users_table.c.id).where(users_table.c.id == user_id).with_for_update())
+            with shard_session(target) as target_db:
+                copied = _copy_owner(source_db, target_db, user_id)
+            with get_session() as home:
+                home.execute(
+                    update(directory_table)
+                    .where(directory_table.c.user_id == user_id)
+                    .values(shard=target, moving=False)
+                )
+            switched = True
+            _delete_owner(source_db, user_id)
+    except Exception:
+        if not switched:
+            with shard_session(target) as target_db:
+                _delete_owner(target_db, user_id)
+            _set_moving([user_id], False)
+        raise
+    finally:
+        directory.forget(user_id)
+    logger.info("Moved user %d from shard %d to shard %d (%d rows)", user_id, source, target, copied)
+    return copied
+
+
+def plan_rebalance() -> list[tuple[int, int, int]]:
+    """``(user_id, source, target)`` moves that even out the number of users per shard."""
+    with get_session() as home:
+        counts = {shard: 0 for shard in range(len(engines))}
+        counts.update(home.execute(
+            select(directory_table.c.shard, func.count()).group_by(directory_table.c.shard)
+        ).all())
+        candidates = {}
+        moves = []
+        while True:
+            fullest = max(counts, key=lambda shard: counts[shard])
+            emptiest = min(counts, key=lambda shard: counts[shard])
+            if counts[fullest] - counts[emptiest] <= 1:
+                return moves
+            if fullest not in candidates:
+                # Newest users first: they tend to have the least data to copy
+                candidates[fullest] = iter(home.scalars(
+                    select(directory_table.c.user_id)
+                    .where(directory_table.c.shard == fullest)
+                    .order_by(directory_table.c.user_id.desc())
+                ).all())
+            moves.append((next(candidates[fullest]), fullest, emptiest))
+            counts[fullest] -= 1
+            counts[emptiest] += 1
+
+
+def rebalance(moves: list[tuple[int, int, int]]) -> int:
+    """Carry out planned moves, a batch of users at a time. Returns the number of rows copied."""
+    copied = 0
+    for start in range(0, len(moves), REBALANCE_BATCH_USERS):
+        batch = moves[start:start + REBALANCE_BATCH_USERS]
+        _set_moving([user_id for user_id, _, _ in batch], True)
+        time.sleep(settings.shard_directory_ttl_seconds)
+        for user_id, _, target in batch:
+            copied += move_user(user_id, target, wait=False)
+    return copied
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m app.shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init", help="Enter existing users into the directory and set up sequences")
+    move = commands.add_parser("move", help="Move one user to another shard")
+    move.add_argument("user_id", type=int)
+    move.add_argument("shard", type=int)
+    balance = commands.add_parser("rebalance", help="Even out the number of users per shard")
+    balance.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not SHARDED:
+        raise SystemExit("SHARD_URLS is not set")
+    if args.command == "init":
+        print(f"Added {init()} users to the directory")
+    elif args.command == "move":
+        if not 0 <= args.shard < len(engines):
+            raise SystemExit(f"No shard {args.shard}")
+        print(f"Copied {move_user(args.user_id, args.shard)} rows")
+    else:
+        moves = plan_rebalance()
+        for user_id, source, target in moves:
+            print(f"user {user_id}: shard {source} -> {target}")
+        if not args.dry_run:
+            print(f"Copied {rebalance(moves)} rows")
+
+
+if __name__ == "__main__":
+    main()
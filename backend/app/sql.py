@@ -0,0 +1,84 @@
+"""Portable SQL expressions.
+
+Report queries bucket timestamps by calendar day. ``func.date`` means different
+things per backend (a DATE on PostgreSQL, a ``'YYYY-MM-DD'`` string on SQLite),
+so bucketing goes through ``day_of`` (UTC day), ``local_day`` (day in a
+user's time zone) and ``local_month`` (first day of the local month), which
+compile to each dialect's form and are typed as ``Date`` so results come back
+as ``datetime.date`` everywhere.
+"""
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class day_of(FunctionElement):
+    """Calendar day of a timestamp expression."""
+
+    type = Date()
+    name = "day_of"
+    inherit_cache = True
+
+
+@compiles(day_of)
+def _day_of(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS DATE)"
+
+
+@compiles(day_of, "sqlite")
+def _day_of_sqlite(element, compiler, **kw):
+    # Matches how SQLAlchemy stores Date columns on SQLite, so joins on fx_rates.day still work
+    return f"date({compiler.process(element.clauses, **kw)})"
+
+
+class local_day(FunctionElement):
+    """Calendar day of a UTC timestamp expression in an IANA time zone expression."""
+
+    type = Date()
+    name = "local_day"
+    inherit_cache = True
+
+
+@compiles(local_day)
+def _local_day(element, compiler, **kw):
+    timestamp, zone = list(element.clauses)
+    return f"CAST(timezone({compiler.process(zone, **kw)}, {compiler.process(timestamp, **kw)}) AS DATE)"
+
+
+@compiles(local_day, "sqlite")
+def _local_day_sqlite(element, compiler, **kw):
+    # SQLite has no time zone database; the function is registered on connect (database.py)
+    return f"local_date({compiler.process(element.clauses, **kw)})"
+
+
+class local_month(FunctionElement):
+    """First day of the calendar month of a UTC timestamp expression in an IANA time zone expression."""
+
+    type = Date()
+    name = "local_month"
+    inherit_cache = True
+
+
+@compiles(local_month)
+def _local_month(element, compiler, **kw):
+    timestamp, zone = list(element.clauses)
+    local = f"timezone({compiler.process(zone, **kw)}, {compiler.process(timestamp, **kw)})"
+    return f"CAST(date_trunc('month', {local}) AS DATE)"
+
+
+@compiles(local_month, "sqlite")
+def _local_month_sqlite(element, compiler, **kw):
+    return f"date(local_date({compiler.process(element.clauses, **kw)}), 'start of month')"
+
+
+def sqlite_local_date(value: str | None, zone: str | None) -> str | None:
+    """``local_date(timestamp, zone)`` for SQLite connections."""
+    if value is None or zone is None:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(ZoneInfo(zone)).date().isoformat()
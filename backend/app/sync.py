@@ -0,0 +1,161 @@
+"""Change tracking for delta sync.
+
+Every insert, update or delete of a synced row (expenses, categories, budgets)
+takes the next value of its owner's ``users.sync_seq`` counter. Deletes leave a
+``Tombstone`` behind. ``GET /changes?since=<cursor>`` then only has to read rows
+whose ``sync_seq`` is above the cursor, using the ``(owner_id, sync_seq)`` indexes.
+
+Sequence values are allocated with a single ``UPDATE ... RETURNING`` per owner
+and flush. The row lock it takes on ``users`` orders concurrent writers of the
+same user, so a reader can never see seq N+1 committed before seq N.
+
+On PostgreSQL a committing session also sends ``NOTIFY expense_changes`` with
+the users and expense timestamps it touched, so processes other than the
+writer (see ``app/notifications.py``) learn about the change; the notification
+is delivered only if the transaction commits.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from . import models
+
+SYNCED_MODELS = (models.Expense, models.Category, models.Budget)
+
+users_table = models.User.__table__
+
+CHANNEL = "expense_changes"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD = 7900
+
+
+def reserve_seqs(session: Session, owner_id: int, count: int) -> int:
+    """Reserve ``count`` sequence values for an owner and return the first one."""
+    last = session.execute(
+        update(users_table)
+        .where(users_table.c.id == owner_id)
+        .values(sync_seq=users_table.c.sync_seq + count)
+        .returning(users_table.c.sync_seq)
+    ).scalar_one()
+    return last - count + 1
+
+
+def expense_times(expense: models.Expense) -> set:
+    """Timestamps an expense write affects: its current ``spent_at`` and, if moved, the old one."""
+    history = inspect(expense).attrs.spent_at.history
+    values = [expense.spent_at, *history.deleted]
+    return {value for value in values if value is not None}
+
+
+def record_change(session: Session, owner_id: int, times=()) -> None:
+    """Remember which users (and expense timestamps) a transaction touched, for after-commit hooks."""
+    session.info.setdefault("changed_owners", {}).setdefault(owner_id, set()).update(times)
+
+
+_commit_listeners = []
+
+
+def on_commit(listener):
+    """Register ``listener(changes)`` to run after each commit that touched synced rows.
+
+    ``changes`` maps owner id to the set of expense timestamps the transaction affected;
+    listeners turn them into days in the user's time zone if they need to.
+    """
+    _commit_listeners.append(listener)
+    return listener
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def assign_sync_seqs(session: Session, flush_context, instances) -> None:
+    deleted_users = {obj.id for obj in session.deleted if isinstance(obj, models.User)}
+    pending: dict[int, list] = defaultdict(list)
+
+    for obj in session.new:
+        if isinstance(obj, SYNCED_MODELS):
+            pending[obj.owner_id].append(obj)
+
+    for obj in session.dirty:
+        if isinstance(obj, SYNCED_MODELS) and session.is_modified(obj, include_collections=False):
+            pending[obj.owner_id].append(obj)
+
+    for obj in list(session.deleted):
+        if not isinstance(obj, SYNCED_MODELS) or obj.owner_id in deleted_users:
+            continue
+        if isinstance(obj, models.Category):
+            # The flush will null out category_id on these; they must be re-sent too
+            for expense in obj.expenses:
+                if expense not in session.deleted:
+                    expense.category_id = None
+                    pending[expense.owner_id].append(expense)
+        if isinstance(obj, models.Expense):
+            record_change(session, obj.owner_id, expense_times(obj))
+        tombstone = models.Tombstone(entity=obj.__tablename__, entity_id=obj.id, owner_id=obj.owner_id)
+        session.add(tombstone)
+        pending[obj.owner_id].append(tombstone)
+
+    now = datetime.utcnow()
+    for owner_id, objs in pending.items():
+        if owner_id is None or owner_id in deleted_users:
+            continue
+        # Preserve first-seen order while dropping duplicates
+        objs = list(dict.fromkeys(objs))
+        first = reserve_seqs(session, owner_id, len(objs))
+        for offset, obj in enumerate(objs):
+            obj.sync_seq = first + offset
+            record_change(session, owner_id, expense_times(obj) if isinstance(obj, models.Expense) else ())
+            if not isinstance(obj, models.Tombstone):
+                obj.updated_at = now
+
+
+def encode_changes(changes: dict[int, set[datetime]]) -> list[str]:
+    """NOTIFY payloads for ``changes``, split by user to stay under ``MAX_PAYLOAD``."""
+    payloads, current = [], {}
+    for user_id, times in changes.items():
+        values = sorted(value.isoformat() for value in times)
+        if len(values) > 2 and len(json.dumps(values)) > MAX_PAYLOAD // 4:
+            # Bulk writes: the first and last day are refreshed, the dashboard always is
+            values = [values[0], values[-1]]
+        candidate = {**current, str(user_id): values}
+        if current and len(json.dumps(candidate)) > MAX_PAYLOAD:
+            payloads.append(json.dumps(current))
+            candidate = {str(user_id): values}
+        current = candidate
+    if current:
+        payloads.append(json.dumps(current))
+    return payloads
+
+
+def decode_changes(payload: str) -> dict[int, set[datetime]]:
+    return {
+        int(user_id): {datetime.fromisoformat(value) for value in values}
+        for user_id, values in json.loads(payload).items()
+    }
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def notify_database(session: Session) -> None:
+    session.flush()
+    changes = session.info.get("changed_owners")
+    if not changes:
+        return
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        for payload in encode_changes(changes):
+            connection.execute(select(func.pg_notify(CHANNEL, payload)))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def publish_changes(session: Session) -> None:
+    changes = session.info.pop("changed_owners", None)
+    if changes:
+        for listener in _commit_listeners:
+            listener(changes)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def discard_changes(session: Session, previous_transaction) -> None:
+    session.info.pop("changed_owners", None)
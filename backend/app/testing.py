@@ -0,0 +1,322 @@
+"""Database provisioning for integration tests and benchmarks.
+
+Migrating a fresh database runs every Alembic revision, which takes far longer
+than the tests themselves. Instead the schema is migrated once into a template
+database and every test worker gets a copy of it:
+
+* ``template_database(url)`` migrates ``<db>_template_<head revision>`` next to
+  ``url``, unless it exists already; a new revision gives a new template. It is
+  built under a temporary name and renamed when complete, behind a lock
+  (``pg_advisory_lock`` on PostgreSQL, a lock file on SQLite) so workers
+  starting together build it once.
+* ``clone_database(url, name)`` replaces ``<db>_test_<name>`` with a copy of the
+  template: ``CREATE DATABASE ... TEMPLATE`` on PostgreSQL (a file-level copy,
+  no statements are replayed), a file copy on SQLite.
+* Within a worker, each test runs in a transaction on one connection that is
+  rolled back at the end; sessions, the API's included, join it with
+  savepoints, so their commits stay visible to the test and nothing leaks into
+  the next one.
+
+As a pytest plugin (``pytest -p app.testing``, which ``pytest.ini`` adds; add
+``-n auto`` with pytest-xdist) it points ``DATABASE_URL`` at the worker's clone
+of ``TEST_DATABASE_URL`` (default: ``DATABASE_URL``) before the app is imported
+and provides these fixtures:
+
+* ``database_url``: the worker's migrated clone (session scope).
+* ``db``: a rollback-only session.
+* ``client``: a ``TestClient`` whose request sessions share ``db``'s transaction.
+* ``auth_headers``: bearer headers of a new user signed up through ``client``.
+
+Code that opens its own sessions (background jobs, ``GET /users``, the event
+stream) does not see the rolled back transaction; tests of it must commit
+through ``database_url`` and clean up. Sharding is off under the plugin.
+
+For benchmarks and manual runs: ``python -m app.testing template`` builds the
+template for ``DATABASE_URL``, ``python -m app.testing clone NAME`` prints the
+URL of a fresh clone (``DATABASE_URL=$(python -m app.testing clone bench)``) and
+``python -m app.testing drop`` removes every template and clone.
+"""
+import argparse
+import fcntl
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import NullPool
+
+# pg_advisory_lock key serializing template builds and clones on a server
+LOCK_KEY = 0x6578_7465_7374
+TEMPLATE_SUFFIX = "template"
+CLONE_SUFFIX = "test"
+
+
+def _is_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite"
+
+
+def _render(url: URL) -> str:
+    return url.render_as_string(hide_password=False)
+
+
+def _derive(url: URL, suffix: str) -> URL:
+    """``url`` with ``_<suffix>`` appended to its database name (or SQLite file stem)."""
+    if _is_sqlite(url):
+        path = Path(url.database)
+        return url.set(database=str(path.with_name(f"{path.stem}_{suffix}{path.suffix}")))
+    return url.set(database=f"{url.database}_{suffix}")
+
+
+def _head() -> str:
+    from alembic.script import ScriptDirectory
+
+    from .migrations import alembic_config
+
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def _migrate(url: URL) -> None:
+    from alembic import command
+
+    from .migrations import alembic_config
+
+    command.upgrade(alembic_config(url=_render(url)), "head")
+
+
+def _remove_sqlite(path: str) -> None:
+    for name in (path, f"{path}-wal", f"{path}-shm"):
+        Path(name).unlink(missing_ok=True)
+
+
+@contextmanager
+def _sqlite_lock(path: str):
+    with open(f"{path}.lock", "w") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _server(url: URL):
+    """Autocommit connection to the server's maintenance database, holding the provisioning lock."""
+    engine = create_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT", poolclass=NullPool)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+            try:
+                yield conn
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+    finally:
+        engine.dispose()
+
+
+def _quote(conn, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.scalar(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": name}) is not None
+
+
+def template_database(url: str) -> str:
+    """Migrate the template database for ``url`` unless it is at the head revision already; return its URL."""
+    base = make_url(url)
+    template = _derive(base, f"{TEMPLATE_SUFFIX}_{_head()}")
+
+    if _is_sqlite(base):
+        with _sqlite_lock(template.database):
+            if not Path(template.database).exists():
+                building = template.set(database=f"{template.database}.building")
+                _remove_sqlite(building.database)
+                _migrate(building)
+                os.replace(building.database, template.database)
+        return _render(template)
+
+    with _server(base) as conn:
+        if not _exists(conn, template.database):
+            building = f"{template.database}_building"
+            conn.execute(text(f"DROP DATABASE IF EXISTS {_quote(conn, building)}"))
+            conn.execute(text(f"CREATE DATABASE {_quote(conn, building)}"))
+            _migrate(base.set(database=building))
+            conn.execute(text(f"ALTER DATABASE {_quote(conn, building)} RENAME TO {_quote(conn, template.database)}"))
+            conn.execute(text(f"ALTER DATABASE {_quote(conn, template.database)} IS_TEMPLATE true"))
+    return _render(template)
+
+
+def clone_database(url: str, name: str) -> str:
+    """Replace the ``name`` clone of ``url``'s template with a fresh copy; return its URL."""
+    template = make_url(template_database(url))
+    clone = _derive(make_url(url), f"{CLONE_SUFFIX}_{name}")
+
+    if _is_sqlite(clone):
+        _remove_sqlite(clone.database)
+        with _sqlite_lock(template.database):
+            shutil.copyfile(template.database, clone.database)
+        return _render(clone)
+
+    with _server(clone) as conn:
+        # FORCE ends sessions a crashed earlier run may have left on the clone
+        conn.execute(text(f"DROP DATABASE IF EXISTS {_quote(conn, clone.database)} WITH (FORCE)"))
+        conn.execute(text(
+            f"CREATE DATABASE {_quote(conn, clone.database)} TEMPLATE {_quote(conn, template.database)}"
+        ))
+    return _render(clone)
+
+
+def drop_databases(url: str) -> list[str]:
+    """Drop every template and clone of ``url``; return their names."""
+    base = make_url(url)
+    dropped = []
+
+    if _is_sqlite(base):
+        path = Path(base.database)
+        for suffix in (TEMPLATE_SUFFIX, CLONE_SUFFIX):
+            for found in path.parent.glob(f"{path.stem}_{suffix}_*{path.suffix}"):
+                _remove_sqlite(str(found))
+                Path(f"{found}.lock").unlink(missing_ok=True)
+                dropped.append(str(found))
+        return dropped
+
+    with _server(base) as conn:
+        names = conn.scalars(
+            text("SELECT datname FROM pg_database WHERE datname LIKE :template OR datname LIKE :clone"),
+            {
+                "template": f"{base.database}\\_{TEMPLATE_SUFFIX}\\_%",
+                "clone": f"{base.database}\\_{CLONE_SUFFIX}\\_%",
+            },
+        ).all()
+        for name in names:
+            conn.execute(text(f"ALTER DATABASE {_quote(conn, name)} IS_TEMPLATE false"))
+            conn.execute(text(f"DROP DATABASE {_quote(conn, name)} WITH (FORCE)"))
+            dropped.append(name)
+    return dropped
+
+
+def rollback_only(engine):
+    """SQLite: let ``engine``'s transactions hold savepoints (pysqlite otherwise begins and commits on its own)."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def manual_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    engine.dispose()
+
+
+# pytest plugin ------------------------------------------------------------------
+
+try:
+    import pytest
+except ImportError:  # only needed when loaded as a plugin
+    pytest = None
+
+
+def _worker() -> str:
+    return os.environ.get("PYTEST_XDIST_WORKER", "main")
+
+
+def pytest_load_initial_conftests(early_config, parser, args):
+    # Runs before conftest modules import the app, so its settings and engines see the clone
+    base = os.environ.get("TEST_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    if not base:
+        raise pytest.UsageError("Set TEST_DATABASE_URL to a database server the tests may create databases on")
+    os.environ["TEST_DATABASE_URL"] = base
+    os.environ["DATABASE_URL"] = _render(_derive(make_url(base), f"{CLONE_SUFFIX}_{_worker()}"))
+    os.environ["SHARD_URLS"] = "[]"
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+if pytest is not None:
+
+    @pytest.fixture(scope="session")
+    def database_url() -> str:
+        url = clone_database(os.environ["TEST_DATABASE_URL"], _worker())
+        assert url == os.environ["DATABASE_URL"]
+        from .database import db_engine
+
+        rollback_only(db_engine)
+        return url
+
+    @pytest.fixture
+    def db_connection(database_url):
+        from .database import db_engine
+
+        with db_engine.connect() as conn:
+            transaction = conn.begin()
+            try:
+                yield conn
+            finally:
+                transaction.rollback()
+
+    def _session(connection):
+        from .database import SessionLocal
+
+        # commit() releases a savepoint; the test's transaction stays open around it
+        return SessionLocal(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+
+    @pytest.fixture
+    def db(db_connection):
+        session = _session(db_connection)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    @pytest.fixture
+    def client(db_connection):
+        from fastapi.testclient import TestClient
+
+        from .deps import get_db, serve
+        from .main import app
+
+        def get_test_db():
+            yield from serve(_session(db_connection))
+
+        app.dependency_overrides[get_db] = get_test_db
+        try:
+            with TestClient(app) as test_client:
+                yield test_client
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+
+    @pytest.fixture
+    def auth_headers(client) -> dict:
+        email = f"test-{uuid.uuid4().hex}@example.com"
+        client.post("/api/auth/signup", json={"name": "Test", "email": email, "password": "password"})
+        response = client.post("/api/auth/login", data={"username": email, "password": "password"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.testing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("template", help="Migrate the template database for DATABASE_URL")
+    clone_parser = commands.add_parser("clone", help="Create a fresh copy of the template and print its URL")
+    clone_parser.add_argument("name")
+    commands.add_parser("drop", help="Drop every template and clone of DATABASE_URL")
+    args = parser.parse_args()
+
+    from .config import settings
+
+    if args.command == "template":
+        print(template_database(settings.database_url))
+    elif args.command == "clone":
+        print(clone_database(settings.database_url, args.name))
+    else:
+        for name in drop_databases(settings.database_url):
+            print(f"Dropped {name}")
+
+
+if __name__ == "__main__":
+    main()
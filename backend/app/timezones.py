@@ -0,0 +1,60 @@
+"""Per-user time zones.
+
+Timestamps are stored in UTC; each user has an IANA ``timezone`` that decides
+which calendar day and month an expense belongs to. Reports never apply a time
+zone function to filter rows: a local date range is turned into a UTC
+half-open range here, which the (owner_id, spent_at) index serves directly, and
+only the rows inside it are bucketed into local days (``sql.local_day``).
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from . import models
+
+
+@lru_cache(maxsize=1024)
+def zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def is_valid(name: str) -> bool:
+    try:
+        zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def user_zone(user: models.User) -> ZoneInfo:
+    return zone(user.timezone)
+
+
+def local_today(tz: ZoneInfo) -> date:
+    return datetime.now(tz).date()
+
+
+def utc_start_of(day: date, tz: ZoneInfo) -> datetime:
+    """UTC instant (naive, like stored timestamps) at which ``day`` begins in ``tz``."""
+    return datetime.combine(day, time.min, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_range(start: date | None, end: date | None, tz: ZoneInfo) -> tuple[datetime | None, datetime | None]:
+    """Half-open UTC range ``[lower, upper)`` covering local days ``start``..``end`` inclusive."""
+    lower = utc_start_of(start, tz) if start is not None else None
+    upper = utc_start_of(end + timedelta(days=1), tz) if end is not None else None
+    return lower, upper
+
+
+def naive_utc(value: datetime) -> datetime:
+    """``value`` as a naive UTC timestamp; PostgreSQL returns ``timestamptz`` values aware."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_date(value: datetime, tz: ZoneInfo) -> date:
+    """Local calendar day of a stored timestamp (naive timestamps are UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(tz).date()
@@ -0,0 +1,197 @@
+"""SQL tracing, slow-query log and N+1 detection.
+
+Cursor events on ``db_engine`` and the shard engines time every statement. Inside a request
+(``SqlTraceMiddleware``) statements are collected on a ``RequestTrace`` held in
+a context variable, which the threadpool running sync endpoints inherits.
+
+* Statements slower than ``SQL_SLOW_QUERY_MS`` are logged wherever they run
+  (requests and jobs alike). For SELECTs the plan is captured off the request
+  path by a single background thread: ``EXPLAIN (ANALYZE, BUFFERS)`` on
+  PostgreSQL, ``EXPLAIN QUERY PLAN`` on SQLite. Locking reads (``FOR UPDATE``,
+  ``FOR SHARE``) only get a plain ``EXPLAIN``: ANALYZE would run them again and
+  take the same row locks as the job that issued them. Each statement is
+  explained at most once per ``EXPLAIN_INTERVAL`` so a hot slow query does not
+  add load.
+* At the end of a request, a statement executed ``SQL_N_PLUS_ONE_THRESHOLD``
+  times or more is logged as a likely N+1 pattern.
+* With ``SQL_TRACE_HEADER`` enabled, a request sent with ``X-Debug-SQL: 1`` gets
+  its statement count and time in ``X-SQL-Count``/``X-SQL-Time-Ms`` and the full
+  trace (statement, parameters, milliseconds) as JSON in ``X-SQL-Trace``.
+
+Parameter values never reach logs or headers, only their names and types: they
+include password hashes, tokens and users' data.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .database import db_engine
+from .shards import engines
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_INTERVAL = 600  # seconds
+MAX_PENDING_EXPLAINS = 8
+MAX_TRACED_STATEMENTS = 500
+MAX_PARAMS_LENGTH = 200
+
+LOCKING_READ = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE)
+
+
+@dataclass
+class TracedStatement:
+    statement: str
+    parameters: str
+    duration_ms: float
+
+
+@dataclass
+class RequestTrace:
+    statements: list[TracedStatement] = field(default_factory=list)
+    count: int = 0
+    total_ms: float = 0.0
+
+    def add(self, statement: str, parameters, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        if len(self.statements) < MAX_TRACED_STATEMENTS:
+            self.statements.append(TracedStatement(statement, _format_params(parameters), duration_ms))
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        counts = Counter(traced.statement for traced in self.statements)
+        return [(statement, count) for statement, count in counts.most_common() if count >= threshold]
+
+
+current_trace: ContextVar[RequestTrace | None] = ContextVar("current_trace", default=None)
+
+
+def _redact(parameters):
+    """``parameters`` with every value replaced by its type name."""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact(value) for value in parameters]
+    return type(parameters).__name__
+
+
+def _format_params(parameters) -> str:
+    text = repr(_redact(parameters))
+    return text if len(text) <= MAX_PARAMS_LENGTH else text[:MAX_PARAMS_LENGTH] + "..."
+
+
+class ExplainCapture:
+    """Runs EXPLAIN for slow SELECTs on a background thread, rate limited per statement."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sql-explain")
+        self._last_explained: dict[str, float] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, engine: Engine, statement: str, parameters) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._pending >= MAX_PENDING_EXPLAINS:
+                return
+            if now - self._last_explained.get(statement, float("-inf")) < EXPLAIN_INTERVAL:
+                return
+            self._last_explained[statement] = now
+            self._pending += 1
+        self._executor.submit(self._explain, engine, statement, parameters)
+
+    def _explain(self, engine: Engine, statement: str, parameters) -> None:
+        try:
+            if engine.dialect.name != "postgresql":
+                prefix = "EXPLAIN QUERY PLAN "
+            elif LOCKING_READ.search(statement):
+                prefix = "EXPLAIN "
+            else:
+                prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+            with engine.connect().execution_options(sql_trace=False) as conn:
+                # ANALYZE executes the statement; it is a plain SELECT, and nothing is committed anyway
+                rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+                conn.rollback()
+            plan = "\n".join(" ".join(str(value) for value in row) for row in rows)
+            logger.warning("Plan for slow query:\n%s\n%s", statement, plan)
+        except Exception:
+            logger.exception("Failed to capture plan for slow query")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+explain_capture = ExplainCapture()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info["query_start"]) * 1000
+    if context is not None and not context.execution_options.get("sql_trace", True):
+        return
+
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(statement, parameters, duration_ms)
+
+    if duration_ms >= settings.sql_slow_query_ms:
+        logger.warning("Slow query (%.1f ms): %s %s", duration_ms, statement, _format_params(parameters))
+        if not executemany and statement.lstrip()[:6].upper() == "SELECT":
+            explain_capture.submit(conn.engine, statement, parameters)
+
+
+for _engine in {db_engine, *engines}:
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SqlTraceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        debug = settings.sql_trace_header and (b"x-debug-sql", b"1") in scope.get("headers", ())
+
+        async def send_with_trace(message):
+            if debug and message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers += [
+                    (b"x-sql-count", str(trace.count).encode()),
+                    (b"x-sql-time-ms", f"{trace.total_ms:.1f}".encode()),
+                    (b"x-sql-trace", json.dumps([
+                        [traced.statement, traced.parameters, round(traced.duration_ms, 2)]
+                        for traced in trace.statements
+                    ]).encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            current_trace.reset(token)
+            for statement, count in trace.repeated(settings.sql_n_plus_one_threshold):
+                logger.warning(
+                    "Possible N+1: %s %s ran %d times: %s", scope["method"], scope["path"], count, statement
+                )
+            logger.debug(
+                "%s %s: %d statements, %.1f ms in SQL", scope["method"], scope["path"], trace.count, trace.total_ms
+            )
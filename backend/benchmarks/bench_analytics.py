@@ -0,0 +1,52 @@
+"""Time /reports/stats computations on synthetic data.
+
+Usage:
+    python -m benchmarks.bench_analytics [n_expenses]
+
+Measures packing rows into arrays (paid once per cache miss) and computing the
+full stats payload from cached arrays (paid on every request).
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app.analytics import build_arrays, compute_stats
+
+
+def synthetic_rows(n: int):
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    categories = [None, 1, 2, 3, 4, 5, 6, 7]
+    return [
+        (
+            i,
+            Decimal(f"{rng.lognormvariate(2.5, 0.8):.2f}"),
+            start + timedelta(seconds=rng.randrange(5 * 365 * 86400)),
+            rng.choice(categories),
+        )
+        for i in range(n)
+    ]
+
+
+def best_of(fn, repeat: int = 20) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings) * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = synthetic_rows(n)
+    arrays = build_arrays(rows)
+    print(f"{n} expenses")
+    print(f"  build arrays : {best_of(lambda: build_arrays(rows), repeat=3):8.2f} ms (cache miss)")
+    print(f"  compute stats: {best_of(lambda: compute_stats(arrays)):8.2f} ms (cache hit)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare response encodings for an expense list.
+
+Usage:
+    python -m benchmarks.bench_formats [n_expenses]
+
+Encodes the same rows the way ``list_expenses`` does for each ``Accept`` type
+and reports encode time and payload size, raw and gzipped. The JSON figure
+follows FastAPI's path (validate, dump, ``jsonable_encoder``, ``json.dumps``).
+"""
+import gzip
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from app import formats, models, schemas
+
+
+def synthetic_expenses(n: int):
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    categories = [None, 1, 2, 3, 4, 5, 6, 7]
+    words = ["Coffee", "Groceries", "Bus fare", "Lunch with team", "Books", "Pharmacy", "Cinema"]
+    return [
+        models.Expense(
+            id=i,
+            owner_id=1,
+            description=rng.choice(words),
+            amount=Decimal(f"{rng.lognormvariate(2.5, 0.8):.2f}"),
+            currency="USD",
+            spent_at=start + timedelta(seconds=rng.randrange(5 * 365 * 86400), microseconds=rng.randrange(10**6)),
+            category_id=rng.choice(categories),
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def encode_json(expenses) -> bytes:
+    adapter = formats._adapter(list[schemas.Expense])
+    content = jsonable_encoder(adapter.dump_python(adapter.validate_python(expenses, from_attributes=True), mode="json"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def encode(media_type: str, expenses) -> bytes:
+    return formats.render(media_type, list[schemas.Expense], expenses, formats.expense_columns).body
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings) * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    expenses = synthetic_expenses(n)
+    encoders = {
+        "json": lambda: encode_json(expenses),
+        "msgpack": lambda: encode(formats.MSGPACK, expenses),
+        "columnar": lambda: encode(formats.COLUMNAR, expenses),
+    }
+    print(f"{n} expenses")
+    print(f"  {'format':<9} {'encode ms':>10} {'bytes':>10} {'gzip bytes':>11}")
+    for name, fn in encoders.items():
+        body = fn()
+        print(f"  {name:<9} {best_of(fn):10.2f} {len(body):10d} {len(gzip.compress(body)):11d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure how long a request holds its pooled connection.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_sessions [--expenses N] [--requests R]
+
+Signs up a throwaway user with N synthetic expenses through the app, then
+fetches ``GET /api/expenses/`` R times and reports the median request time and
+the median time a connection was checked out of the pool during it. The gap
+is the work (validation, serialization, compression) done after the session
+was released; connection hold time is what bounds throughput at a given pool
+size.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import get_session  # noqa: E402
+from app.main import app  # noqa: E402
+from app.shards import engine_for_token, session_for, token_subject  # noqa: E402
+
+
+def seed(client: TestClient, n: int) -> dict:
+    email = f"bench-{uuid.uuid4().hex}@example.com"
+    client.post("/api/auth/signup", json={"name": "bench", "email": email, "password": "benchmark"})
+    token = client.post("/api/auth/login", data={"username": email, "password": "benchmark"}).json()["access_token"]
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with session_for(token_subject(token)) as db:
+        db.execute(insert(models.Expense), [
+            {
+                "description": "bench",
+                "amount": Decimal(f"{rng.lognormvariate(2.5, 0.8):.2f}"),
+                "spent_at": now - timedelta(seconds=rng.randrange(365 * 86400)),
+                "owner_id": token_subject(token),
+            }
+            for _ in range(n)
+        ])
+    return {"Authorization": f"Bearer {token}"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--expenses", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        headers = seed(client, args.expenses)
+        engine = engine_for_token(headers["Authorization"].split()[1])
+
+        held = []
+        checked_out = {}
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, record, proxy):
+            checked_out[id(record)] = time.perf_counter()
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, record):
+            started = checked_out.pop(id(record), None)
+            if started is not None:
+                held.append(time.perf_counter() - started)
+
+        durations = []
+        for _ in range(args.requests):
+            held_before = len(held)
+            t0 = time.perf_counter()
+            client.get("/api/expenses/", headers=headers)
+            durations.append(time.perf_counter() - t0)
+            # One request may check out more than once (authentication, then the handler)
+            held[held_before:] = [sum(held[held_before:])]
+
+        with get_session(bind=engine) as db:
+            db.delete(db.get(models.User, token_subject(headers["Authorization"].split()[1])))
+
+    print(f"{args.expenses} expenses, {args.requests} requests")
+    print(f"  request          {statistics.median(durations) * 1000:8.1f} ms")
+    print(f"  connection held  {statistics.median(held) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
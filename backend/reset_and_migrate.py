@@ -7,13 +7,18 @@ This script will:
 2. Drop the alembic_version table
 3. Run all migrations step by step from base to head
 
+Revisions run in this process through the Alembic API (app.migrations), so
+the models, settings and engine are loaded once rather than once per step.
+
 Usage:
     python reset_and_migrate.py
 """
-import subprocess
 import sys
+from alembic import command
+from alembic.script import ScriptDirectory
 from sqlalchemy import text, inspect
 from app.database import db_engine
+from app.migrations import alembic_config
 
 
 def print_step(step_num, message):
@@ -56,24 +61,9 @@ def get_migration_revisions():
     print_step(2, "Getting list of migrations")
     
     try:
-        result = subprocess.run(
-            ['alembic', 'history'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        # Parse the output to get revision IDs
-        revisions = []
-        for line in result.stdout.split('\n'):
-            if '->' in line:
-                # Extract revision ID (format: "rev_id (head) -> rev_id, message")
-                parts = line.split(',')[0].strip()
-                if '->' in parts:
-                    rev_id = parts.split('->')[1].strip().split()[0]
-                    revisions.append(rev_id)
-        
-        # Reverse to get chronological order (base to head)
+        script = ScriptDirectory.from_config(alembic_config())
+        # walk_revisions goes from head to base; reverse to get chronological order
+        revisions = [rev.revision for rev in script.walk_revisions()]
         revisions.reverse()
         
         print(f"✓ Found {len(revisions)} migration(s)")
@@ -81,7 +71,7 @@ def get_migration_revisions():
             print(f"  {i}. {rev}")
         
         return revisions
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"✗ Error getting migration history: {e}")
         return []
 
@@ -94,22 +84,15 @@ def run_migrations_step_by_step(revisions):
         print("No migrations to run")
         return False
     
+    config = alembic_config()
     for i, revision in enumerate(revisions, 1):
         print(f"\n--- Migration {i}/{len(revisions)}: {revision} ---")
         
         try:
-            result = subprocess.run(
-                ['alembic', 'upgrade', revision],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            print(result.stdout)
+            command.upgrade(config, revision)
             print(f"✓ Migration {revision} applied successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"✗ Error applying migration {revision}:")
-            print(e.stdout)
-            print(e.stderr)
+        except Exception as e:
+            print(f"✗ Error applying migration {revision}: {e}")
             return False
     
     return True
@@ -120,16 +103,10 @@ def verify_migrations():
     print_step(4, "Verifying migration status")
     
     try:
-        result = subprocess.run(
-            ['alembic', 'current'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(result.stdout)
+        command.current(alembic_config())
         print("✓ Migration verification complete")
         return True
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"✗ Error verifying migrations: {e}")
         return False
 
@@ -179,7 +156,7 @@ def main():
         else:
             # If no revisions found, just upgrade to head
             print("\nRunning 'alembic upgrade head' instead...")
-            subprocess.run(['alembic', 'upgrade', 'head'], check=True)
+            command.upgrade(alembic_config(), 'head')
         
         # Step 4: Verify migrations
         verify_migrations()
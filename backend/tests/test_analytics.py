@@ -0,0 +1,52 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app import analytics, models
+
+
+def test_array_cache_drops_loads_that_raced_with_a_commit(monkeypatch):
+    cache = analytics.ArrayCache(max_users=4)
+    user = SimpleNamespace(id=1, timezone="UTC", base_currency="USD", sync_seq=0)
+    loads = []
+
+    def load_arrays(db, user):
+        loads.append(user.id)
+        if len(loads) == 1:
+            cache.invalidate({user.id: set()})  # a write commits while the first load reads
+        return analytics.build_arrays([])
+
+    monkeypatch.setattr(analytics, "load_arrays", load_arrays)
+    cache.get(None, user)
+    cache.get(None, user)
+    cache.get(None, user)
+    assert loads == [1, 1]
+
+
+def test_array_cache_reloads_after_writes_from_other_workers(monkeypatch):
+    cache = analytics.ArrayCache(max_users=4)
+    loads = []
+
+    def load_arrays(db, user):
+        loads.append(user.sync_seq)
+        return analytics.build_arrays([])
+
+    monkeypatch.setattr(analytics, "load_arrays", load_arrays)
+    user = SimpleNamespace(id=1, timezone="UTC", base_currency="USD", sync_seq=5)
+    cache.get(None, user)
+    cache.get(None, user)
+    # Committed elsewhere: no invalidate() here, only a newer sync_seq on the user's row
+    cache.get(None, SimpleNamespace(id=1, timezone="UTC", base_currency="USD", sync_seq=6))
+    assert loads == [5, 6]
+
+
+def test_stats_refuse_expenses_without_a_rate(client, db, auth_headers):
+    owner_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    db.add(models.Expense(
+        owner_id=owner_id, description="Taxi", amount=Decimal("9"), currency="EUR", spent_at=datetime(2024, 3, 11, 8),
+    ))
+    db.commit()
+
+    response = client.get("/api/reports/stats", headers=auth_headers)
+    assert response.status_code == 409
+    assert "no exchange rate" in response.json()["detail"]
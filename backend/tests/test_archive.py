@@ -0,0 +1,68 @@
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from app import archive
+
+
+def _add(client, headers, description, amount, spent_at):
+    response = client.post(
+        "/api/expenses/",
+        json={"description": description, "amount": amount, "spent_at": spent_at},
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_ranges_reaching_archived_months(client, db, auth_headers):
+    old = _add(client, auth_headers, "Old", "12.50", "2024-01-15T10:00:00Z")
+    _add(client, auth_headers, "New", "7.25", "2024-03-02T09:30:00Z")
+    assert archive.archive_owner(db, old["owner_id"], date(2024, 2, 1)) == 1
+    db.commit()
+
+    params = {"start_date": "2024-01-01", "end_date": "2024-03-31"}
+    response = client.get("/api/expenses/", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [e["description"] for e in response.json()] == ["New", "Old"]
+
+    response = client.get("/api/expenses/daily", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    totals = {item["day"]: float(item["total"]) for item in response.json()}
+    assert totals == {"2024-01-15": 12.5, "2024-03-02": 7.25}
+
+    response = client.get("/api/expenses/summary", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["count"] == 2
+
+
+def test_archived_expenses_stay_in_the_feed_and_are_read_only(client, db, auth_headers):
+    old = _add(client, auth_headers, "Old", "12.50", "2024-01-15T10:00:00Z")
+    cursor = client.get("/api/changes/", headers=auth_headers).json()["cursor"]
+    archive.archive_owner(db, old["owner_id"], date(2024, 2, 1))
+    db.commit()
+
+    feed = client.get("/api/changes/", headers=auth_headers).json()
+    assert [(e["id"], e["description"]) for e in feed["expenses"]] == [(old["id"], "Old")]
+    assert feed["deleted"] == []
+    assert client.get("/api/changes/", params={"since": cursor}, headers=auth_headers).json()["expenses"] == []
+
+    response = client.put(f"/api/expenses/{old['id']}", json={"amount": "1"}, headers=auth_headers)
+    assert response.status_code == 409
+    assert client.delete(f"/api/expenses/{old['id']}", headers=auth_headers).status_code == 409
+    assert client.delete("/api/expenses/999999", headers=auth_headers).status_code == 404
+
+
+def test_payloads_keep_template_and_sync_fields():
+    expense = archive.ArchivedExpense(
+        id=1, owner_id=7, description="Rent", amount=Decimal("900"), currency="EUR", base_amount=Decimal("990"),
+        spent_at=datetime(2024, 1, 1), category_id=None, recurring_id=3, sync_seq=42,
+    )
+    assert archive.decode_payload(7, archive.encode_payload([expense])) == [expense]
+
+    # Payloads written before recurring_id and sync_seq were kept
+    legacy = {name: [getattr(expense, name)] for name in archive.COLUMNS}
+    legacy.update(amount=["900"], base_amount=["990"], spent_at=["2024-01-01T00:00:00"])
+    [decoded] = archive.decode_payload(7, zlib.compress(json.dumps(legacy).encode()))
+    assert (decoded.recurring_id, decoded.sync_seq) == (None, 0)
@@ -0,0 +1,39 @@
+import pytest
+
+from app import attachments
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "root", tmp_path)
+    monkeypatch.setattr(attachments, "schedule_thumbnail", lambda sha256, content_type: None)
+
+
+def _upload(client, headers, content_type, filename, body):
+    expense = client.post("/api/expenses/", json={"description": "Hotel", "amount": "80"}, headers=headers).json()
+    response = client.post(
+        f"/api/expenses/{expense['id']}/attachments",
+        params={"filename": filename},
+        content=body,
+        headers={**headers, "Content-Type": content_type},
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_images_are_shown_inline(client, auth_headers):
+    attachment = _upload(client, auth_headers, "image/png", "receipt.png", b"\x89PNG\r\n\x1a\n" + b"\0" * 32)
+    response = client.get(f"/api/attachments/{attachment['id']}/content", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["content-disposition"].startswith("inline;")
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+def test_other_types_are_downloaded(client, auth_headers):
+    # The declared type is all the server knows about the body
+    attachment = _upload(client, auth_headers, "application/pdf", "receipt.pdf", b"<html><script>alert(1)</script>")
+    response = client.get(f"/api/attachments/{attachment['id']}/content", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith("attachment;")
+    assert response.headers["x-content-type-options"] == "nosniff"
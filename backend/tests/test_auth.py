@@ -0,0 +1,22 @@
+SIGNUP = {"name": "Ada", "email": "ada@example.com", "password": "correct horse"}
+
+
+def test_signup_and_login(client):
+    response = client.post("/api/auth/signup", json=SIGNUP)
+    assert response.status_code == 201, response.text
+    assert response.json()["email"] == SIGNUP["email"]
+    assert client.post("/api/auth/signup", json=SIGNUP).status_code == 400
+
+    response = client.post("/api/auth/login", data={"username": SIGNUP["email"], "password": "wrong"})
+    assert response.status_code == 401
+
+    response = client.post("/api/auth/login", data={"username": SIGNUP["email"], "password": SIGNUP["password"]})
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Ada"
+
+
+def test_requests_need_a_token(client):
+    assert client.get("/api/expenses/").status_code == 401
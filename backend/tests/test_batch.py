@@ -0,0 +1,43 @@
+def _budget(category_id, amount):
+    return {
+        "action": "create",
+        "entity": "budget",
+        "data": {"month": "2024-05-01", "amount": amount, "category_id": category_id},
+    }
+
+
+def test_constraint_violation_reports_the_operation_and_rolls_back(client, auth_headers):
+    response = client.post("/api/categories/", json={"name": "Food", "color": "#22c55e"}, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    category_id = response.json()["id"]
+
+    operations = [
+        {"action": "create", "entity": "expense", "data": {"description": "Lunch", "amount": "9.50"}},
+        _budget(category_id, "300"),
+        _budget(category_id, "400"),
+    ]
+    response = client.post("/api/batch/", json={"operations": operations}, headers=auth_headers)
+    assert response.status_code == 409, response.text
+    assert response.json()["detail"]["operation"] == 2
+
+    assert client.get("/api/expenses/", headers=auth_headers).json() == []
+    assert client.get("/api/budgets/", headers=auth_headers).json() == []
+
+
+def test_failed_operation_rolls_back_the_ones_before_it(client, auth_headers):
+    operations = [
+        {"action": "create", "entity": "category", "data": {"name": "Travel", "color": "#0ea5e9"}},
+        {"action": "create", "entity": "expense", "data": {"description": "Taxi", "amount": "18"}},
+        {"action": "delete", "entity": "expense", "id": 2**31 - 1},
+    ]
+    response = client.post("/api/batch/", json={"operations": operations}, headers=auth_headers)
+    assert response.status_code == 404, response.text
+    assert response.json()["detail"]["operation"] == 2
+
+    assert client.get("/api/categories/", headers=auth_headers).json() == []
+    assert client.get("/api/expenses/", headers=auth_headers).json() == []
+
+    response = client.post("/api/batch/", json={"operations": operations[:2]}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [result["status"] for result in response.json()["results"]] == [201, 201]
+    assert len(client.get("/api/expenses/", headers=auth_headers).json()) == 1
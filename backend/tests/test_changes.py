@@ -0,0 +1,48 @@
+def _changes(client, headers, since=None, **params):
+    if since is not None:
+        params["since"] = since
+    response = client.get("/api/changes/", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_feed_reports_writes_and_deletes_after_the_cursor(client, auth_headers):
+    expense = client.post("/api/expenses/", json={"description": "Bus", "amount": "2.40"}, headers=auth_headers).json()
+    full = _changes(client, auth_headers)
+    assert [e["id"] for e in full["expenses"]] == [expense["id"]]
+    assert full["deleted"] == []
+
+    client.put(f"/api/expenses/{expense['id']}", json={"amount": "2.60"}, headers=auth_headers)
+    changed = _changes(client, auth_headers, since=full["cursor"])
+    assert [e["amount"] for e in changed["expenses"]] == ["2.60"]
+    assert changed["cursor"] > full["cursor"]
+
+    client.delete(f"/api/expenses/{expense['id']}", headers=auth_headers)
+    deleted = _changes(client, auth_headers, since=changed["cursor"])
+    assert deleted["expenses"] == []
+    assert [(t["entity"], t["entity_id"]) for t in deleted["deleted"]] == [("expenses", expense["id"])]
+    assert _changes(client, auth_headers, since=deleted["cursor"])["deleted"] == []
+
+
+def test_deleting_a_category_resends_its_expenses(client, auth_headers):
+    category = client.post("/api/categories/", json={"name": "Gym", "color": "#f97316"}, headers=auth_headers).json()
+    expense = client.post(
+        "/api/expenses/",
+        json={"description": "Pass", "amount": "30", "category_id": category["id"]},
+        headers=auth_headers,
+    ).json()
+    cursor = _changes(client, auth_headers)["cursor"]
+
+    assert client.delete(f"/api/categories/{category['id']}", headers=auth_headers).status_code == 204
+    feed = _changes(client, auth_headers, since=cursor)
+    assert [(e["id"], e["category_id"]) for e in feed["expenses"]] == [(expense["id"], None)]
+    assert [(t["entity"], t["entity_id"]) for t in feed["deleted"]] == [("categories", category["id"])]
+
+
+def test_pages_share_one_cursor(client, auth_headers):
+    for amount in ("1", "2", "3"):
+        client.post("/api/expenses/", json={"description": "Item", "amount": amount}, headers=auth_headers)
+    first = _changes(client, auth_headers, limit=2)
+    assert first["has_more"] and len(first["expenses"]) == 2
+    rest = _changes(client, auth_headers, since=first["cursor"], limit=2)
+    assert not rest["has_more"] and len(rest["expenses"]) == 1
@@ -0,0 +1,11 @@
+def test_stream_tickets_and_access_tokens_are_not_interchangeable(client, auth_headers):
+    response = client.post("/api/events/ticket", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    ticket = response.json()["ticket"]
+
+    response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {ticket}"})
+    assert response.status_code == 401
+
+    access_token = auth_headers["Authorization"].removeprefix("Bearer ")
+    response = client.get("/api/events/", params={"ticket": access_token})
+    assert response.status_code == 401
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+
+def _instant(value: str) -> datetime:
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def test_offset_timestamps_are_stored_as_utc(client, auth_headers):
+    # 21:30 on the 10th at UTC-5 is 02:30 on the 11th in UTC (the user's default zone)
+    response = client.post(
+        "/api/expenses/",
+        json={"description": "Dinner", "amount": "40.00", "spent_at": "2024-03-10T21:30:00-05:00"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201, response.text
+    expected = datetime(2024, 3, 11, 2, 30, tzinfo=timezone.utc)
+    assert _instant(response.json()["spent_at"]) == expected
+
+    [expense] = client.get("/api/expenses/", headers=auth_headers).json()
+    assert _instant(expense["spent_at"]) == expected
+
+    params = {"start_date": "2024-03-10", "end_date": "2024-03-11"}
+    totals = client.get("/api/expenses/daily", params=params, headers=auth_headers).json()
+    assert [(item["day"], item["total"]) for item in totals] == [("2024-03-11", "40.00")]
+
+    response = client.put(
+        f"/api/expenses/{expense['id']}", json={"spent_at": "2024-03-11T01:00:00+02:00"}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    totals = client.get("/api/expenses/daily", params=params, headers=auth_headers).json()
+    assert [(item["day"], item["total"]) for item in totals] == [("2024-03-10", "40.00")]
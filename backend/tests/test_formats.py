@@ -0,0 +1,62 @@
+import msgpack
+import numpy as np
+import pytest
+
+from app import formats
+
+
+@pytest.mark.parametrize("fields", ["", ",", " , "])
+def test_empty_field_selections_return_every_field(client, auth_headers, fields):
+    response = client.post("/api/expenses/", json={"description": "Tea", "amount": "3.20"}, headers=auth_headers)
+    assert response.status_code == 201, response.text
+
+    response = client.get("/api/expenses/", params={"fields": fields}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    [expense] = response.json()
+    assert expense["description"] == "Tea"
+    assert expense["amount"] == "3.20"
+
+
+def test_field_selections_narrow_the_response(client, auth_headers):
+    client.post("/api/expenses/", json={"description": "Tea", "amount": "3.20"}, headers=auth_headers)
+    response = client.get("/api/expenses/", params={"fields": "id, amount"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [set(expense) for expense in response.json()] == [{"id", "amount"}]
+    assert client.get("/api/expenses/", params={"fields": "id,nope"}, headers=auth_headers).status_code == 422
+
+
+def _vary(response):
+    return {value.strip() for value in response.headers.get("vary", "").split(",")}
+
+
+def test_negotiated_responses_vary_on_accept(client, auth_headers):
+    client.post("/api/expenses/", json={"description": "Tea", "amount": "3.20"}, headers=auth_headers)
+    for path in ("/api/expenses/", "/api/expenses/daily", "/api/reports/dashboard"):
+        response = client.get(path, headers=auth_headers)
+        assert response.headers["content-type"] == "application/json", path
+        assert "Accept" in _vary(response), path
+        response = client.get(path, headers={**auth_headers, "Accept": formats.MSGPACK})
+        assert response.headers["content-type"] == formats.MSGPACK, path
+        assert "Accept" in _vary(response), path
+
+
+def test_binary_formats_carry_the_json_document(client, auth_headers):
+    client.post(
+        "/api/expenses/",
+        json={"description": "Tea", "amount": "3.20", "spent_at": "2024-03-11T08:00:00Z"},
+        headers=auth_headers,
+    )
+    [expense] = client.get("/api/expenses/", headers=auth_headers).json()
+
+    response = client.get("/api/expenses/", headers={**auth_headers, "Accept": formats.MSGPACK})
+    assert msgpack.unpackb(response.content) == [expense]
+
+    # Highest q-value wins; columnar packs amounts as scaled int64
+    accept = f"{formats.MSGPACK};q=0.5, {formats.COLUMNAR}"
+    response = client.get("/api/expenses/", headers={**auth_headers, "Accept": accept})
+    assert response.headers["content-type"] == formats.COLUMNAR
+    columns = msgpack.unpackb(response.content)
+    assert columns["count"] == 1
+    assert np.frombuffer(columns["amount"], "<i8").tolist() == [320]
+    assert np.frombuffer(columns["id"], "<i8").tolist() == [expense["id"]]
+    assert columns["description"] == ["Tea"]
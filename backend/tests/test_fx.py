@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app import fx, models
+
+
+@pytest.fixture(autouse=True)
+def empty_rate_cache():
+    # Rates are rolled back with each test; cached hits must not outlive them
+    fx.rate_cache.clear()
+    yield
+    fx.rate_cache.clear()
+
+
+def _add_rate(db, currency, day, rate):
+    db.add(models.FxRate(currency=currency, day=day, rate=Decimal(rate)))
+    db.commit()
+
+
+def _post(client, headers, **fields):
+    return client.post("/api/expenses/", json={"description": "Lunch", **fields}, headers=headers)
+
+
+def test_foreign_expenses_are_converted_in_reports(client, db, auth_headers):
+    _add_rate(db, "EUR", date(2024, 3, 11), "1.10")
+    response = _post(client, auth_headers, amount="20.00", currency="EUR", spent_at="2024-03-11T12:00:00Z")
+    assert response.status_code == 201, response.text
+
+    params = {"start_date": "2024-03-11", "end_date": "2024-03-11"}
+    response = client.get("/api/expenses/daily", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [(item["day"], Decimal(item["total"])) for item in response.json()] == [("2024-03-11", Decimal("22.00"))]
+
+    response = client.get("/api/reports/dashboard", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert Decimal(response.json()["total_spent"]) == Decimal("22.00")
+
+
+def test_writes_need_the_rate_of_the_utc_day(client, db, auth_headers):
+    # 23:30 on the 10th at UTC-5 is 04:30 on the 11th in UTC, the day reports join rates on
+    _add_rate(db, "EUR", date(2024, 3, 10), "1.10")
+    response = _post(client, auth_headers, amount="5.00", currency="EUR", spent_at="2024-03-10T23:30:00-05:00")
+    assert response.status_code == 422
+    assert "2024-03-11" in response.json()["detail"]
+
+    _add_rate(db, "EUR", date(2024, 3, 11), "1.20")
+    response = _post(client, auth_headers, amount="5.00", currency="EUR", spent_at="2024-03-10T23:30:00-05:00")
+    assert response.status_code == 201, response.text
+
+    expense = response.json()
+    response = client.put(
+        f"/api/expenses/{expense['id']}", json={"spent_at": "2024-03-11T20:00:00-05:00"}, headers=auth_headers
+    )
+    assert response.status_code == 422
+    assert "2024-03-12" in response.json()["detail"]
+
+
+def test_reports_refuse_expenses_without_a_rate(client, db, auth_headers):
+    owner_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    # Written behind the API's back, e.g. by a template materialized before its rates were loaded
+    db.add(models.Expense(
+        owner_id=owner_id, description="Taxi", amount=Decimal("9"), currency="EUR", spent_at=datetime(2024, 3, 11, 8),
+    ))
+    db.commit()
+
+    params = {"start_date": "2024-03-11", "end_date": "2024-03-11"}
+    for path in ("/api/expenses/daily", "/api/expenses/summary"):
+        response = client.get(path, params=params, headers=auth_headers)
+        assert response.status_code == 409, path
+        assert "no exchange rate into USD" in response.json()["detail"]
+    assert client.get("/api/reports/dashboard", headers=auth_headers).status_code == 409
@@ -0,0 +1,20 @@
+"""Each test's writes, committed or not, are rolled back before the next test."""
+from sqlalchemy import func, select
+
+from app import models
+
+EMAIL = "isolation@example.com"
+
+
+def _signup(client):
+    return client.post("/api/auth/signup", json={"name": "Iso", "email": EMAIL, "password": "password"})
+
+
+def test_first_signup_commits(client, db):
+    assert _signup(client).status_code == 201
+    assert db.scalar(select(func.count()).select_from(models.User).where(models.User.email == EMAIL)) == 1
+
+
+def test_commit_of_the_previous_test_is_gone(client, db):
+    assert db.scalar(select(func.count()).select_from(models.User).where(models.User.email == EMAIL)) == 0
+    assert _signup(client).status_code == 201
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app import jobs
+
+EASTERN = timezone(timedelta(hours=-5))
+
+
+def test_staleness_compares_instants_whatever_the_offset():
+    now = datetime(2024, 6, 1, 12, 0)
+    # 06:30 at UTC-5 is 11:30 UTC: half an hour old, not stale
+    recent = SimpleNamespace(status="running", created_at=datetime(2024, 6, 1, 6, 30, tzinfo=EASTERN))
+    assert not jobs.is_stale(recent, now)
+    old = SimpleNamespace(status="running", created_at=now.replace(tzinfo=timezone.utc) - jobs.STALE_AFTER * 2)
+    assert jobs.is_stale(old, now)
+
+
+def test_sessions_run_in_utc(db):
+    if db.bind.dialect.name != "postgresql":
+        pytest.skip("PostgreSQL session setting")
+    assert db.connection().exec_driver_sql("SELECT current_setting('TimeZone')").scalar() == "UTC"
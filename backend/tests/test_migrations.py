@@ -0,0 +1,48 @@
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app import migrations
+
+items = sa.table("items", sa.column("id", sa.Integer), sa.column("visits", sa.Integer))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY, visits INTEGER NOT NULL DEFAULT 0)")
+        conn.execute(sa.insert(items), [{"id": key} for key in range(1, 11)])
+    yield engine
+    engine.dispose()
+
+
+def _backfill(engine):
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn)
+        with context.begin_transaction(), Operations.context(context):
+            # Not idempotent on purpose: a batch that ran twice shows up as visits == 2
+            return migrations.backfill("items_visits", items, {"visits": items.c.visits + 1}, batch_rows=3, pause_ms=1)
+
+
+def test_interrupted_backfills_resume_after_the_last_batch(engine, monkeypatch, capsys):
+    pauses = []
+
+    def interrupt_on_second_pause(seconds):
+        pauses.append(seconds)
+        if len(pauses) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(migrations.time, "sleep", interrupt_on_second_pause)
+    with pytest.raises(KeyboardInterrupt):
+        _backfill(engine)
+    with engine.connect() as conn:
+        assert conn.scalar(sa.select(migrations.checkpoints.c.last_key)) == 6
+
+    monkeypatch.setattr(migrations.time, "sleep", lambda seconds: None)
+    assert _backfill(engine) == 4
+    assert "resuming after id 6" in capsys.readouterr().out
+    with engine.connect() as conn:
+        assert conn.execute(sa.select(items.c.visits)).scalars().all() == [1] * 10
+        assert conn.scalar(sa.select(sa.func.count()).select_from(migrations.checkpoints)) == 0
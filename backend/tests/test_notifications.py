@@ -0,0 +1,69 @@
+"""Live updates reach open streams after a commit (through LISTEN/NOTIFY on PostgreSQL)."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, text
+
+from app import models, notifications, sync
+from app.database import db_engine, get_session
+
+
+def _committed_user() -> int:
+    with get_session() as db:
+        user = models.User(name="Live", email=f"live-{uuid.uuid4().hex}@example.com", password_hash="-")
+        db.add(user)
+        db.flush()
+        return user.id
+
+
+def _add_expense(user_id: int) -> None:
+    with get_session() as db:
+        db.add(models.Expense(
+            owner_id=user_id, description="Coffee", amount=4, currency="USD", spent_at=datetime.utcnow()
+        ))
+
+
+async def _listening() -> None:
+    if not notifications.THROUGH_DATABASE:
+        return
+    query = text("SELECT count(*) FROM pg_stat_activity WHERE query = :query")
+    for _ in range(100):
+        with db_engine.connect() as conn:
+            if conn.scalar(query, {"query": f"LISTEN {sync.CHANNEL}"}):
+                return
+        await asyncio.sleep(0.05)
+    raise AssertionError("listener did not start")
+
+
+def test_commits_are_pushed_to_streams(database_url):
+    user_id = _committed_user()
+
+    async def scenario():
+        queue = notifications.broadcaster.subscribe(user_id)
+        try:
+            await _listening()
+            await asyncio.to_thread(_add_expense, user_id)
+            return await asyncio.wait_for(queue.get(), timeout=10)
+        finally:
+            notifications.broadcaster.unsubscribe(user_id, queue)
+
+    try:
+        frames = asyncio.run(scenario())
+    finally:
+        with get_session() as db:
+            db.execute(delete(models.User).where(models.User.id == user_id))
+    assert frames.startswith("event: dashboard\n")
+    assert "event: daily\n" in frames
+
+
+def test_large_change_sets_are_split_under_the_payload_limit():
+    start = datetime(2024, 1, 1)
+    changes = {user_id: {start + timedelta(hours=h) for h in range(500)} for user_id in range(200)}
+    payloads = sync.encode_changes(changes)
+    assert all(len(payload) <= sync.MAX_PAYLOAD for payload in payloads)
+    decoded = {}
+    for payload in payloads:
+        decoded.update(sync.decode_changes(payload))
+    assert set(decoded) == set(changes)
+    assert decoded[0] == {start, start + timedelta(hours=499)}
@@ -0,0 +1,15 @@
+from app.config import settings
+
+
+def test_profiled_requests_are_stored_behind_the_token(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "profile_token", "secret-token")
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+
+    assert client.get("/health", headers={"X-Profile": "secret-token"}).status_code == 200
+    assert client.get("/api/profiles/", headers={"X-Profile": "wrong-token"}).status_code == 404
+    assert client.get("/api/profiles/").status_code == 404
+
+    response = client.get("/api/profiles/", headers={"X-Profile": "secret-token"})
+    assert response.status_code == 200
+    # The listing request is profiled too, but only stored once its response has been sent
+    assert [profile["path"] for profile in response.json()] == ["/health"]
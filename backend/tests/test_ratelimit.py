@@ -0,0 +1,52 @@
+import asyncio
+
+from app import ratelimit
+from app.config import settings
+
+
+class RecordingBackend(ratelimit.InMemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.taken = []
+
+    async def take(self, key, rate, burst):
+        self.taken.append(key)
+        return await super().take(key, rate, burst)
+
+
+def _request(middleware, path="/api/expenses/"):
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": ("10.0.0.1", 1234)}
+    asyncio.run(middleware(scope, None, send))
+    return statuses[0]
+
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_requests_refused_by_the_user_bucket_leave_the_route_bucket_alone(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    monkeypatch.setattr(settings, "rate_limit_user_burst", 2)
+    monkeypatch.setattr(settings, "rate_limit_route_burst", 5)
+    backend = RecordingBackend()
+    middleware = ratelimit.AdmissionControlMiddleware(ok, backend=backend, max_in_flight=10)
+
+    assert [_request(middleware) for _ in range(4)] == [200, 200, 429, 429]
+    route_key = "ip:10.0.0.1:GET /api/expenses/"
+    assert backend.taken.count(route_key) == 2
+
+
+def test_only_the_event_stream_itself_is_exempt(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    monkeypatch.setattr(settings, "rate_limit_user_burst", 1)
+    middleware = ratelimit.AdmissionControlMiddleware(ok, backend=RecordingBackend(), max_in_flight=10)
+
+    assert [_request(middleware, "/api/events/") for _ in range(3)] == [200, 200, 200]
+    assert [_request(middleware, "/api/events/ticket") for _ in range(2)] == [200, 429]
@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+from app import models, recurring
+
+
+def _template(client, headers, **fields):
+    payload = {"description": "Rent", "amount": "900.00", "frequency": "monthly", **fields}
+    response = client.post("/api/recurring/", json=payload, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def _occurrences(client, headers):
+    response = client.get("/api/expenses/", headers=headers)
+    assert response.status_code == 200, response.text
+    return sorted(e["spent_at"][:16] for e in response.json())
+
+
+def _run(db, now):
+    processed = recurring.materialize_batch(db, now)
+    db.commit()
+    return processed
+
+
+def test_month_end_occurrences_are_clamped():
+    template = models.RecurringExpense(
+        frequency="monthly", interval=1, start_on=date(2024, 1, 31), until=None, next_run_on=date(2024, 3, 1),
+    )
+    assert recurring.due_dates(template, date(2024, 4, 30)) == ([date(2024, 3, 31), date(2024, 4, 30)], date(2024, 5, 31))
+    assert recurring.first_index(template, date(2024, 2, 29)) == 1
+    assert recurring.first_index(template, date(2024, 3, 1)) == 2
+
+    template = models.RecurringExpense(
+        frequency="yearly", interval=1, start_on=date(2024, 2, 29), until=date(2026, 12, 31), next_run_on=date(2025, 1, 1),
+    )
+    assert recurring.due_dates(template, date(2030, 1, 1)) == ([date(2025, 2, 28), date(2026, 2, 28)], None)
+
+
+def test_catch_up_after_downtime_is_idempotent(client, db, auth_headers):
+    template = _template(client, auth_headers, start_on="2024-01-31")
+
+    assert _run(db, datetime(2024, 4, 30, 12)) >= 1
+    expected = ["2024-01-31T00:00", "2024-02-29T00:00", "2024-03-31T00:00", "2024-04-30T00:00"]
+    assert _occurrences(client, auth_headers) == expected
+    assert db.get(models.RecurringExpense, template["id"]).next_run_on == date(2024, 5, 31)
+
+    # Nothing is due again until the next occurrence
+    _run(db, datetime(2024, 5, 30, 12))
+    assert _occurrences(client, auth_headers) == expected
+
+
+def test_occurrences_are_due_on_the_owners_local_day(client, db, auth_headers):
+    client.patch("/api/auth/me", json={"timezone": "Pacific/Auckland"}, headers=auth_headers)
+    _template(client, auth_headers, frequency="daily", start_on="2024-01-10")
+
+    # 10:30 UTC on the 9th is still the 9th in Auckland (UTC+13)
+    _run(db, datetime(2024, 1, 9, 10, 30))
+    assert _occurrences(client, auth_headers) == []
+
+    # 11:30 UTC is 00:30 on the 10th there; the occurrence is dated at local midnight
+    _run(db, datetime(2024, 1, 9, 11, 30))
+    assert _occurrences(client, auth_headers) == ["2024-01-09T11:00"]
+
+
+def test_deleting_a_template_resyncs_its_expenses(client, db, auth_headers):
+    template = _template(client, auth_headers, start_on="2024-01-01")
+    _run(db, datetime(2024, 1, 15, 12))
+    feed = client.get("/api/changes/", headers=auth_headers).json()
+    assert [e["recurring_id"] for e in feed["expenses"]] == [template["id"]]
+
+    assert client.delete(f"/api/recurring/{template['id']}", headers=auth_headers).status_code == 204
+    changes = client.get("/api/changes/", params={"since": feed["cursor"]}, headers=auth_headers).json()
+    assert [e["recurring_id"] for e in changes["expenses"]] == [None]
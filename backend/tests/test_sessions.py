@@ -0,0 +1,71 @@
+"""Request sessions are released between the endpoint and response serialization."""
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, model_validator
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.deps import SessionRoute, get_db, serve
+
+steps = []
+
+
+class Count(BaseModel):
+    users: int
+
+    @model_validator(mode="after")
+    def serialized(self):
+        steps.append("serialize")
+        return self
+
+
+@pytest.fixture
+def app_client(db_connection):
+    def test_db():
+        session = SessionLocal(bind=db_connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+
+        @event.listens_for(session, "after_commit")
+        def committed(session):
+            steps.append("commit")
+
+        @event.listens_for(session, "after_transaction_end")
+        def released(session, transaction):
+            if transaction.parent is None:
+                steps.append("release")
+
+        yield from serve(session)
+
+    router = APIRouter(route_class=SessionRoute)
+
+    @router.get("/count", response_model=Count)
+    def count(db: Session = Depends(get_db)):
+        steps.append("endpoint")
+        return {"users": db.scalar(select(func.count()).select_from(models.User))}
+
+    @router.post("/users", response_model=Count)
+    def add(db: Session = Depends(get_db)):
+        db.add(models.User(name="Lazy", email="lazy@example.com", password_hash="x"))
+        db.flush()
+        steps.append("endpoint")
+        return {"users": db.scalar(select(func.count()).select_from(models.User))}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = test_db
+    steps.clear()
+    with TestClient(app) as client:
+        yield client
+
+
+def test_reads_release_the_session_before_serialization_without_committing(app_client):
+    assert app_client.get("/count").status_code == 200
+    assert steps == ["endpoint", "release", "serialize"]
+
+
+def test_writes_are_committed_before_serialization(app_client, db):
+    assert app_client.post("/users").status_code == 200
+    assert steps == ["endpoint", "commit", "release", "serialize"]
+    assert db.scalar(select(func.count()).select_from(models.User).where(models.User.email == "lazy@example.com")) == 1
@@ -0,0 +1,45 @@
+def _add(client, headers, amount, spent_at):
+    response = client.post(
+        "/api/expenses/", json={"description": "Coffee", "amount": amount, "spent_at": spent_at}, headers=headers
+    )
+    assert response.status_code == 201, response.text
+
+
+def _use_zone(client, headers, name):
+    response = client.patch("/api/auth/me", json={"timezone": name}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def test_days_roll_over_at_local_midnight(client, auth_headers):
+    _use_zone(client, auth_headers, "America/New_York")
+    # Both are the evening of the 10th in New York, after the switch to EDT (UTC-4) that morning
+    _add(client, auth_headers, "2.00", "2024-03-10T23:00:00Z")
+    _add(client, auth_headers, "3.00", "2024-03-11T03:30:00Z")
+    # 04:00 UTC is midnight EDT
+    _add(client, auth_headers, "5.00", "2024-03-11T04:00:00Z")
+
+    params = {"start_date": "2024-03-10", "end_date": "2024-03-11"}
+    totals = client.get("/api/expenses/daily", params=params, headers=auth_headers).json()
+    assert [(item["day"], item["total"]) for item in totals] == [("2024-03-10", "5.00"), ("2024-03-11", "5.00")]
+
+    params = {"start_date": "2024-03-11", "end_date": "2024-03-11"}
+    listed = client.get("/api/expenses/", params=params, headers=auth_headers).json()
+    assert [expense["amount"] for expense in listed] == ["5.00"]
+
+
+def test_months_and_filters_follow_the_users_zone(client, auth_headers):
+    _use_zone(client, auth_headers, "Asia/Kathmandu")
+    # UTC+05:45: 18:30 UTC on March 31st is already April 1st
+    _add(client, auth_headers, "7.00", "2024-03-31T18:30:00Z")
+    _add(client, auth_headers, "4.00", "2024-03-31T18:00:00Z")
+
+    params = {"start_date": "2024-03-01", "end_date": "2024-04-30"}
+    summary = client.get("/api/expenses/summary", params=params, headers=auth_headers).json()
+    assert [(month["month"], month["total"]) for month in summary["months"]] == [
+        ("2024-03-01", "4.00"),
+        ("2024-04-01", "7.00"),
+    ]
+
+    params = {"start_date": "2024-04-01", "end_date": "2024-04-01"}
+    summary = client.get("/api/expenses/summary", params=params, headers=auth_headers).json()
+    assert summary["count"] == 1
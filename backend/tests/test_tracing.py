@@ -0,0 +1,27 @@
+import json
+import uuid
+
+from app import tracing
+from app.config import settings
+
+
+def test_trace_header_redacts_parameters(client, monkeypatch):
+    monkeypatch.setattr(settings, "sql_trace_header", True)
+    email = f"trace-{uuid.uuid4().hex}@example.com"
+    response = client.post(
+        "/api/auth/signup",
+        json={"name": "Trace", "email": email, "password": "password"},
+        headers={"X-Debug-SQL": "1"},
+    )
+    assert response.status_code == 201, response.text
+    trace = response.headers["X-SQL-Trace"]
+    assert json.loads(trace)
+    assert email not in trace
+    assert "$2b$" not in trace  # bcrypt hash prefix
+
+
+def test_locking_reads_are_recognised():
+    assert tracing.LOCKING_READ.search("SELECT id FROM expenses WHERE owner_id = %(owner_id)s FOR UPDATE OF expenses")
+    assert tracing.LOCKING_READ.search("SELECT id FROM recurring_expenses LIMIT 100 FOR UPDATE SKIP LOCKED")
+    assert tracing.LOCKING_READ.search("SELECT 1 FROM budgets FOR NO KEY UPDATE")
+    assert not tracing.LOCKING_READ.search("SELECT id FROM expenses ORDER BY spent_at")
@@ -6,6 +6,8 @@ interface User {
   id: number;
   name: string;
   email: string;
+  base_currency: string;
+  timezone: string;
   created_at: string;
 }
 
@@ -97,7 +99,8 @@ export function AuthProvider({ children }: { children: ReactNode }) {
       headers: {
         "Content-Type": "application/json",
       },
-      body: JSON.stringify({ name, email, password }),
+      // Reports bucket expenses by day in the browser's time zone
+      body: JSON.stringify({ name, email, password, timezone: Intl.DateTimeFormat().resolvedOptions().timeZone }),
     });
 
     if (!response.ok) {
@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import {
     createCategory,
     createExpense,
@@ -7,11 +7,22 @@ import {
     fetchDaily,
     getCategories,
     getExpenses,
+    subscribeLiveUpdates,
 } from "./api";
+import type { LiveSubscription } from "./api";
 import type { Category, DailyTotal, DashboardSummary, Expense } from "./types";
 import { useAuth } from "./AuthContext";
 
-const currency = new Intl.NumberFormat("en-US", { style: "currency", currency: "USD" });
+const formatters = new Map<string, Intl.NumberFormat>();
+
+function formatMoney(value: number, code = "USD") {
+    let formatter = formatters.get(code);
+    if (!formatter) {
+        formatter = new Intl.NumberFormat("en-US", { style: "currency", currency: code });
+        formatters.set(code, formatter);
+    }
+    return formatter.format(value);
+}
 
 function formatDate(value: string) {
     return new Date(value).toLocaleDateString(undefined, { month: "short", day: "numeric" });
@@ -21,8 +32,23 @@ function buildIso(dateString: string) {
     return new Date(`${dateString}T12:00:00`).toISOString();
 }
 
+function mergeDaily(current: DailyTotal[], updates: DailyTotal[]) {
+    // Keep the same 7-day window that /expenses/daily returns by default
+    const windowStart = new Date();
+    windowStart.setDate(windowStart.getDate() - 6);
+    const firstDay = windowStart.toISOString().slice(0, 10);
+    const byDay = new Map(current.map((item) => [item.day, item]));
+    for (const item of updates) {
+        if (item.day < firstDay) continue;
+        if (Number(item.total) > 0) byDay.set(item.day, item);
+        else byDay.delete(item.day);
+    }
+    return [...byDay.values()].sort((a, b) => a.day.localeCompare(b.day));
+}
+
 export default function Dashboard() {
     const { user, logout } = useAuth();
+    const baseCurrency = user?.base_currency || "USD";
     const [categories, setCategories] = useState<Category[]>([]);
     const [expenses, setExpenses] = useState<Expense[]>([]);
     const [daily, setDaily] = useState<DailyTotal[]>([]);
@@ -35,6 +61,8 @@ export default function Dashboard() {
     });
     const [categoryForm, setCategoryForm] = useState({ name: "", color: "#8b5cf6" });
     const [error, setError] = useState<string | null>(null);
+    // Null without EventSource support; the page then refetches stats after its own writes
+    const subscription = useRef<LiveSubscription | null>(null);
 
     const dailyMax = useMemo(() => Math.max(...daily.map((d) => Number(d.total)), 1), [daily]);
 
@@ -60,6 +88,13 @@ export default function Dashboard() {
 
     useEffect(() => {
         bootstrap();
+        // Server pushes dashboard/daily updates after every write, from any tab, device or job
+        subscription.current = subscribeLiveUpdates({
+            onReconnect: refreshStats,
+            onDashboard: setSummary,
+            onDaily: (updates) => setDaily((prev) => mergeDaily(prev, updates)),
+        });
+        return () => subscription.current?.close();
     }, []);
 
     async function handleExpenseSubmit(e: React.FormEvent) {
@@ -75,7 +110,7 @@ export default function Dashboard() {
             const created = await createExpense(payload as any);
             setExpenses((prev) => [created, ...prev]);
             setExpenseForm((prev) => ({ ...prev, description: "", amount: "" }));
-            refreshStats();
+            if (!subscription.current) refreshStats();
         } catch (err: any) {
             setError(err.message);
         }
@@ -100,13 +135,17 @@ export default function Dashboard() {
     async function handleDelete(expenseId: number) {
         await deleteExpense(expenseId);
         setExpenses((prev) => prev.filter((e) => e.id !== expenseId));
-        refreshStats();
+        if (!subscription.current) refreshStats();
     }
 
     async function refreshStats() {
-        const [dailyStats, dash] = await Promise.all([fetchDaily(), fetchDashboard()]);
-        setDaily(dailyStats);
-        setSummary(dash);
+        try {
+            const [dailyStats, dash] = await Promise.all([fetchDaily(), fetchDashboard()]);
+            setDaily(dailyStats);
+            setSummary(dash);
+        } catch (err: any) {
+            setError(err.message);
+        }
     }
 
     const totalThisWeek = daily.reduce((sum, item) => sum + Number(item.total), 0);
@@ -136,7 +175,7 @@ export default function Dashboard() {
                 <section className="card">
                     <div className="card-header">
                         <h2>Add expense</h2>
-                        <span className="badge">Today {currency.format(totalThisWeek)}</span>
+                        <span className="badge">Today {formatMoney(totalThisWeek, baseCurrency)}</span>
                     </div>
                     <form className="form" onSubmit={handleExpenseSubmit}>
                         <label>
@@ -231,11 +270,11 @@ export default function Dashboard() {
                     <div className="dash-grid">
                         <div className="stat">
                             <p>Total lifetime</p>
-                            <h3>{currency.format(summary?.total_spent || 0)}</h3>
+                            <h3>{formatMoney(summary?.total_spent || 0, baseCurrency)}</h3>
                         </div>
                         <div className="stat">
                             <p>Month to date</p>
-                            <h3>{currency.format(summary?.month_to_date || 0)}</h3>
+                            <h3>{formatMoney(summary?.month_to_date || 0, baseCurrency)}</h3>
                         </div>
                         <div className="stat">
                             <p>Budgets</p>
@@ -265,7 +304,7 @@ export default function Dashboard() {
                                 <div className="dot" style={{ background: cat.color }} />
                                 <div>
                                     <p>{cat.name}</p>
-                                    <strong>{currency.format(cat.total)}</strong>
+                                    <strong>{formatMoney(cat.total, baseCurrency)}</strong>
                                 </div>
                             </div>
                         ))}
@@ -289,7 +328,7 @@ export default function Dashboard() {
                                     <div className="tag" style={{ background: cat?.color || "#475569" }}>
                                         {cat?.name || "Misc"}
                                     </div>
-                                    <div className="amount">{currency.format(exp.amount)}</div>
+                                    <div className="amount">{formatMoney(exp.amount, exp.currency)}</div>
                                     <button className="ghost" onClick={() => handleDelete(exp.id)}>
                                         Remove
                                     </button>
@@ -1,4 +1,4 @@
-import type { Category, Expense, DailyTotal, DashboardSummary } from "./types";
+import type { BatchOperation, BatchResponse, Category, Expense, DailyTotal, DashboardSummary } from "./types";
 
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000/api";
 
@@ -43,7 +43,9 @@ export async function getExpenses(): Promise<Expense[]> {
   return request(`/expenses`);
 }
 
-export async function createExpense(data: Omit<Expense, "id" | "owner_id">): Promise<Expense> {
+export async function createExpense(
+  data: Omit<Expense, "id" | "owner_id" | "currency"> & { currency?: string }
+): Promise<Expense> {
   return request(`/expenses/`, {
     method: "POST",
     body: JSON.stringify(data),
@@ -61,3 +63,77 @@ export async function fetchDaily(): Promise<DailyTotal[]> {
 export async function fetchDashboard(): Promise<DashboardSummary> {
   return request(`/reports/dashboard`);
 }
+
+// Applies the operations in order in one transaction (all or none), optionally returning fresh stats
+export async function runBatch(
+  operations: BatchOperation[],
+  refresh: ("dashboard" | "daily")[] = []
+): Promise<BatchResponse> {
+  return request(`/batch/`, {
+    method: "POST",
+    body: JSON.stringify({ operations, refresh }),
+  });
+}
+
+type LiveHandlers = {
+  onReconnect: () => void;
+  onDashboard: (summary: DashboardSummary) => void;
+  onDaily: (totals: DailyTotal[]) => void;
+};
+
+export type LiveSubscription = { close: () => void };
+
+const STREAM_RETRY_MS = 5000;
+
+// Short-lived ticket for /events, so the access token never appears in a URL
+export async function createStreamTicket(): Promise<{ ticket: string; expires_in: number }> {
+  return request(`/events/ticket`, { method: "POST" });
+}
+
+export function subscribeLiveUpdates(handlers: LiveHandlers): LiveSubscription | null {
+  if (!localStorage.getItem("token") || typeof EventSource === "undefined") {
+    return null;
+  }
+  let source: EventSource | null = null;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  let closed = false;
+  let connected = false;
+
+  function reconnectLater() {
+    if (!closed) retry = setTimeout(connect, STREAM_RETRY_MS);
+  }
+
+  async function connect() {
+    let ticket: string;
+    try {
+      ({ ticket } = await createStreamTicket());
+    } catch {
+      reconnectLater();
+      return;
+    }
+    if (closed) return;
+    source = new EventSource(`${API_BASE}/events/?ticket=${encodeURIComponent(ticket)}`);
+    // "ready" is sent on every (re)connect; after a reconnect, updates may have been missed
+    source.addEventListener("ready", () => {
+      if (connected) handlers.onReconnect();
+      connected = true;
+    });
+    source.addEventListener("dashboard", (e) => handlers.onDashboard(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener("daily", (e) => handlers.onDaily(JSON.parse((e as MessageEvent).data)));
+    // EventSource would retry with the same, by then expired, ticket; reconnect with a new one instead
+    source.onerror = () => {
+      source?.close();
+      source = null;
+      reconnectLater();
+    };
+  }
+
+  connect();
+  return {
+    close() {
+      closed = true;
+      clearTimeout(retry);
+      source?.close();
+    },
+  };
+}
@@ -9,6 +9,7 @@ export type Expense = {
   id: number;
   description: string;
   amount: number;
+  currency: string;
   spent_at: string;
   owner_id: number;
   category_id: number | null;
@@ -40,3 +41,16 @@ export type DashboardSummary = {
   budgets: Budget[];
   top_categories: TopCategory[];
 };
+
+export type BatchOperation = {
+  action: "create" | "update" | "delete";
+  entity: "expense" | "category" | "budget";
+  id?: number;
+  data?: Record<string, unknown>;
+};
+
+export type BatchResponse = {
+  results: { status: number; data: Expense | Category | Budget | null }[];
+  dashboard: DashboardSummary | null;
+  daily: DailyTotal[] | null;
+};